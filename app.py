@@ -2,574 +2,105 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-#from sqlalchemy import or_
 import logging
+import os
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-import sys
-# from sqlalchemy.dialects import postgresql
+import click
+from flask import Flask
+
+from models import db
+from filters import format_datetime
+import assets
+import autocomplete
+import booking
+import cache
+import counters
+import database
+import events
+import exporter
+import genres
+import importer
+import instrumentation
+import metrics
+import search
+import sessions
+import template_cache
+import thumbnails
+import views
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-from models import db, Venue, Artist, Show
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
+# `flask` finds create_app() (FLASK_APP=app); gunicorn serves wsgi:app.
+# Nothing is built at import time, so every app gets its own extensions,
+# caches and commit listeners.
+
+
+def create_app(config=None):
+    # `config` overrides config.py: a mapping, or an object or import path
+    # for app.config.from_object().
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    sessions.init_app(app)
+    database.init_app(app, db)
+    db.init_app(app)
+    init_migrate(app)
+    events.init_app(app)
+    booking.init_app(app)
+    counters.init_app(app)
+    # After counters: its flush hooks read the refreshed show counters.
+    genres.init_app(app)
+    cache.init_app(app)
+    search.init_app(app)
+    instrumentation.init_app(app)
+    metrics.init_app(app, db)
+    importer.init_app(app)
+    exporter.init_app(app)
+    assets.init_app(app)
+    template_cache.init_app(app)
+    thumbnails.init_app(app)
+    autocomplete.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    views.init_app(app)
+    init_logging(app)
+    return app
+
+
+# Flask-Migrate (and alembic under it) takes longer to import than the rest
+# of the app; only the `flask db` commands need it, so web workers never load
+# it. The CLI builds the app from inside a click context; scripts that run
+# the migrations from Python (bench/run.py, the tests) pass always=True.
+
+
+def init_migrate(app, always=False):
+    if 'migrate' in app.extensions:
+        return
+    if not always and click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    Migrate(app, db)
 
-# # TODO: connect to a local postgresql database
-db.init_app(app)
-migrate = Migrate(app, db)
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Logging.
 #----------------------------------------------------------------------------#
 
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
-
-app.jinja_env.filters['datetime'] = format_datetime
-
-
-
-
-#----------------------------------------------------------------------------#
-# Controllers.
-#----------------------------------------------------------------------------#
-
-
-@app.route('/')
-def index():
-    return render_template('pages/home.html')
-
-
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-    # TODO: replace with real venues data.
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-
-    data = []
-
-    venues = Venue.query.order_by(Venue.name).all()
-    city_state = Venue.query.distinct(Venue.city, Venue.state).order_by(Venue.state, Venue.city).all()
-
-    for place in city_state:
-        venue_list = []
-        for venue in venues:
-            if venue.city == place.city and venue.state == place.state:
-                show_count = len(
-                    [num_shows for num_shows in venue.shows if num_shows.show_date_time > datetime.now()])
-                venue_list.append({
-                    'id': venue.id,
-                    'name': venue.name,
-                    'num_upcoming_shows': show_count
-                })
-        data.append({
-            'city': place.city,
-            'state': place.state,
-            'venues': venue_list
-        })
-
-    return render_template('pages/venues.html', areas=data)
-
-
-@ app.route('/venues/search', methods=['POST'])
-def search_venues():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # seach for Hop should return "The Musical Hop".
-    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-
-    search_term = request.form.get('search_term', '')
-    search_on = Venue.query.filter(
-        Venue.name.ilike(f'%{search_term}%') |
-        Venue.city.ilike(f'%{search_term}%') |
-        Venue.state.ilike(f'%{search_term}%')).all()
-    response = {
-        'count': len(search_on),
-        'data': []
-    }
-
-    for search in search_on:
-        venue = {}
-        venue['id'] = search.id
-        venue['name'] = search.name
-        venue['num_upcoming_shows'] = len(
-            [num_shows for num_shows in search.shows if num_shows.show_date_time > datetime.now()])
-        response['data'].append(venue)
-
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-
-@ app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-
-    data = {}
-    venue_data = Venue.query.get(venue_id)
-
-    data['id'] = venue_data.id
-    data['name'] = venue_data.name
-    data['genres'] = venue_data.genres
-    data['address'] = venue_data.address
-    data['city'] = venue_data.city
-    data['state'] = venue_data.state
-    data['phone'] = venue_data.phone
-    data['website'] = venue_data.website_link
-    data['facebook_link'] = venue_data.facebook_link
-    data['seeking_talent'] = venue_data.looking_for_talent
-    data['seeking_description'] = venue_data.description
-    data['image_link'] = venue_data.image_link
-
-    artist_data = venue_data.shows
-
-    past_show_list = []
-    future_show_list = []
-    for ind_artist in artist_data:
-        show_time = ind_artist.show_date_time
-        artist_info = {
-            'artist_id': ind_artist.artist.id,
-            'artist_name': ind_artist.artist.name,
-            'artist_image_link': ind_artist.artist.image_link,
-            'start_time': str(show_time)
-        }
-        if show_time < datetime.now():
-            past_show_list.append(artist_info)
-        else:
-            future_show_list.append(artist_info)
-
-    data['past_shows'] = past_show_list
-    data['past_shows_count'] = len(past_show_list)
-
-    data['upcoming_shows'] = future_show_list
-    data['upcoming_shows_count'] = len(future_show_list)
-
-    return render_template('pages/show_venue.html', venue=data)
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-
-@ app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-    form = VenueForm()
-    return render_template('forms/new_venue.html', form=form)
-
-
-@ app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-    # TODO: insert form data as a new Venue record in the db, instead
-    # TODO: modify data to be the data object returned from db insertion
-
-    error = False
-    form = VenueForm(request.form)
-
-    if form.validate():  
-        try:
-            venue = Venue(
-                # left side of equation is name from the class
-                name=form.name.data,
-                city=form.city.data,
-                state=form.state.data,
-                address=form.address.data,
-                phone=form.phone.data,
-                image_link=form.image_link.data,
-                genres=form.genres.data,
-                facebook_link=form.facebook_link.data,
-                website_link=form.website_link.data,
-                looking_for_talent=form.seeking_talent.data,
-                description=form.seeking_description.data
-            )
-            db.session.add(venue)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Venue ' + request.form['name'] + ' was successfully listed!')
-
-        # TODO: on unsuccessful db insert, flash an error instead.
-        except:
-            error = True
-            db.session.rollback()
-            print(sys.exc_info())
-            flash('An error occurred. Venue ' +
-                request.form['name'] + ' could not be listed.')
-        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-        finally:
-            db.session.close()
-        
-    else:
-        for field, message in form.errors.items():
-            flash(field + ' - ' + str(message), 'danger')
-
-    return render_template('forms/new_venue.html', form=form)
-
-
-@ app.route('/venues/<int:venue_id>/delete', methods=['GET'])
-def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-    error = False
-
-    try:
-        venue = Venue.query.get(venue_id)
-        db.session.delete(venue)
-        db.session.commit()
-        flash('Venue ' + str(venue_id) + ' was successfully deleted!')
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-        flash('An error occurred. Venue ' +
-              str(venue_id) + ' could not be deleted.')
-    finally:
-        db.session.close()
-    if error:
-        return render_template('pages/venues.html')
-    return render_template('pages/home.html')
-
-#  Artists
-#  ----------------------------------------------------------------
-
-
-@ app.route('/artists')
-def artists():
-    # TODO: replace with real data returned from querying the database
-    data = Artist.query.with_entities(
-        Artist.id, Artist.name).order_by(Artist.name).all()
-
-    return render_template('pages/artists.html', artists=data)
-
-
-@ app.route('/artists/search', methods=['POST'])
-def search_artists():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
-
-    search_term = request.form.get('search_term', '')
-    search_on = Artist.query.filter(
-        Artist.name.ilike(f'%{search_term}%')).all()
-    response = {
-        'count': len(search_on),
-        'data': []
-    }
-
-    for search in search_on:
-        artist = {}
-        artist['id'] = search.id
-        artist['name'] = search.name
-        artist['num_upcoming_shows'] = len(
-            [num_shows for num_shows in search.shows if num_shows.show_date_time > datetime.now()])
-        response['data'].append(artist)
-
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-
-@ app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the artist page with the given artist_id
-    # TODO: replace with real artist data from the artist table, using artist_id
-
-    data = {}
-    artist_data = Artist.query.get(artist_id)
-  
-    data['id'] = artist_data.id
-    data['name'] = artist_data.name
-    data['genres'] = artist_data.genres
-    data['city'] = artist_data.city
-    data['state'] = artist_data.state
-    data['phone'] = artist_data.phone
-    data['website'] = artist_data.website_link
-    data['facebook_link'] = artist_data.facebook_link
-    data['seeking_venue'] = artist_data.seeking_venue
-    data['seeking_description'] = artist_data.seeking_description
-    data['image_link'] = artist_data.image_link
-
-    venue_data = artist_data.shows
-
-    past_show_list = []
-    future_show_list = []
-
-    for ind_venue in venue_data:
-        show_time = ind_venue.show_date_time
-        venue_info = {
-            'venue_id': ind_venue.venue.id,
-            'venue_name': ind_venue.venue.name,
-            'venue_image_link': ind_venue.venue.image_link,
-            'start_time': str(show_time)
-        }
-        if show_time < datetime.now():
-            past_show_list.append(venue_info)
-        else:
-            future_show_list.append(venue_info)
-
-    data['past_shows'] = past_show_list
-    data['past_shows_count'] = len(past_show_list)
-
-    data['upcoming_shows'] = future_show_list
-    data['upcoming_shows_count'] = len(future_show_list)
-
-    return render_template('pages/show_artist.html', artist=data)
-
-#  Update
-#  ----------------------------------------------------------------
-
-
-@ app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
-
-    form.name.data = artist.name
-    form.genres.data = artist.genres
-    form.city.data = artist.city
-    form.state.data = artist.state
-    form.phone.data = artist.phone
-    form.website_link.data = artist.website_link
-    form.facebook_link.data = artist.facebook_link
-    form.seeking_venue.data = artist.seeking_venue
-    form.seeking_description.data = artist.seeking_description
-    form.image_link.data = artist.image_link
-
-    # TODO: populate form with fields from artist with ID <artist_id>
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-
-@ app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-    # TODO: take values from the form submitted, and update existing
-    # artist record with ID <artist_id> using the new attributes
-
-    error  = False
-    form = ArtistForm(request.form)
-    try:
-        artist = Artist.query.get(artist_id)
-        artist.name=form.name.data
-        artist.city=form.city.data
-        artist.state=form.state.data
-        artist.phone=form.phone.data
-        artist.image_link=form.image_link.data
-        artist.genres=form.genres.data
-        artist.website_link=form.website_link.data
-        artist.facebook_link=form.facebook_link.data
-        artist.seeking_venue=form.seeking_venue.data
-        artist.seeking_description=form.seeking_description.data
-        flash('Artist ' + request.form['name'] + ' was successfully updated!')
-        db.session.commit()
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc.info())
-        flash('An error occurred. Artist ' +
-              request.form['name'] + ' could not be updated.')
-    finally:
-        db.session.close()
-
-    return redirect(url_for('show_artist', artist_id=artist_id))
-
-
-@ app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-    form = VenueForm()
-
-    # TODO: populate form with values from venue with ID <venue_id>
-
-    venue = Venue.query.get(venue_id)
-
-    form.name.data = venue.name
-    form.genres.data = venue.genres
-    form.address.data = venue.address
-    form.city.data = venue.city
-    form.state.data = venue.state
-    form.phone.data = venue.phone
-    form.website_link.data = venue.website_link
-    form.facebook_link.data = venue.facebook_link
-    form.seeking_talent.data = venue.looking_for_talent
-    form.seeking_description.data = venue.description
-    form.image_link.data = venue.image_link
-
-    return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-
-@ app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-
-    # TODO: take values from the form submitted, and update existing
-    # venue record with ID <venue_id> using the new attributes
-
-    error = False
-    form = VenueForm(request.form)
-    try:
-        venue = Venue.query.get(venue_id)
-        venue.name = form.name.data
-        venue.city = form.city.data
-        venue.state = form.state.data
-        venue.address = form.address.data
-        venue.phone = form.phone.data
-        venue.image_link = form.image_link.data
-        venue.genres = form.genres.data
-        venue.facebook_link = form.facebook_link.data
-        venue.website_link = form.website_link.data
-        venue.looking_for_talent = form.seeking_talent.data
-        venue.description = form.seeking_description.data
-        db.session.commit()
-        flash('Venue ' + request.form['name'] + ' was successfully updated!')
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-        flash('An error occurred. Venue ' +
-              request.form['name'] + ' could not be updated.')
-    finally:
-        db.session.close()
-
-    return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-
-@ app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-    form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
-
-
-@ app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-    # called upon submitting the new artist listing form
-    # TODO: insert form data as a new Venue record in the db, instead
-    # TODO: modify data to be the data object returned from db insertion
-    error = False
-    form = ArtistForm(request.form)
-
-    if form.validate():
-        try:
-            artist = Artist(
-                # left side of equation is name from the class
-                name=form.name.data,
-                city=form.city.data,
-                state=form.state.data,
-                phone=form.phone.data,
-                image_link=form.image_link.data,
-                genres=form.genres.data,
-                website_link=form.website_link.data,
-                facebook_link=form.facebook_link.data,
-                seeking_venue=form.seeking_venue.data,
-                seeking_description=form.seeking_description.data
-            )
-            db.session.add(artist)
-            db.session.commit()
-
-            # on successful db insert, flash success
-            flash('Artist ' + request.form['name'] + ' was successfully listed!')
-        # TODO: on unsuccessful db insert, flash an error instead.
-        except:
-            error = True
-            db.session.rollback()
-            print(sys.exc_info())
-            flash('An error occurred. Artist ' +
-                request.form['name'] + ' could not be listed.')
-        finally:
-            db.session.close()
-    else:
-        for field, message in form.errors.items():
-            flash(field + ' - ' + str(message), 'danger')
-
-    return render_template('forms/new_artist.html', form=form)
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@ app.route('/shows')
-def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-
-    data = []
-    show_data = Show.query.all()
-    for show in show_data:
-        data.append({
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'artist_id': show.artist_id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': str(show.show_date_time)
-        })
-
-    return render_template('pages/shows.html', shows=data)
-
-
-@ app.route('/shows/create')
-def create_shows():
-    # renders form. do not touch.
-    form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
-
-
-@ app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-    # called to create new shows in the db, upon submitting new show listing form
-    # TODO: insert form data as a new Show record in the db, instead
-    error = False
-    form = ShowForm(request.form)
-
-    try:
-        show = Show(
-            # left side of equation is name from the class
-            artist_id=form.artist_id.data,
-            venue_id=form.venue_id.data,
-            show_date_time=form.start_time.data
-        )
-        db.session.add(show)
-        db.session.commit()
-
-        # on successful db insert, flash success
-        flash('Show was successfully listed!')
-    # TODO: on unsuccessful db insert, flash an error instead.
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-        flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    finally:
-        db.session.close()
-    return render_template('pages/home.html')
-
-
-@ app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
-
-
-@ app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
-
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
+def init_logging(app):
+    # Outside debug mode, INFO and up also go to LOG_FILE (unless empty).
+    if app.debug or not app.config['LOG_FILE']:
+        return
+    path = os.path.abspath(app.config['LOG_FILE'])
+    # Apps created from this module share one logger.
+    if any(getattr(handler, 'baseFilename', None) == path for handler in app.logger.handlers):
+        return
+    file_handler = FileHandler(path)
     file_handler.setFormatter(
         Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -577,19 +108,40 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+
+
+#----------------------------------------------------------------------------#
+# Warm up.
+#----------------------------------------------------------------------------#
+
+def warm(app):
+    # Builds what the first requests of every worker would otherwise build:
+    # the in-process name and search indexes and the compiled templates.
+    # gunicorn runs this in the master (gunicorn.conf.py), so the forked
+    # workers share these pages copy-on-write. Database connections opened
+    # meanwhile are closed; a forked worker must not reuse its parent's.
+    with app.app_context():
+        autocomplete.autocomplete().indexes()
+        search.warm()
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+        db.session.remove()
+        database.dispose_engines(app, db)
+
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-# Default port:
+# Development server only; production runs under gunicorn (wsgi.py):
+#
+#   gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,318 @@
+import gzip
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from hashlib import sha256
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets build` writes a production copy of static/ to static/dist/:
+# the CSS and JS bundles below, concatenated and minified; every other
+# static file; and resized JPEG/WebP variants of the images for srcset.
+# Each output file gets a content hash in its name, and the text ones a
+# .gz (and .br when brotli is installed) next to it. dist/manifest.json
+# maps the source names to the hashed ones.
+#
+# With a manifest, url_for('static', filename=...) returns the hashed file,
+# and files under dist/ are served precompressed (per Accept-Encoding) with
+# an immutable, far-future Cache-Control: any change to a file changes its
+# URL. Without one (development), templates get the unbundled sources and
+# Flask's default static handling.
+
+BUNDLES = {
+    'css/site.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Needed before the page renders.
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Loaded with defer after jQuery.
+    'js/site.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+        'js/autocomplete.js',
+    ],
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# srcset widths; those wider than the original are skipped. The widest
+# one also replaces the original, which is never served as is.
+IMAGE_WIDTHS = (480, 960, 1440)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt',
+                           '.eot', '.ttf', '.otf')
+# Precompressed variants in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+HASH_LENGTH = 12
+
+_CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(text):
+    # Comments and redundant whitespace only; /*! licence */ comments stay.
+    text = _CSS_COMMENT.sub('', text)
+    text = _CSS_SPACE.sub(' ', text)
+    text = _CSS_PUNCTUATION.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # rjsmin when it is installed; otherwise the scripts are only
+    # concatenated (the libraries are already minified).
+    try:
+        import rjsmin
+    except ImportError:
+        return text.strip()
+    return rjsmin.jsmin(text)
+
+
+def hashed_name(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+class Build(object):
+
+    def __init__(self, static_folder, output='dist'):
+        self.static_folder = static_folder
+        self.output = output
+        self.output_folder = os.path.join(static_folder, output)
+        # source name -> hashed name, both relative to static/
+        self.files = {}
+        # image name -> {'jpeg' / 'webp': [[width, hashed name]]}
+        self.images = {}
+        self.written = 0
+
+    def source_names(self):
+        for root, dirs, files in os.walk(self.static_folder):
+            relative = os.path.relpath(root, self.static_folder).replace(os.sep, '/')
+            if relative == self.output or relative.startswith(self.output + '/'):
+                dirs[:] = []
+                continue
+            for filename in sorted(files):
+                if not filename.startswith('.'):
+                    yield posixpath.normpath(posixpath.join(relative, filename))
+
+    def read(self, name):
+        with open(os.path.join(self.static_folder, name), 'rb') as f:
+            return f.read()
+
+    def write(self, name, content):
+        # Writes `content` under its hashed name and returns that name.
+        target = posixpath.join(self.output, hashed_name(name, content))
+        path = os.path.join(self.static_folder, target)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.written += 1
+        if name.endswith(COMPRESSIBLE_EXTENSIONS):
+            precompress(path, content)
+        return target
+
+    def rewrite_urls(self, name, css):
+        # Relative url()s would break once the file moves to dist/; point
+        # them at the built file, or at the original in static/.
+        def replace(match):
+            url = match.group(2)
+            if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+                return match.group(0)
+            path, sep, suffix = url, '', ''
+            query = re.search(r'[?#]', url)
+            if query:
+                path, sep, suffix = url[:query.start()], query.group(0), url[query.end():]
+            source = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+            target = self.files.get(source, source)
+            return f'url("/static/{target}{sep}{suffix}")'
+        return _CSS_URL.sub(replace, css)
+
+    def run(self):
+        # Plain files first, so that the CSS can refer to them.
+        names = sorted(self.source_names(), key=lambda name: name.endswith('.css'))
+        for name in names:
+            content = self.read(name)
+            if name.endswith('.css'):
+                content = minify_css(self.rewrite_urls(name, content.decode('utf-8'))).encode('utf-8')
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                self.images[name] = self.resize(name, content)
+                if self.images[name]:
+                    self.files[name] = self.images[name]['jpeg'][-1][1]
+                    continue
+            self.files[name] = self.write(name, content)
+        for bundle, sources in BUNDLES.items():
+            parts = []
+            for source in sources:
+                text = self.read(source).decode('utf-8')
+                if bundle.endswith('.css'):
+                    parts.append(minify_css(self.rewrite_urls(source, text)))
+                else:
+                    # ; guards against a file without a trailing semicolon.
+                    parts.append(minify_js(text) + ';')
+            self.files[bundle] = self.write(bundle, '\n'.join(parts).encode('utf-8'))
+        manifest = {'files': self.files, 'images': self.images}
+        with open(os.path.join(self.output_folder, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        return manifest
+
+    def resize(self, name, content):
+        # Pillow is only needed to build; without it there is no srcset.
+        try:
+            from PIL import Image
+        except ImportError:
+            return {}
+        variants = {'jpeg': [], 'webp': []}
+        with Image.open(io.BytesIO(content)) as image:
+            image = image.convert('RGB')
+            widths = [width for width in IMAGE_WIDTHS if width < image.width] or [image.width]
+            root = posixpath.splitext(name)[0]
+            for width in widths:
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize(
+                    (width, height), Image.LANCZOS)
+                for format, ext, options in (('jpeg', '.jpg', {'quality': 82, 'progressive': True,
+                                                               'optimize': True}),
+                                             ('webp', '.webp', {'quality': 80, 'method': 6})):
+                    buffer = io.BytesIO()
+                    resized.save(buffer, format.upper(), **options)
+                    variants[format].append(
+                        [width, self.write(f'{root}-{width}w{ext}', buffer.getvalue())])
+        return variants
+
+
+def precompress(path, content):
+    # Keeps a variant only when it is smaller than the original.
+    variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants.append(('.br', brotli.compress(content)))
+    for ext, compressed in variants:
+        if len(compressed) < len(content) and not os.path.exists(path + ext):
+            with open(path + ext, 'wb') as f:
+                f.write(compressed)
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+class Manifest(object):
+
+    def __init__(self, files=None, images=None):
+        self.files = files or {}
+        self.images = images or {}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        return cls(data.get('files'), data.get('images'))
+
+    def __bool__(self):
+        return bool(self.files)
+
+
+def manifest():
+    return current_app.extensions['assets']
+
+
+def asset_urls(name):
+    # URLs for a bundle (or a single file): the built bundle, or its
+    # sources when nothing has been built.
+    if manifest() or name not in BUNDLES:
+        return [url_for('static', filename=name)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def image_srcset(name, format='jpeg'):
+    # "url 480w, url 960w, ..." for an <img srcset> / <source srcset>, or ''.
+    variants = manifest().images.get(name, {}).get(format, [])
+    return ', '.join(f"{url_for('static', filename=target)} {width}w"
+                     for width, target in variants)
+
+
+def _hashed_static_url(endpoint, values):
+    # url_defaults hook: url_for('static', filename=...) -> the built file.
+    if endpoint == 'static' and 'filename' in values:
+        target = manifest().files.get(values['filename'])
+        if target is not None:
+            values['filename'] = target
+
+
+def serve_static(filename):
+    app = current_app
+    output = app.config['ASSETS_OUTPUT'] + '/'
+    if not filename.startswith(output):
+        return app.send_static_file(filename)
+    accepted = request.accept_encodings
+    for encoding, ext in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + ext)):
+            response = send_from_directory(app.static_folder, filename + ext,
+                                           mimetype=mimetypes.guess_type(filename)[0],
+                                           max_age=app.config['ASSETS_MAX_AGE'])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename,
+                                       max_age=app.config['ASSETS_MAX_AGE'])
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@click.group('assets')
+def assets_cli():
+    """Build the static assets."""
+
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    """Bundle, minify, fingerprint and precompress static/ into static/dist/."""
+    app = current_app
+    build = Build(app.static_folder, app.config['ASSETS_OUTPUT'])
+    data = build.run()
+    app.extensions['assets'] = Manifest(data['files'], data['images'])
+    click.echo(f'{len(data["files"])} files, {build.written} written to {build.output_folder}')
+
+
+@assets_cli.command('clean')
+@with_appcontext
+def clean_command():
+    """Remove static/dist/."""
+    shutil.rmtree(os.path.join(current_app.static_folder, current_app.config['ASSETS_OUTPUT']),
+                  ignore_errors=True)
+
+
+def init_app(app):
+    app.extensions['assets'] = Manifest.load(
+        os.path.join(app.static_folder, app.config['ASSETS_OUTPUT'], 'manifest.json'))
+    app.url_defaults(_hashed_static_url)
+    app.view_functions['static'] = serve_static
+    app.jinja_env.globals.update(asset_urls=asset_urls, image_srcset=image_srcset)
+    app.cli.add_command(assets_cli)
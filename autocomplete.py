@@ -0,0 +1,250 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from flask import current_app
+
+import events
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# /autocomplete answers typeahead queries from the navbar search box and the
+# new show form on every keystroke, so it never touches the database. Each
+# process keeps a prefix index of venue and artist names: two sorted arrays
+# per kind, one keyed by the whole normalised name ("the musical hop") and
+# one by every later word start ("musical hop", "hop"). A prefix query is a
+# bisect plus a walk over at most `limit` matches; whole-name matches rank
+# first. When a query finds fewer than `limit` names, it is retried with
+# one typo (a changed, missing, extra or swapped character after the first).
+#
+# The index is built on first use and kept current by the commit listener.
+# Writes made by other processes are picked up by polling for changed rows
+# at most every AUTOCOMPLETE_REFRESH_SECONDS (events.ChangePoller), which
+# also notices deletes by comparing row counts; the index is never rebuilt
+# once loaded.
+
+KINDS = {'venue': Venue, 'artist': Artist}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+# Queries longer than this are not retried with typos.
+MAX_FUZZY_LENGTH = 16
+
+_words = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    # Lower case, accents stripped, words separated by single spaces.
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_words.findall(text.lower()))
+
+
+def _keys(name):
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SortedKeys(object):
+    # Parallel sorted arrays of (key, id).
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, id in pairs]
+        self.ids = [id for key, id in pairs]
+
+    def add(self, key, id):
+        position = self._position(key, id)
+        self.keys.insert(position, key)
+        self.ids.insert(position, id)
+
+    def _position(self, key, id):
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key and self.ids[position] < id:
+            position += 1
+        return position
+
+    def remove(self, key, id):
+        position = self._position(key, id)
+        if position < len(self.keys) and self.keys[position] == key and self.ids[position] == id:
+            del self.keys[position], self.ids[position]
+
+    def prefixed(self, prefix):
+        # Yields the ids whose key starts with `prefix`, in key order.
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            yield self.ids[position]
+            position += 1
+
+    def next_chars(self, prefix):
+        # The distinct characters that follow `prefix` in some key, found by
+        # jumping from one to the next rather than walking every key.
+        position = bisect_left(self.keys, prefix)
+        length = len(prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            key = self.keys[position]
+            if len(key) == length:
+                position += 1
+                continue
+            char = key[length]
+            yield char
+            position = bisect_left(self.keys, prefix + chr(ord(char) + 1), position)
+
+    def has_prefix(self, prefix):
+        position = bisect_left(self.keys, prefix)
+        return position < len(self.keys) and self.keys[position].startswith(prefix)
+
+
+class NameIndex(object):
+    # The names of one kind (venues or artists).
+
+    def __init__(self, rows=()):
+        # id -> (name, city, state)
+        self.labels = {}
+        names, words = [], []
+        for id, name, city, state in rows:
+            self.labels[id] = (name, city, state)
+            keys = _keys(name)
+            if keys:
+                names.append((keys[0], id))
+                words.extend((key, id) for key in keys[1:])
+        self.names = SortedKeys(names)
+        self.words = SortedKeys(words)
+
+    def add(self, id, name, city, state):
+        self.remove(id)
+        self.labels[id] = (name, city, state)
+        keys = _keys(name)
+        if keys:
+            self.names.add(keys[0], id)
+            for key in keys[1:]:
+                self.words.add(key, id)
+
+    def remove(self, id):
+        label = self.labels.pop(id, None)
+        if label is None:
+            return
+        keys = _keys(label[0])
+        if keys:
+            self.names.remove(keys[0], id)
+            for key in keys[1:]:
+                self.words.remove(key, id)
+
+    def _collect(self, prefixes, rank, limit, found):
+        # Adds {id: rank} for names, then later words, starting with any of
+        # `prefixes`, until `found` holds `limit` ids.
+        for keys, offset in ((self.names, 0), (self.words, 1)):
+            for prefix in prefixes:
+                for id in keys.prefixed(prefix):
+                    if len(found) >= limit:
+                        return
+                    found.setdefault(id, rank + offset)
+
+    def typos(self, query):
+        # Prefixes one edit away from `query` (keeping its first character)
+        # that some name or word starts with.
+        variants = set()
+        for i in range(1, len(query)):
+            head, char, tail = query[:i], query[i], query[i + 1:]
+            # Every variant below starts with `head`.
+            if not self.names.has_prefix(head) and not self.words.has_prefix(head):
+                break
+            variants.add(head + tail)
+            if tail:
+                variants.add(head + tail[0] + char + tail[1:])
+            for other in set(self.names.next_chars(head)) | set(self.words.next_chars(head)):
+                variants.add(head + other + tail)
+                variants.add(head + other + char + tail)
+        variants.discard(query)
+        return sorted(variant for variant in variants
+                      if self.names.has_prefix(variant) or self.words.has_prefix(variant))
+
+    def complete(self, query, limit):
+        # {id: rank}: 0 for names starting with the query, 1 for names with a
+        # later word starting with it, 2 and 3 for the same with one typo.
+        found = {}
+        self._collect([query], 0, limit, found)
+        if len(found) < limit and 2 < len(query) <= MAX_FUZZY_LENGTH:
+            self._collect(self.typos(query), 2, limit, found)
+        return found
+
+
+class Autocomplete(object):
+
+    def __init__(self, refresh_seconds=30):
+        self._indexes = None
+        self._lock = threading.Lock()
+        self._poller = events.ChangePoller(
+            {model: ['id', 'updated_at', 'name', 'city', 'state'] for model in KINDS.values()},
+            refresh_seconds)
+
+    def _load(self):
+        self._poller.reset()
+        indexes = {}
+        for kind, model in KINDS.items():
+            rows = db.session.query(model.id, model.name, model.city, model.state).yield_per(5000)
+            indexes[kind] = NameIndex(rows)
+        return indexes
+
+    def build(self):
+        indexes = self._load()
+        with self._lock:
+            self._indexes = indexes
+
+    def _known_ids(self, model):
+        kind = next(kind for kind, kind_model in KINDS.items() if kind_model is model)
+        with self._lock:
+            return list(self._indexes[kind].labels)
+
+    def indexes(self):
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    self._indexes = self._load()
+        else:
+            changes = self._poller.poll(self._known_ids)
+            if changes:
+                self.apply(changes)
+        return self._indexes
+
+    def apply(self, changes):
+        # Commit listener.
+        if self._indexes is None:
+            return
+        with self._lock:
+            for kind, model in KINDS.items():
+                index = self._indexes[kind]
+                for id in changes.deleted[model]:
+                    index.remove(id)
+                for id, values in changes.upserted[model].items():
+                    index.add(id, values['name'], values['city'], values['state'])
+
+    def complete(self, query, kinds=tuple(KINDS), limit=DEFAULT_LIMIT):
+        # [{'type', 'id', 'name', 'city', 'state'}] for up to `limit` names.
+        query = normalize(query)
+        if not query:
+            return []
+        indexes = self.indexes()
+        results = []
+        with self._lock:
+            for kind in kinds:
+                index = indexes[kind]
+                for id, rank in index.complete(query, limit).items():
+                    name, city, state = index.labels[id]
+                    results.append((rank, name.lower(), kind, id, name, city, state))
+        results.sort()
+        return [{'type': kind, 'id': id, 'name': name, 'city': city, 'state': state}
+                for rank, key, kind, id, name, city, state in results[:limit]]
+
+
+def autocomplete():
+    return current_app.extensions['autocomplete']
+
+
+def init_app(app):
+    index = app.extensions['autocomplete'] = Autocomplete(
+        app.config['AUTOCOMPLETE_REFRESH_SECONDS'])
+    events.on_commit(app, index.apply)
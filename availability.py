@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import genres
+from models import db, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Venue availability.
+#----------------------------------------------------------------------------#
+
+# "Which venues in <city> are free between <start> and <end>?" Candidate
+# venues come from the (state, city) index and their shows in the window
+# from a range scan of the (venue_id, show_date_time) index, in a single
+# query that selects the candidates again as a subquery (a whole state can
+# hold more venues than SQLite takes bound parameters); nothing loads a
+# venue's full show list. The busy time of each
+# venue is turned into free gaps, and venues with at least one gap of
+# `min_slot` are ranked by how much bookable time they have.
+
+# Upper bound of ShowForm.duration. A show that overlaps the window started
+# at most this long before it, which keeps the index scan bounded on both
+# sides.
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+
+class VenueAvailability(object):
+
+    def __init__(self, id, name, city, state, looking_for_talent, slots):
+        self.id = id
+        self.name = name
+        self.city = city
+        self.state = state
+        self.looking_for_talent = looking_for_talent
+        # [(start, end)] free gaps at least min_slot long, in order.
+        self.slots = slots
+        self.free_time = sum((end - start for start, end in slots), timedelta())
+        self.longest_slot = max(end - start for start, end in slots)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'looking_for_talent': self.looking_for_talent,
+            'free_hours': round(self.free_time.total_seconds() / 3600, 1),
+            'slots': [{'start': start.isoformat(), 'end': end.isoformat()}
+                      for start, end in self.slots],
+        }
+
+
+def free_slots(busy, start, end, min_slot):
+    # Gaps of at least min_slot in [start, end) not covered by the busy
+    # intervals, which must be sorted by start (they may overlap).
+    slots = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor and busy_start - cursor >= min_slot:
+            slots.append((cursor, min(busy_start, end)))
+        if busy_end > cursor:
+            cursor = busy_end
+        if cursor >= end:
+            break
+    if end - cursor >= min_slot:
+        slots.append((cursor, end))
+    return [(slot_start, slot_end) for slot_start, slot_end in slots
+            if slot_end - slot_start >= min_slot]
+
+
+def find_available_venues(start, end, city=None, state=None, genre=None,
+                          min_slot=timedelta(hours=2), limit=50):
+    filters = []
+    if state:
+        filters.append(Venue.state == state)
+    if city:
+        filters.append(db.func.lower(Venue.city) == city.strip().lower())
+    if genre:
+        filters.append(genres.has_genres(Venue.genres, [genre]))
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                              Venue.looking_for_talent).filter(*filters)
+    candidates = {row.id: row for row in venues}
+    if not candidates:
+        return []
+
+    shows = db.session.query(Show.venue_id, Show.show_date_time, Show.end_date_time).filter(
+        Show.venue_id.in_(db.select(Venue.id).where(*filters)),
+        Show.show_date_time >= start - MAX_SHOW_DURATION,
+        Show.show_date_time < end,
+        Show.end_date_time > start).order_by(Show.venue_id, Show.show_date_time)
+    busy = {}
+    for venue_id, show_start, show_end in shows:
+        busy.setdefault(venue_id, []).append((show_start, show_end))
+
+    results = []
+    for id, row in candidates.items():
+        slots = free_slots(busy.get(id, ()), start, end, min_slot)
+        if slots:
+            results.append(VenueAvailability(row.id, row.name, row.city, row.state,
+                                             row.looking_for_talent, slots))
+    # Best fit first: the most bookable time, then the longest single slot,
+    # then venues that are looking for talent.
+    results.sort(key=lambda venue: (-venue.free_time, -venue.longest_slot,
+                                    not venue.looking_for_talent, venue.name))
+    return results[:limit]
+
+
+def search_window(start_date, end_date, now=None):
+    # Whole days from start_date through end_date, never in the past.
+    now = now or datetime.now()
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+    return max(start, now.replace(second=0, microsecond=0)), end
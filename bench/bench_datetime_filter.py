@@ -0,0 +1,54 @@
+# Micro-benchmark for the `datetime` Jinja filter.
+#
+#   python bench/bench_datetime_filter.py [--shows 500] [--repeat 5]
+#
+# Compares the original filter (str() in the route, dateutil re-parse and an
+# uncached Babel pattern on every call) with filters.format_datetime, over one
+# page worth of show start times.
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+
+from filters import DATETIME_FORMATS, format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, DATETIME_FORMATS[format], locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 1, 20, 0)
+    times = [start + timedelta(hours=7 * i) for i in range(args.shows)]
+    strings = [str(value) for value in times]
+
+    assert [legacy_format_datetime(value, 'full') for value in strings] == \
+        [format_datetime(value, 'full') for value in times]
+
+    cases = [
+        ('legacy (str + dateutil + babel)', lambda: [legacy_format_datetime(value, 'full') for value in strings]),
+        ('format_datetime', lambda: [format_datetime(value, 'full') for value in times]),
+    ]
+    baseline = None
+    for name, case in cases:
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f'{name:34s} {best * 1000:8.2f} ms  {best / args.shows * 1e6:7.2f} us/show  '
+              f'x{baseline / best:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Thumbnail proxy check and benchmark.
+#
+#   python bench/bench_thumbnails.py [--requests 200] [--width 3000]
+#
+# Serves a generated JPEG from a local HTTP stand-in for the image host,
+# then drives /thumbnails through the Flask test client: the cold fetch,
+# warm hits, a conditional request (304 on the ETag), a prefetch queued by
+# committing a venue, and LRU eviction in a deliberately small store. Runs
+# against a throwaway SQLite database and cache directory.
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_image(width, seed):
+    from PIL import Image
+    # Noise, so that thumbnails have a realistic size.
+    image = Image.merge('RGB', [Image.effect_noise((width, width * 2 // 3), 40 + seed + band)
+                                for band in range(3)])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def image_host(images):
+    # path -> bytes; counts the requests it answers.
+    class Handler(BaseHTTPRequestHandler):
+        hits = 0
+
+        def do_GET(self):
+            content = images.get(self.path)
+            Handler.hits += 1
+            if content is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--width', type=int, default=3000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='fyyur-thumbs-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['THUMBNAIL_CACHE_DIR'] = os.path.join(workdir, 'thumbnails')
+    os.environ['THUMBNAIL_CACHE_MAX_BYTES'] = str(2 * 1024 * 1024)
+    images = {f'/{i}.jpg': make_image(args.width, i) for i in range(12)}
+    server, handler = image_host(images)
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    from app import create_app
+    from models import db, Venue
+    import thumbnails
+
+    # The stand-in image host is on 127.0.0.1, which fetch() refuses as a
+    # private address; let it through, as the tests do.
+    thumbnails.is_public_address = lambda address: address == '127.0.0.1'
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    with app.test_request_context():
+        url = thumbnails.thumbnail_url(base + '/0.jpg')
+        missing = thumbnails.thumbnail_url(base + '/missing.jpg')
+    original = len(images['/0.jpg'])
+
+    started = time.perf_counter()
+    response = client.get(url)
+    cold = time.perf_counter() - started
+    assert response.status_code == 200, response.status_code
+    etag = response.headers['ETag']
+    print(f'cold fetch      {cold * 1000:8.1f} ms  {original} -> {len(response.data)} bytes')
+
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        response = client.get(url)
+        response.close()
+    warm = (time.perf_counter() - started) / args.requests
+    assert handler.hits == 1, handler.hits
+    print(f'warm hit        {warm * 1000:8.2f} ms  (origin hit once)')
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304, response.status_code
+    print(f'If-None-Match   {response.status_code}')
+
+    response = client.get(url.replace('/tile/', '/page/'))
+    assert response.status_code == 404, response.status_code
+    response = client.get(missing)
+    assert response.status_code == 404, response.status_code
+    print('bad signature   404, missing original 404')
+
+    # A committed image_link queues a prefetch of every size.
+    with app.app_context():
+        db.session.add(Venue(name='Bench Hall', city='Austin', state='TX', address='1 Main St',
+                             phone='512-555-0100', genres=['Jazz'], image_link=base + '/1.jpg'))
+        db.session.commit()
+    store = app.extensions['thumbnails']
+    deadline = time.time() + 10
+    while any(store.lookup(size, base + '/1.jpg') is None for size in thumbnails.SIZES):
+        assert time.time() < deadline, 'prefetch did not finish'
+        time.sleep(0.05)
+    print('prefetch        done after commit')
+
+    for path in images:
+        for size in thumbnails.SIZES:
+            store.get(size, base + path)
+    count, size = store.stats()
+    assert size <= store.max_bytes and count < len(images) * len(thumbnails.SIZES), (count, size)
+    print(f'eviction        {count} thumbnails, {size} bytes <= {store.max_bytes}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Compare two bench/run.py result files.
+#
+#   python bench/compare.py before.json after.json [--metric p50_ms] [--threshold 0.10]
+#
+# Prints the change per route and exits non-zero when any route got slower
+# than the threshold (a fraction; 0.10 = 10%).
+
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--metric', default='p50_ms')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{'route':16s} {'before':>10s} {'after':>10s} {'change':>8s}  stmts")
+    regressed = []
+    for name in sorted(set(before['routes']) & set(after['routes'])):
+        old, new = before['routes'][name], after['routes'][name]
+        change = (new[args.metric] - old[args.metric]) / old[args.metric] if old[args.metric] else 0.0
+        flag = ''
+        if change > args.threshold:
+            regressed.append(name)
+            flag = '  <-- slower'
+        print(f"{name:16s} {old[args.metric]:10.2f} {new[args.metric]:10.2f} {change:+8.1%}  "
+              f"{old['statements_per_request']:.1f} -> {new['statements_per_request']:.1f}{flag}")
+    if regressed:
+        sys.exit(f'{len(regressed)} route(s) regressed beyond {args.threshold:.0%}: {", ".join(regressed)}')
+
+
+if __name__ == '__main__':
+    main()
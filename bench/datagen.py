@@ -0,0 +1,166 @@
+# Deterministic synthetic data for benchmarks.
+#
+# The same (scale, seed) always produces the same venues, artists and shows,
+# so results from different commits are comparable. Rows are written with
+# Core executemany batches, which bypass the ORM events that keep show
+# counters current, so the counters are tallied here while generating and
+# the genre counts are recomputed at the end.
+
+import random
+from datetime import datetime, timedelta
+
+import genres
+from choices import GENRE_CHOICES
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+
+# Number of shows per scale; venues and artists are derived from it.
+SCALES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+GENRES = [value for value, label in GENRE_CHOICES]
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+          ('Seattle', 'WA'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA'),
+          ('Portland', 'OR'), ('Atlanta', 'GA'), ('Detroit', 'MI'), ('Miami', 'FL')]
+WORDS = ['Blue', 'Velvet', 'Electric', 'Hop', 'Musical', 'Park', 'Square', 'Live',
+         'Coffee', 'Wild', 'Sax', 'Band', 'Petals', 'Guns', 'Lounge', 'Hall', 'Echo',
+         'Neon', 'Silver', 'Garden', 'Station', 'Room', 'Club', 'Theater', 'Moon']
+
+BATCH_SIZE = 5000
+
+# Shows cover the two years before and the year after the moment the data
+# is written, so about a third of them are upcoming.
+SPAN_HOURS = 3 * 365 * 24
+
+
+def sizes(shows):
+    return max(1, shows // 20), max(1, shows // 10), shows
+
+
+def _name(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _counters(shows, count, key, now):
+    counters = {id: {'upcoming_shows_count': 0, 'past_shows_count': 0, 'next_show_at': None}
+                for id in range(1, count + 1)}
+    for show in shows:
+        row = counters[show[key]]
+        when = show['show_date_time']
+        if when > now:
+            row['upcoming_shows_count'] += 1
+            if row['next_show_at'] is None or when < row['next_show_at']:
+                row['next_show_at'] = when
+        else:
+            row['past_shows_count'] += 1
+    return counters
+
+
+def _venues(rng, count, counters):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield dict(counters[i + 1], **{
+            'id': i + 1,
+            'name': f'The {_name(rng, 2)} {i}',
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} {_name(rng, 1)} St',
+            'phone': f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://images.example.com/venues/{i + 1}.jpg',
+            'website_link': None,
+            'facebook_link': None,
+            'looking_for_talent': rng.random() < 0.5,
+            'description': None,
+        })
+
+
+def _artists(rng, count, counters):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield dict(counters[i + 1], **{
+            'id': i + 1,
+            'name': f'{_name(rng, rng.randint(1, 3))} {i}',
+            'city': city,
+            'state': state,
+            'phone': None,
+            'genres': rng.sample(GENRES, rng.randint(1, 2)),
+            'image_link': f'https://images.example.com/artists/{i + 1}.jpg',
+            'website_link': None,
+            'facebook_link': None,
+            'seeking_venue': rng.random() < 0.5,
+            'seeking_description': None,
+        })
+
+
+def _shows(rng, count, venues, artists, now):
+    # Shows fill DEFAULT_SHOW_DURATION slots, and a venue or an artist is
+    # never booked twice in the same slot, so the data satisfies the
+    # double-booking constraints.
+    start = now - timedelta(hours=SPAN_HOURS * 2 // 3)
+    slots = int(timedelta(hours=SPAN_HOURS) / DEFAULT_SHOW_DURATION)
+    booked = set()
+    for i in range(count):
+        while True:
+            venue_id, artist_id = rng.randint(1, venues), rng.randint(1, artists)
+            slot = rng.randrange(slots)
+            if ('venue', venue_id, slot) not in booked and ('artist', artist_id, slot) not in booked:
+                break
+        booked.add(('venue', venue_id, slot))
+        booked.add(('artist', artist_id, slot))
+        show_date_time = start + slot * DEFAULT_SHOW_DURATION
+        yield {
+            'id': i + 1,
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'show_date_time': show_date_time,
+            'end_date_time': show_date_time + DEFAULT_SHOW_DURATION,
+        }
+
+
+def _insert(table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def _reset_sequences():
+    # Explicit ids leave Postgres sequences behind; move them past the data.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in ('venues', 'artists', 'shows'):
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"coalesce((SELECT max(id) FROM {table}), 1))"))
+
+
+def generate(shows=1000, seed=42, now=None):
+    # Must run inside an app context, against empty tables. Each table has
+    # its own random stream, so the shows can be generated twice: once to
+    # tally the counters and once to insert them.
+    now = now or datetime.now()
+    venue_count, artist_count, show_count = sizes(shows)
+
+    def show_rows():
+        return _shows(random.Random(seed + 2), show_count, venue_count, artist_count, now)
+
+    # Only the keys and times are kept for the tally.
+    tally = [{'venue_id': row['venue_id'], 'artist_id': row['artist_id'],
+              'show_date_time': row['show_date_time']} for row in show_rows()]
+    _insert(Venue.__table__, _venues(random.Random(seed), venue_count,
+                                     _counters(tally, venue_count, 'venue_id', now)))
+    _insert(Artist.__table__, _artists(random.Random(seed + 1), artist_count,
+                                       _counters(tally, artist_count, 'artist_id', now)))
+    del tally
+    _insert(Show.__table__, show_rows())
+    _reset_sequences()
+    genres.refresh_genre_counts(db.session)
+    db.session.commit()
+    return {'venues': venue_count, 'artists': artist_count, 'shows': show_count}
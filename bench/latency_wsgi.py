@@ -0,0 +1,25 @@
+# The production app (wsgi.py) with BENCH_DB_LATENCY_MS of sleep before
+# every SQL statement, standing in for the round trip to a remote database;
+# used by bench/load_test.py --db-latency-ms. The sleep blocks a sync
+# worker and yields under gevent (time.sleep is patched), the way a psycopg2
+# wait does with psycogreen's wait callback.
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from wsgi import app
+
+LATENCY = float(os.getenv('BENCH_DB_LATENCY_MS', '0')) / 1000
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _latency(conn, cursor, statement, parameters, context, executemany):
+    if LATENCY:
+        time.sleep(LATENCY)
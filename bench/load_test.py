@@ -0,0 +1,163 @@
+# Concurrent load test: sync versus gevent workers.
+#
+#   python bench/load_test.py --database-url postgresql://postgres@localhost/fyyur_bench \
+#       --scale 1k --concurrency 10,50,200 --duration 10
+#   python bench/load_test.py --database-url sqlite:////tmp/fyyur-bench.db --db-latency-ms 20
+#
+# Seeds the database like bench/run.py, then for each worker class starts
+# gunicorn with gunicorn.conf.py and a single worker, and keeps
+# --concurrency clients busy against it for --duration seconds per level:
+# each client sends requests for --paths back to back. Reports completed
+# requests per second, latency percentiles and failures (errors, timeouts
+# and non-200 responses) per level, so the concurrency one process can
+# carry shows up as where latency and failures climb.
+#
+# The page cache is off so that every request reaches the database. On
+# Postgres the waits are real; --db-latency-ms adds a sleep before every
+# statement (bench/latency_wsgi.py) to model a remote database, or to give
+# SQLite, whose calls never wait on the network, something to wait on.
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.run import percentile
+
+DEFAULT_PATHS = '/venues,/artists,/shows,/genres/Jazz,/venues/1,/artists/1'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(worker_class, port, args):
+    env = dict(os.environ, WORKER_CLASS=worker_class, WEB_CONCURRENCY='1',
+               DATABASE_URL=args.database_url, CACHE_TYPE='null', LOG_FILE='',
+               GUNICORN_ACCESS_LOG='', SLOW_REQUEST_THRESHOLD_MS='0',
+               GUNICORN_TIMEOUT=str(args.timeout * 2),
+               BENCH_DB_LATENCY_MS=str(args.db_latency_ms))
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    if args.db_latency_ms:
+        command.append('bench.latency_wsgi:app')
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn ({worker_class}) exited with {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f'gunicorn ({worker_class}) did not start')
+
+
+def run_level(port, paths, concurrency, duration, timeout):
+    samples = []
+    failures = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(number):
+        rng = random.Random(number)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', rng.choice(paths))
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+            elapsed = time.perf_counter() - started
+            with lock:
+                (samples if ok else failures).append(elapsed)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(number,), daemon=True)
+               for number in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'failures': len(failures),
+        'rps': len(samples) / elapsed,
+        'p50_ms': percentile(samples, 0.50) * 1000 if samples else None,
+        'p99_ms': percentile(samples, 0.99) * 1000 if samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sync and gevent workers under load.')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:////tmp/fyyur-bench.db'))
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m or a number of shows')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop and reseed the database')
+    parser.add_argument('--worker-classes', default='sync,gevent')
+    parser.add_argument('--concurrency', default='10,50,200',
+                        help='comma separated numbers of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per level')
+    parser.add_argument('--timeout', type=float, default=10, help='client timeout in seconds')
+    parser.add_argument('--paths', default=DEFAULT_PATHS)
+    parser.add_argument('--db-latency-ms', type=float, default=0,
+                        help='sleep added before every SQL statement')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    # config.py reads DATABASE_URL at import time.
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app
+    from bench import datagen
+    from bench.run import prepare_database
+
+    shows = datagen.SCALES.get(args.scale) or int(args.scale)
+    prepare_database(create_app(), shows, args.seed, args.reset)
+
+    paths = args.paths.split(',')
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = {'db_latency_ms': args.db_latency_ms, 'paths': paths, 'worker_classes': {}}
+    for worker_class in args.worker_classes.split(','):
+        port = free_port()
+        server = start_server(worker_class, port, args)
+        try:
+            results['worker_classes'][worker_class] = rows = []
+            for concurrency in levels:
+                row = run_level(port, paths, concurrency, args.duration, args.timeout)
+                rows.append(row)
+                p50 = f'{row["p50_ms"]:8.1f}' if row['p50_ms'] is not None else '       -'
+                p99 = f'{row["p99_ms"]:8.1f}' if row['p99_ms'] is not None else '       -'
+                print(f'{worker_class:7s} {concurrency:5d} clients  {row["rps"]:8.1f} req/s  '
+                      f'p50 {p50} ms  p99 {p99} ms  {row["failures"]:5d} failed', file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
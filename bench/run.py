@@ -0,0 +1,184 @@
+# Route benchmark.
+#
+#   python bench/run.py --database-url sqlite:////tmp/fyyur-bench.db --scale 1k \
+#       --reset --output results.json
+#   python bench/run.py --database-url postgresql://postgres@localhost/fyyur_bench ...
+#
+# Seeds the database with bench/datagen.py (when --reset is given or the
+# tables are empty), then drives every read route through the Flask test
+# client and records latency percentiles, throughput and SQL statements per
+# request. The JSON output can be diffed between commits with
+# bench/compare.py. SQLite schemas come from the models; Postgres schemas
+# come from the migrations so that search indexes and triggers exist.
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(app, shows, seed, reset):
+    from flask_migrate import upgrade
+    from app import init_migrate
+    from models import db, Venue
+    from bench import datagen
+
+    init_migrate(app, always=True)
+    with app.app_context():
+        postgres = db.engine.dialect.name == 'postgresql'
+        if reset:
+            db.drop_all()
+            if postgres:
+                db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+                db.session.commit()
+        if postgres:
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+        else:
+            db.create_all()
+        if db.session.query(Venue.id).first() is None:
+            started = time.perf_counter()
+            counts = datagen.generate(shows=shows, seed=seed)
+            print(f'seeded {counts} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        return {
+            'venues': db.session.query(db.func.count(Venue.id)).scalar(),
+            'dialect': db.engine.dialect.name,
+        }
+
+
+def routes(rng, venues, artists):
+    # name -> callable returning the next URL to request.
+    def pick(count):
+        return lambda: rng.randint(1, count)
+    venue_id, artist_id = pick(venues), pick(artists)
+    terms = ['blue', 'hop', 'san', 'wild sax', 'neon 1', 'z']
+    states = ['CA', 'NY', 'TX', 'WA']
+    genres = ['Jazz', 'Blues', 'Hip-Hop', 'Rock n Roll']
+    return {
+        'index': lambda: '/',
+        'venues': lambda: '/venues',
+        'artists': lambda: '/artists',
+        'shows': lambda: '/shows',
+        'shows_past': lambda: '/shows?when=past',
+        'search_venues': lambda: '/venues/search?search_term=' + rng.choice(terms),
+        'search_artists': lambda: '/artists/search?search_term=' + rng.choice(terms),
+        'availability': lambda: '/venues/availability?state=' + rng.choice(states),
+        'genre': lambda: '/genres/' + rng.choice(genres),
+        'venues_by_genre': lambda: '/venues?genres=' + rng.choice(genres),
+        'show_venue': lambda: f'/venues/{venue_id()}',
+        'show_artist': lambda: f'/artists/{artist_id()}',
+    }
+
+
+def measure(app, name, next_url, requests, warmup):
+    from instrumentation import count_statements
+    from models import db
+
+    client = app.test_client()
+    for _ in range(warmup):
+        client.get(next_url())
+    samples = []
+    statements = 0
+    with app.app_context():
+        engine = db.engine
+    with count_statements(engine) as counter:
+        started = time.perf_counter()
+        for _ in range(requests):
+            url = next_url()
+            before = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - before)
+            if response.status_code != 200:
+                raise SystemExit(f'{name}: GET {url} returned {response.status_code}')
+        elapsed = time.perf_counter() - started
+        statements = counter.count
+    return {
+        'requests': requests,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p90_ms': percentile(samples, 0.90) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': max(samples) * 1000,
+        'rps': requests / elapsed,
+        'statements_per_request': statements / requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Fyyur read routes.')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:////tmp/fyyur-bench.db'))
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m or a number of shows')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop and reseed the database')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--routes', help='comma separated subset of route names')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    # config.py reads DATABASE_URL at import time, so set it before the app
+    # module is imported.
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app
+    from bench import datagen
+
+    app = create_app()
+
+    shows = datagen.SCALES.get(args.scale) or int(args.scale)
+    database = prepare_database(app, shows, args.seed, args.reset)
+    venues, artists, shows = datagen.sizes(shows)
+
+    rng = random.Random(args.seed)
+    selected = routes(rng, venues, artists)
+    if args.routes:
+        selected = {name: selected[name] for name in args.routes.split(',')}
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dialect': database['dialect'],
+            'scale': {'venues': venues, 'artists': artists, 'shows': shows},
+            'seed': args.seed,
+        },
+        'routes': {},
+    }
+    for name, next_url in selected.items():
+        results['routes'][name] = measure(app, name, next_url, args.requests, args.warmup)
+        route = results['routes'][name]
+        print(f"{name:16s} p50 {route['p50_ms']:8.2f} ms  p99 {route['p99_ms']:8.2f} ms  "
+              f"{route['rps']:8.1f} req/s  {route['statements_per_request']:.1f} stmts",
+              file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
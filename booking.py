@@ -0,0 +1,232 @@
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from availability import MAX_SHOW_DURATION
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Double-booking prevention.
+#----------------------------------------------------------------------------#
+
+# A venue, and an artist, can only be in one show at a time: a show runs
+# from show_date_time to end_date_time and may not overlap another show at
+# the same venue or with the same artist. On Postgres this is enforced by
+# the exclusion constraints added in AddShowEndTime_008 (btree_gist over
+# tsrange). SQLite has no such constraint, so there a booking takes the
+# database write lock first (BEGIN IMMEDIATE) and then looks for
+# overlapping shows in the database: no other process or thread can commit
+# a show between the check and the insert. The importer checks whole
+# batches against a BookingIndex, one timeline per venue and artist, which
+# it loads after taking the same lock.
+
+EXCLUSION_VIOLATION = '23P01'
+
+
+class Conflict(object):
+
+    def __init__(self, resource, show_id, start, end):
+        self.resource = resource
+        self.show_id = show_id
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        where = f'show {self.show_id}' if self.show_id is not None else 'another show in this batch'
+        return (f'{self.resource[0]} {self.resource[1]} is booked from '
+                f'{self.start:%Y-%m-%d %H:%M} to {self.end:%Y-%m-%d %H:%M} ({where})')
+
+
+class Timeline(object):
+    # The shows of one venue or artist, sorted by start. max_ends[i] is the
+    # latest end among the first i + 1 shows, so an overlap query is a
+    # bisect followed by a walk over the shows that actually overlap:
+    # O(log n + k). Overlapping entries (bookings made before the check
+    # existed) are allowed.
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals, key=lambda interval: interval[:2])
+        self.starts = [start for start, end, show_id in intervals]
+        self.ends = [end for start, end, show_id in intervals]
+        self.ids = [show_id for start, end, show_id in intervals]
+        self.max_ends = []
+        self._update(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _update(self, position):
+        # Recomputes max_ends from `position` until it agrees with the
+        # stored values again; with mostly disjoint shows that is at once.
+        latest = self.max_ends[position - 1] if position else None
+        for index in range(position, len(self.ends)):
+            end = self.ends[index]
+            if latest is None or end > latest:
+                latest = end
+            if index < len(self.max_ends):
+                if index > position and self.max_ends[index] == latest:
+                    return
+                self.max_ends[index] = latest
+            else:
+                self.max_ends.append(latest)
+
+    def add(self, start, end, show_id):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, show_id)
+        self.max_ends.insert(position, end)
+        self._update(position)
+
+    def remove(self, show_id):
+        try:
+            position = self.ids.index(show_id)
+        except ValueError:
+            return
+        del self.starts[position], self.ends[position], self.ids[position]
+        del self.max_ends[position]
+        self._update(position)
+
+    def overlapping(self, start, end, exclude=None):
+        # [(show_id, start, end)] of the shows overlapping [start, end).
+        found = []
+        position = bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_ends[position] > start:
+            if self.ends[position] > start and (exclude is None or self.ids[position] != exclude):
+                found.append((self.ids[position], self.starts[position], self.ends[position]))
+            position -= 1
+        return found
+
+
+class BookingIndex(object):
+
+    def __init__(self):
+        # ('venue', id) / ('artist', id) -> Timeline
+        self._timelines = {}
+        # show id -> (venue key, artist key) for the loaded timelines.
+        self._placements = {}
+
+    def load(self, venue_ids=(), artist_ids=(), chunk_size=500):
+        # Reads the timelines that are not loaded yet, a chunk at a time.
+        for slot, kind, column, ids in ((0, 'venue', Show.venue_id, venue_ids),
+                                        (1, 'artist', Show.artist_id, artist_ids)):
+            missing = sorted({id for id in ids if (kind, id) not in self._timelines})
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                intervals = {id: [] for id in chunk}
+                rows = db.session.query(column, Show.id, Show.show_date_time,
+                                        Show.end_date_time).filter(column.in_(chunk))
+                for owner, show_id, show_start, show_end in rows:
+                    intervals[owner].append((show_start, show_end, show_id))
+                    self._placements.setdefault(show_id, [None, None])[slot] = (kind, owner)
+                for id, entries in intervals.items():
+                    self._timelines[(kind, id)] = Timeline(entries)
+
+    def conflicts(self, venue_id, artist_id, start, end, exclude=None):
+        self.load([venue_id], [artist_id])
+        found = []
+        for resource in (('venue', venue_id), ('artist', artist_id)):
+            for show_id, show_start, show_end in self._timelines[resource].overlapping(
+                    start, end, exclude):
+                found.append(Conflict(resource, show_id, show_start, show_end))
+        return found
+
+    def add(self, show_id, venue_id, artist_id, start, end):
+        # Records a show in whichever of its timelines are loaded.
+        placement = [None, None]
+        for slot, resource in enumerate((('venue', venue_id), ('artist', artist_id))):
+            timeline = self._timelines.get(resource)
+            if timeline is not None:
+                timeline.add(start, end, show_id)
+                placement[slot] = resource
+        if show_id is not None:
+            self._placements[show_id] = placement
+
+    def remove(self, show_id):
+        for resource in self._placements.pop(show_id, ()):
+            if resource is not None and resource in self._timelines:
+                self._timelines[resource].remove(show_id)
+
+
+def database_enforces_bookings(session):
+    return session.connection().dialect.name == 'postgresql'
+
+
+def lock_bookings(session):
+    # On SQLite, starts the session's transaction with BEGIN IMMEDIATE, which
+    # waits for (and then blocks) every other writer until it ends. Does
+    # nothing where the exclusion constraints do the work, or when this
+    # transaction already writes.
+    if database_enforces_bookings(session):
+        return
+    connection = session.connection()
+    if not connection.connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def find_conflicts(venue_id, artist_id, start, end, exclude=None):
+    # The stored shows overlapping [start, end) at the venue or with the
+    # artist; call inside reservation(). As in availability.py, an
+    # overlapping show started at most MAX_SHOW_DURATION before `start`,
+    # which bounds the (venue_id / artist_id, show_date_time) index scans.
+    if database_enforces_bookings(db.session):
+        return []
+    found = []
+    for kind, column, id in (('venue', Show.venue_id, venue_id),
+                             ('artist', Show.artist_id, artist_id)):
+        query = db.session.query(Show.id, Show.show_date_time, Show.end_date_time).filter(
+            column == id,
+            Show.show_date_time >= start - MAX_SHOW_DURATION,
+            Show.show_date_time < end,
+            Show.end_date_time > start)
+        if exclude is not None:
+            query = query.filter(Show.id != exclude)
+        for show_id, show_start, show_end in query.order_by(Show.show_date_time):
+            found.append(Conflict((kind, id), show_id, show_start, show_end))
+    return found
+
+
+@contextmanager
+def reservation():
+    # From the conflict check through the commit (or the rollback that
+    # ends the request), no other booking can be written.
+    lock_bookings(db.session)
+    yield
+
+
+def is_conflict_error(error):
+    # True for the exclusion-constraint violation raised by Postgres.
+    return isinstance(error, IntegrityError) and \
+        getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def overlapping_shows(session):
+    # Yields (kind, id, show id, show id) for every pair of shows that overlap
+    # at the same venue or with the same artist.
+    for kind, column in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        first, second = db.aliased(Show), db.aliased(Show)
+        query = session.query(getattr(first, column), first.id, second.id).join(second, db.and_(
+            getattr(first, column) == getattr(second, column),
+            first.id < second.id,
+            first.show_date_time < second.end_date_time,
+            second.show_date_time < first.end_date_time)).order_by(first.id, second.id)
+        for owner, first_id, second_id in query:
+            yield kind, owner, first_id, second_id
+
+
+@click.command('booking-conflicts')
+@with_appcontext
+def booking_conflicts_command():
+    """List shows that overlap at the same venue or with the same artist."""
+    count = 0
+    for kind, owner, first_id, second_id in overlapping_shows(db.session):
+        click.echo(f'{kind} {owner}: show {first_id} overlaps show {second_id}')
+        count += 1
+    click.echo(f'{count} overlapping pairs.')
+
+
+def init_app(app):
+    app.cli.add_command(booking_conflicts_command)
@@ -0,0 +1,264 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from hashlib import sha1
+
+from flask import current_app, session
+
+import database
+import events
+import metrics
+from models import Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+# Both backends share one small interface: get/set/delete, with `timeout`
+# in seconds (0 means no expiry). CACHE_TYPE selects one of them.
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(object):
+    # In-process, bounded by entry count; the least recently read entry is
+    # dropped first.
+
+    def __init__(self, max_entries=1000, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        expires_at = time.time() + timeout if timeout else 0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(object):
+    # One pickle per key under `directory`, shared by every process on the
+    # host. Writes go through a temporary file and an atomic rename.
+
+    def __init__(self, directory, max_entries=10000, default_timeout=300):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        if expires_at and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        expires_at = time.time() + timeout if timeout else 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _prune(self):
+        # Drop the least recently written files once over `max_entries`.
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if not name.startswith('.tmp')]
+            if len(paths) <= self.max_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_entries]:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+#----------------------------------------------------------------------------#
+# Detail page cache.
+#----------------------------------------------------------------------------#
+
+# show_venue/show_artist pages are cached whole. Every page is tagged with
+# the venue and artist ids it displays; a committed change to any of those
+# rows (or to a show between them) bumps the tag's version and every page
+# carrying the old version becomes a miss. Invalidation is driven by the
+# commit listener in events.py, so it covers every write path. Pages also
+# expire when their next upcoming show starts, so a show never lingers
+# under "upcoming".
+
+
+class PageCache(object):
+
+    def __init__(self, backend, default_timeout=300):
+        self.backend = backend
+        self.default_timeout = default_timeout
+
+    def _tag_versions(self, tags):
+        versions = {}
+        for tag in tags:
+            version = self.backend.get('tag:' + tag)
+            if version is None:
+                version = f'{uuid.uuid4().hex}:0'
+                self.backend.set('tag:' + tag, version, timeout=0)
+            versions[tag] = version
+        return versions
+
+    def invalidate(self, tags):
+        for tag in tags:
+            # The version records when the tag was invalidated.
+            self.backend.set('tag:' + tag, f'{uuid.uuid4().hex}:{time.time():.0f}', timeout=0)
+
+    def replica_timeout(self, versions):
+        # A page rendered from a lagging replica shortly after one of its
+        # tags was invalidated may predate the change; it is only kept for
+        # the read-your-writes window (see database.py).
+        if not database.reads_from_replica():
+            return None
+        window = current_app.config['READ_YOUR_WRITES_SECONDS']
+        invalidated = max(float(version.partition(':')[2] or 0) for version in versions.values())
+        if time.time() - invalidated < window:
+            return window
+        return None
+
+    def cached(self, key, render):
+        # render() -> (html, tags, expires_at); `tags` must include `key`.
+        # Pages that carry flashed messages are neither served from nor
+        # stored in the cache.
+        if '_flashes' in session:
+            return render()[0]
+        entry = self.backend.get('page:' + key)
+        if entry is not None:
+            html, versions = entry
+            if self._tag_versions(versions) == versions:
+                metrics.cache_lookup('page', True)
+                return html
+        metrics.cache_lookup('page', False)
+        # The page's own tag is read before rendering so that an edit
+        # committed while it renders leaves a stale entry behind, not a
+        # fresh-looking one.
+        versions = self._tag_versions([key])
+        html, tags, expires_at = render()
+        versions.update(self._tag_versions(set(tags) - set(versions)))
+        timeout = self.default_timeout
+        if expires_at is not None:
+            timeout = min(timeout, max(1, int(expires_at - time.time())))
+        replica_timeout = self.replica_timeout(versions)
+        if replica_timeout is not None:
+            timeout = min(timeout, replica_timeout)
+        self.backend.set('page:' + key, (html, versions), timeout=timeout)
+        return html
+
+
+def venue_tag(venue_id):
+    return f'venue:{venue_id}'
+
+
+def artist_tag(artist_id):
+    return f'artist:{artist_id}'
+
+
+def _invalidate_changes(app, changes):
+    tags = {venue_tag(id) for id in changes.ids(Venue)}
+    tags |= {artist_tag(id) for id in changes.ids(Artist)}
+    for show in list(changes.upserted[Show].values()) + list(changes.deleted[Show].values()):
+        tags.add(venue_tag(show['venue_id']))
+        tags.add(artist_tag(show['artist_id']))
+    if tags:
+        app.extensions['page_cache'].invalidate(tags)
+
+
+def page_cache():
+    return current_app.extensions['page_cache']
+
+
+def make_backend(app):
+    cache_type = app.config.get('CACHE_TYPE', 'memory')
+    timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    max_entries = app.config.get('CACHE_MAX_ENTRIES', 1000)
+    if cache_type == 'memory':
+        return LRUCache(max_entries=max_entries, default_timeout=timeout)
+    if cache_type == 'filesystem':
+        return FileSystemCache(app.config['CACHE_DIR'], max_entries=max_entries,
+                               default_timeout=timeout)
+    if cache_type == 'null':
+        return NullCache()
+    raise ValueError(f'Unknown CACHE_TYPE {cache_type!r}')
+
+
+def init_app(app):
+    app.extensions['page_cache'] = PageCache(
+        make_backend(app), default_timeout=app.config.get('CACHE_DEFAULT_TIMEOUT', 300))
+    events.on_commit(app, lambda changes: _invalidate_changes(app, changes))
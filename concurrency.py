@@ -0,0 +1,28 @@
+#----------------------------------------------------------------------------#
+# Cooperative serving.
+#----------------------------------------------------------------------------#
+
+# Most of a request's time is spent waiting on Postgres. Under gevent
+# (WORKER_CLASS = 'gevent') each worker runs its requests on greenlets, and
+# a greenlet that waits gives the process to the others:
+#
+#   - gevent.monkey makes sockets, sleep, threading and queue cooperative,
+#     which covers the HTTP fetches in thumbnails.py, the pool's locks and
+#     the background refresh threads (they become greenlets);
+#   - psycopg2 talks to Postgres in C, out of gevent's reach, so psycogreen
+#     installs a wait callback that polls its socket through the gevent hub.
+#
+# patch() must run before anything else is imported: locks, thread locals
+# and the psycopg2 connection mode created before it stay blocking. With
+# preload_app the master imports the app, so gunicorn.conf.py patches at the
+# top of the config file rather than leaving it to the workers.
+#
+# CPU-bound work (thumbnail resizing, first builds of the in-process
+# indexes, which app.warm() does before forking) still holds the process.
+
+
+def patch():
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -1,11 +1,38 @@
 import os
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Must be the same in every worker and on every host (see sessions.py):
+# set SECRET_KEY, or SECRET_KEY_FILE to a file holding it. Retired keys go
+# in SECRET_KEY_FALLBACKS (comma separated) and are still accepted.
+SECRET_KEY = os.getenv('SECRET_KEY')
+SECRET_KEY_FILE = os.getenv('SECRET_KEY_FILE', os.path.join(basedir, 'instance', 'secret_key'))
+SECRET_KEY_FALLBACKS = [key for key in os.getenv('SECRET_KEY_FALLBACKS', '').split(',') if key]
+
+# Where session data lives: 'cookie' (signed cookie), or on the server with
+# only its id in the cookie: 'redis' (SESSION_REDIS_URL), 'filesystem'
+# (the workers of one host, under SESSION_DIR) or 'memory' (one process).
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie')
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+SESSION_DIR = os.getenv('SESSION_DIR', os.path.join(basedir, 'instance', 'sessions'))
+SESSION_MAX_ENTRIES = 100000
+
+# Debug mode (debugger, reloader, template reloading) is off unless
+# FLASK_ENV=development or FLASK_DEBUG=1; wsgi.py always turns it off.
+DEBUG = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
+
+# Templates are re-read when their file changes only in debug mode;
+# otherwise each is loaded once per process (see template_cache.py).
+TEMPLATES_AUTO_RELOAD = DEBUG
+
+# Compiled templates, shared by the workers of a host ('' to disable).
+# Filled by `flask templates compile` at build time.
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(basedir, 'instance', 'template_cache'))
+
+# Outside debug mode, the app log also goes to LOG_FILE ('' for stderr only,
+# e.g. when gunicorn collects it).
+LOG_FILE = os.getenv('LOG_FILE', 'error.log')
 
 # Connect to the database
 
@@ -18,5 +45,112 @@ DB_PATH = 'postgresql://{}@{}/{}'.format(DB_USER, DB_HOST, DB_NAME)
 
 # DB_PATH = 'postgresql+psycopg2://{}@{}/{}'.format(DB_USER, DB_HOST, DB_NAME)
 
-SQLALCHEMY_DATABASE_URI = DB_PATH
+# DATABASE_URL overrides the pieces above (benchmarks, SQLite runs).
+SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', DB_PATH)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# gunicorn worker class (gunicorn.conf.py): 'sync' serves one request per
+# process at a time, 'gevent' hundreds of them on greenlets that yield
+# while they wait on Postgres (see concurrency.py).
+WORKER_CLASS = os.getenv('WORKER_CLASS', 'sync')
+
+# Connection pool, per process (Postgres only; see database.py). Pre-ping
+# replaces connections the server or a proxy closed while they sat idle.
+# A gevent worker has many requests in flight, so its pool is larger; the
+# rest wait up to DB_POOL_TIMEOUT for a connection. Keep workers x (size +
+# overflow) under the server's max_connections, or use PgBouncer.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20' if WORKER_CLASS == 'gevent' else '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20' if WORKER_CLASS == 'gevent' else '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+# Set when connecting through PgBouncer in transaction pooling mode.
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', '0') == '1'
+
+# Statement timeouts for requests, in milliseconds (0 for none). CLI
+# commands run without one. An export reads through a server-side cursor
+# and every chunk is its own FETCH, so its timeout bounds one chunk, not
+# the whole download.
+STATEMENT_TIMEOUT_MS = int(os.getenv('STATEMENT_TIMEOUT_MS', '5000'))
+ROUTE_STATEMENT_TIMEOUTS_MS = {
+    'venues.search_venues': 2000,
+    'artists.search_artists': 2000,
+    'venues.venue_availability': 2000,
+    'api.export': 30000,
+}
+
+# Partner tokens for /export/<kind> (comma separated), sent as
+# "Authorization: Bearer <token>". The endpoint answers 404 while none is set.
+EXPORT_TOKENS = [token for token in os.getenv('EXPORT_TOKENS', '').split(',') if token]
+
+# Optional read replica for the read-only pages. After a write, that
+# client's reads stay on the primary for READ_YOUR_WRITES_SECONDS.
+SQLALCHEMY_REPLICA_URI = os.getenv('DATABASE_REPLICA_URL')
+READ_REPLICA_ENDPOINTS = {
+    'venues.venues', 'artists.artists', 'shows.shows',
+    'venues.show_venue', 'artists.show_artist',
+    'venues.search_venues', 'artists.search_artists', 'venues.venue_availability',
+    'genres.genre_index', 'genres.show_genre',
+}
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+
+# Listing and search pages are paged with keyset cursors; ?per_page= may
+# override the default up to MAX_PAGE_SIZE.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Search backend for the venue/artist search pages: 'postgres' (full-text +
+# pg_trgm indexes), 'memory' (in-process index) or 'auto' to pick by database.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+# The memory backend's index follows writes made by other processes this
+# often (seconds, 0 to never; see events.ChangePoller).
+SEARCH_REFRESH_SECONDS = int(os.getenv('SEARCH_REFRESH_SECONDS', '30'))
+
+# Venue and artist detail pages are cached: CACHE_TYPE is 'memory' (per
+# process LRU), 'filesystem' (shared by the workers on a host, under
+# CACHE_DIR) or 'null' to disable. A 'memory' cache only hears about its
+# own process's writes, so gunicorn.conf.py defaults to 'filesystem'; with
+# several hosts, each host's cache only hears about its own writes.
+CACHE_TYPE = os.getenv('CACHE_TYPE', 'memory')
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(basedir, 'instance', 'cache'))
+CACHE_DEFAULT_TIMEOUT = 300
+CACHE_MAX_ENTRIES = 1000
+
+# The autocomplete name index follows writes made by other processes this
+# often (seconds, 0 to never; see events.ChangePoller).
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '30'))
+
+# Per-request instrumentation: a Server-Timing header with SQL, template
+# and total time, and a warning in the log (with the slowest statements)
+# for requests over SLOW_REQUEST_THRESHOLD_MS. Only INSTRUMENTATION_SAMPLE_RATE
+# of the requests are measured; disabling it removes the hooks entirely.
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', '1') == '1'
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '1.0'))
+SERVER_TIMING_HEADER = True
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '500'))
+SLOW_REQUEST_LOG_STATEMENTS = 5
+
+# `flask startup-profile` fails when importing wsgi.py (what every worker
+# does before its first request) takes longer than this, in milliseconds.
+STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', '750'))
+
+# Prometheus metrics at /metrics (see metrics.py): request latency, queries
+# per request, pool usage and cache hits, summed across the gunicorn workers.
+# Scrapers should reach it directly; keep it off the public proxy.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# `flask assets build` output, under static/. Once it exists, templates use
+# the bundled, fingerprinted files, which are cached for ASSETS_MAX_AGE
+# seconds; rebuild (or `flask assets clean`) after editing static/.
+ASSETS_OUTPUT = 'dist'
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# image_link thumbnails (thumbnails.py), stored under THUMBNAIL_CACHE_DIR and
+# evicted least recently used first past THUMBNAIL_CACHE_MAX_BYTES. Proxy
+# URLs are signed with THUMBNAIL_KEY (the secret keys when unset), which
+# must be the same in every worker.
+THUMBNAIL_KEY = os.getenv('THUMBNAIL_KEY')
+THUMBNAIL_CACHE_DIR = os.getenv('THUMBNAIL_CACHE_DIR', os.path.join(basedir, 'instance', 'thumbnails'))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+THUMBNAIL_MAX_AGE = 24 * 3600
+THUMBNAIL_PREFETCH = os.getenv('THUMBNAIL_PREFETCH', '1') == '1'
@@ -0,0 +1,231 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+
+import genres
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count, past_shows_count and
+# next_show_at so listing and search pages never have to touch `shows`.
+# Whenever a show is added, moved or deleted, the counters of the rows it
+# leaves and joins are adjusted by relative increments inside the same
+# transaction (add_show_counts), so concurrent bookings for one venue add
+# up instead of overwriting each other; next_show_at is only recomputed
+# when an upcoming show goes away. Shows also move from upcoming to past
+# simply because time passes; `flask rollover-shows` (run from cron every
+# few minutes) recomputes the rows whose next show has started since the
+# last run.
+
+COUNTER_COLUMNS = ('upcoming_shows_count', 'past_shows_count', 'next_show_at')
+
+_OWNERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def _expire_counters(session, model, ids):
+    # Instances already in the session would otherwise keep the values they
+    # were loaded with.
+    for id in ids:
+        instance = session.identity_map.get(session.identity_key(model, id))
+        if instance is not None:
+            session.expire(instance, COUNTER_COLUMNS)
+
+
+def _lock_rows(session, model, ids):
+    # Waits for transactions that are adjusting these rows to commit, so
+    # that the recount below (a later statement, with a later snapshot under
+    # READ COMMITTED) includes their shows, and makes later adjustments wait
+    # for the recount. Ids are sorted to lock in a consistent order.
+    session.execute(db.select(model.id).where(model.id.in_(ids))
+                    .order_by(model.id).with_for_update())
+
+
+def refresh_show_counters(session, venue_ids=(), artist_ids=(), now=None):
+    # Recounts the rows from `shows` (rollover, repairs). The write path
+    # adjusts the counters instead (see _after_flush_postexec).
+    if now is None:
+        now = datetime.now()
+    for (model, show_fk), ids in zip(_OWNERS, (venue_ids, artist_ids)):
+        ids = sorted(id for id in set(ids) if id is not None)
+        if not ids:
+            continue
+        _lock_rows(session, model, ids)
+        owned = show_fk == model.id
+        upcoming = db.select(db.func.count(Show.id)).where(
+            owned, Show.show_date_time > now).scalar_subquery()
+        past = db.select(db.func.count(Show.id)).where(
+            owned, Show.show_date_time <= now).scalar_subquery()
+        next_show_at = db.select(db.func.min(Show.show_date_time)).where(
+            owned, Show.show_date_time > now).scalar_subquery()
+        session.execute(
+            model.__table__.update().where(model.id.in_(ids)).values(
+                upcoming_shows_count=upcoming,
+                past_shows_count=past,
+                next_show_at=next_show_at))
+        _expire_counters(session, model, ids)
+
+
+def refresh_next_show(session, model, ids, now=None):
+    # Recomputes next_show_at alone, after upcoming shows went away.
+    if now is None:
+        now = datetime.now()
+    ids = sorted(ids)
+    if not ids:
+        return
+    show_fk = dict(_OWNERS)[model]
+    session.execute(model.__table__.update().where(model.id.in_(ids)).values(
+        next_show_at=db.select(db.func.min(Show.show_date_time)).where(
+            show_fk == model.id, Show.show_date_time > now).scalar_subquery()))
+    _expire_counters(session, model, ids)
+
+
+def upcoming_show_counts(model, ids):
+    # {id: number of upcoming shows} for a page of venue or artist ids, read
+    # from the maintained counter column.
+    if not ids:
+        return {}
+    return dict(db.session.query(model.id, model.upcoming_shows_count).filter(
+        model.id.in_(ids)).all())
+
+
+def add_show_counts(session, model, deltas):
+    # Bulk writers that insert shows with Core statements apply what they
+    # added here instead of recounting: deltas is {id: [upcoming, past,
+    # earliest upcoming start or None]}. Increments are relative, so
+    # concurrent bookings are not lost.
+    if not deltas:
+        return
+    table = model.__table__
+    next_show_at = db.bindparam('b_next', type_=db.DateTime())
+    statement = table.update().where(table.c.id == db.bindparam('b_id')).values(
+        upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('b_upcoming'),
+        past_shows_count=table.c.past_shows_count + db.bindparam('b_past'),
+        next_show_at=db.case(
+            (db.and_(next_show_at.isnot(None),
+                     db.or_(table.c.next_show_at.is_(None),
+                            table.c.next_show_at > next_show_at)), next_show_at),
+            else_=table.c.next_show_at))
+    session.execute(statement, [
+        {'b_id': id, 'b_upcoming': upcoming, 'b_past': past, 'b_next': next}
+        for id, (upcoming, past, next) in sorted(deltas.items())])
+
+
+def rollover_show_counters(session, now=None, batch_size=1000):
+    # Refreshes every venue/artist whose next show is no longer upcoming.
+    if now is None:
+        now = datetime.now()
+    refreshed = 0
+    for model in (Venue, Artist):
+        stale = [id for id, in session.query(model.id).filter(model.next_show_at <= now)]
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            if model is Venue:
+                refresh_show_counters(session, venue_ids=batch, now=now)
+            else:
+                refresh_show_counters(session, artist_ids=batch, now=now)
+        refreshed += len(stale)
+    return refreshed
+
+
+_SHOW_KEYS = ('venue_id', 'artist_id', 'show_date_time')
+
+
+def _committed_value(obj, key):
+    # The value `key` had before this flush. _keep_previous_value makes
+    # assignments load it first, even to an attribute expired by a commit.
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+def _before_flush(session, flush_context, instances):
+    # The shows' previous owners and times are read before the flush writes
+    # over them; the new ones after it, once relationships have set the
+    # foreign keys. Shows removed by a venue or artist delete cascade are in
+    # session.deleted like any other.
+    pending = session.info.setdefault('show_counter_changes',
+                                      {'deleted': [], 'moved': [], 'added': []})
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            pending['deleted'].append(tuple(_committed_value(obj, key) for key in _SHOW_KEYS))
+    for obj in session.dirty:
+        if isinstance(obj, Show):
+            pending['moved'].append((obj, tuple(_committed_value(obj, key) for key in _SHOW_KEYS)))
+    for obj in session.new:
+        if isinstance(obj, Show):
+            pending['added'].append(obj)
+
+
+def _after_flush_postexec(session, flush_context):
+    pending = session.info.pop('show_counter_changes', None)
+    if not pending:
+        return
+    now = datetime.now()
+    # (model, id) -> [upcoming, past, earliest upcoming start added]
+    deltas = {}
+    lost_upcoming = set()
+
+    def count(venue_id, artist_id, when, step):
+        if when is None:
+            return
+        upcoming = when > now
+        for model, id in ((Venue, venue_id), (Artist, artist_id)):
+            if id is None:
+                continue
+            delta = deltas.setdefault((model, id), [0, 0, None])
+            delta[0 if upcoming else 1] += step
+            if upcoming and step > 0 and (delta[2] is None or when < delta[2]):
+                delta[2] = when
+            elif upcoming and step < 0:
+                lost_upcoming.add((model, id))
+
+    for previous in pending['deleted']:
+        count(*previous, step=-1)
+    for show, previous in pending['moved']:
+        current = tuple(getattr(show, key) for key in _SHOW_KEYS)
+        if current != previous:
+            count(*previous, step=-1)
+            count(*current, step=1)
+    for show in pending['added']:
+        count(show.venue_id, show.artist_id, show.show_date_time, step=1)
+
+    # For the upcoming show counts of the artists' genres (genres.py).
+    session.info['artist_upcoming_changes'] = {
+        id: delta[0] for (owner, id), delta in deltas.items() if owner is Artist and delta[0]}
+    for model in (Venue, Artist):
+        changed = {id: delta for (owner, id), delta in deltas.items()
+                   if owner is model and delta != [0, 0, None]}
+        add_show_counts(session, model, changed)
+        _expire_counters(session, model, changed)
+        refresh_next_show(session, model,
+                          [id for owner, id in lost_upcoming if owner is model], now)
+
+
+@click.command('rollover-shows')
+@with_appcontext
+def rollover_shows_command():
+    """Move shows that have started from the upcoming to the past counters."""
+    refreshed = rollover_show_counters(db.session)
+    if refreshed:
+        # Upcoming shows per genre are summed from the artist counters.
+        genres.refresh_genre_counts(db.session)
+    db.session.commit()
+    click.echo(f'Refreshed show counters for {refreshed} venues and artists.')
+
+
+def init_app(app):
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        for key in _SHOW_KEYS:
+            event.listen(getattr(Show, key), 'set', _keep_previous_value,
+                         active_history=True)
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush_postexec', _after_flush_postexec)
+    app.cli.add_command(rollover_shows_command)
@@ -0,0 +1,157 @@
+import time
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.pool import NullPool
+
+#----------------------------------------------------------------------------#
+# Engine configuration.
+#----------------------------------------------------------------------------#
+
+# SQLALCHEMY_ENGINE_OPTIONS is built from the DB_* settings in config.py
+# (anything set there explicitly wins). Pool sizing only applies to
+# Postgres; SQLite keeps SQLAlchemy's defaults.
+#
+# Behind PgBouncer in transaction mode (DB_PGBOUNCER) consecutive
+# transactions may run on different server connections, so:
+#   - PgBouncer does the pooling and the app uses NullPool;
+#   - nothing is set per connection (PgBouncer rejects startup options and
+#     a plain SET would leak to other clients); the statement timeout is
+#     sent as SET LOCAL in every transaction instead.
+# psycopg2 uses no server-side prepared statements, and server-side
+# cursors (exporter.py) live inside one transaction, so both are safe.
+
+
+def engine_options(config):
+    options = {}
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgres'):
+        return options
+    if config['DB_PGBOUNCER']:
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_pre_ping=config['DB_POOL_PRE_PING'],
+        )
+        if config['STATEMENT_TIMEOUT_MS']:
+            options['connect_args'] = {
+                'options': f'-c statement_timeout={config["STATEMENT_TIMEOUT_MS"]}'}
+    return options
+
+
+#----------------------------------------------------------------------------#
+# Statement timeouts.
+#----------------------------------------------------------------------------#
+
+# Requests get STATEMENT_TIMEOUT_MS unless ROUTE_STATEMENT_TIMEOUTS_MS has
+# an entry for their endpoint; 0 means no limit. Commands and background
+# work outside a request are not limited. A transaction whose timeout
+# differs from the one its connection was opened with starts with
+# SET LOCAL, which ends with the transaction.
+
+
+def statement_timeout():
+    if not has_request_context():
+        return 0
+    config = current_app.config
+    return config['ROUTE_STATEMENT_TIMEOUTS_MS'].get(request.endpoint,
+                                                     config['STATEMENT_TIMEOUT_MS'])
+
+
+def _connection_timeout(config):
+    # The timeout every new connection already has.
+    if config['DB_PGBOUNCER']:
+        return 0
+    return config['STATEMENT_TIMEOUT_MS']
+
+
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    timeout = statement_timeout()
+    if timeout != _connection_timeout(current_app.config):
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# With DATABASE_REPLICA_URL set, the session sends the queries of the
+# read-only endpoints (READ_REPLICA_ENDPOINTS) to the replica and
+# everything else, including every flush, to the primary. A client that has
+# just written (any non-GET request to another endpoint) carries a cookie
+# that keeps its reads on the primary for READ_YOUR_WRITES_SECONDS, so it
+# sees its own change even when the replica lags.
+
+REPLICA_BIND = 'replica'
+PRIMARY_UNTIL_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def reads_from_replica():
+    # True when the current request's reads go to the replica.
+    if not has_request_context():
+        return False
+    config = current_app.config
+    if REPLICA_BIND not in (config.get('SQLALCHEMY_BINDS') or {}):
+        return False
+    if request.endpoint not in config['READ_REPLICA_ENDPOINTS']:
+        return False
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_UNTIL_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    return primary_until < time.time()
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and reads_from_replica():
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def _remember_write(response):
+    if request.method not in SAFE_METHODS and \
+            request.endpoint not in current_app.config['READ_REPLICA_ENDPOINTS']:
+        window = current_app.config['READ_YOUR_WRITES_SECONDS']
+        response.set_cookie(PRIMARY_UNTIL_COOKIE, str(int(time.time() + window) + 1),
+                            max_age=window + 1, httponly=True, samesite='Lax')
+    return response
+
+
+def dispose_engines(app, db):
+    # Closes the pooled connections of every engine (the primary and any
+    # binds); the pools reconnect on next use. Run before forking workers.
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+        db.get_engine(app, bind=bind).dispose()
+
+
+def init_app(app, db):
+    # Runs before db.init_app(), which fills in defaults for the rest.
+    config = app.config
+    options = engine_options(config)
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    if config['SQLALCHEMY_REPLICA_URI']:
+        config['SQLALCHEMY_BINDS'] = dict(config.get('SQLALCHEMY_BINDS') or {},
+                                          **{REPLICA_BIND: config['SQLALCHEMY_REPLICA_URI']})
+        app.after_request(_remember_write)
+    if not event.contains(db.session, 'after_begin', _set_statement_timeout):
+        event.listen(db.session, 'after_begin', _set_statement_timeout)
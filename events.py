@@ -0,0 +1,156 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Commit notifications.
+#----------------------------------------------------------------------------#
+
+# In-process indexes and caches need to hear about every write, whichever
+# route or command made it. Rather than each write path remembering to call
+# them, changes are collected from the session as it flushes and handed to
+# the registered listeners once the transaction has committed. Rolled back
+# work is discarded. Listeners belong to an app, so that several apps (tests,
+# scripts) in one process do not notify each other's caches.
+
+TRACKED_MODELS = (Venue, Artist, Show)
+
+
+class ChangeSet(object):
+
+    def __init__(self):
+        # model -> {id: column values}, snapshotted at flush time because
+        # instances are expired (and cannot be reloaded) after the commit.
+        self.upserted = {model: {} for model in TRACKED_MODELS}
+        self.deleted = {model: {} for model in TRACKED_MODELS}
+
+    def __bool__(self):
+        return any(self.upserted.values()) or any(self.deleted.values())
+
+    def ids(self, model):
+        return set(self.upserted[model]) | set(self.deleted[model])
+
+
+def on_commit(app, listener):
+    # Registers `listener(changes)` for the commits made under `app`.
+    app.extensions.setdefault('commit_listeners', []).append(listener)
+    return listener
+
+
+def _snapshot(obj):
+    return {attr.key: getattr(obj, attr.key)
+            for attr in inspect(obj).mapper.column_attrs}
+
+
+def _pending_changes(session):
+    changes = session.info.get('pending_changes')
+    if changes is None:
+        changes = session.info['pending_changes'] = ChangeSet()
+    return changes
+
+
+def _after_flush(session, flush_context):
+    changes = _pending_changes(session)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, TRACKED_MODELS) and obj.id is not None:
+            changes.upserted[type(obj)][obj.id] = _snapshot(obj)
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED_MODELS):
+            changes.upserted[type(obj)].pop(obj.id, None)
+            changes.deleted[type(obj)][obj.id] = _snapshot(obj)
+
+
+def notify(changes):
+    # Hands a ChangeSet to the listeners. Bulk writers that bypass the ORM
+    # (importer.py) call this themselves once they have committed.
+    if not changes:
+        return
+    for listener in current_app.extensions.get('commit_listeners', ()):
+        listener(changes)
+
+
+def _after_commit(session):
+    notify(session.info.pop('pending_changes', None))
+
+
+def _after_transaction_end(session, transaction):
+    # Anything still pending when the outermost transaction ends was rolled
+    # back or abandoned by close().
+    if transaction.parent is None:
+        session.info.pop('pending_changes', None)
+
+
+#----------------------------------------------------------------------------#
+# Writes made by other processes.
+#----------------------------------------------------------------------------#
+
+# Commit listeners only hear about the commits of their own process. An
+# in-process index that also has to follow the other workers polls a
+# ChangePoller at most every `interval` seconds, on a request that reads
+# it: rows whose updated_at is past the previous poll are read again, less
+# a margin for transactions that flushed before it (updated_at is set at
+# flush time) but committed after, and for clock differences between hosts.
+# Deletes leave no row behind, so when the row count no longer matches the
+# index, the ids are compared. Each poll is a couple of indexed queries; the
+# index is never rebuilt from scratch.
+
+
+class ChangePoller(object):
+
+    def __init__(self, columns, interval, margin=60):
+        # columns: {model: [column names to read]}; each model needs
+        # `id` and `updated_at`.
+        self.columns = columns
+        self.interval = interval
+        self.margin = timedelta(seconds=margin)
+        self._since = None
+        self._polled_at = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        # Called just before the index is loaded; the index already holds
+        # anything written until then.
+        self._since = datetime.utcnow()
+        self._polled_at = time.monotonic()
+
+    def poll(self, known_ids):
+        # known_ids(model) -> the ids the index holds. Returns a ChangeSet of
+        # the writes since the previous poll (deleted entries carry no
+        # values), or None when it is not time to poll yet.
+        if not self.interval or self._since is None or \
+                time.monotonic() - self._polled_at < self.interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            started = datetime.utcnow()
+            changes = ChangeSet()
+            for model, names in self.columns.items():
+                columns = [getattr(model, name) for name in names]
+                rows = db.session.query(*columns).filter(
+                    model.updated_at >= self._since - self.margin)
+                for row in rows:
+                    changes.upserted[model][row.id] = row._asdict()
+                known = set(known_ids(model))
+                expected = len(known | set(changes.upserted[model]))
+                if db.session.query(db.func.count(model.id)).scalar() != expected:
+                    present = {id for id, in db.session.query(model.id)}
+                    for id in known - present:
+                        changes.deleted[model][id] = {}
+            self._since = started
+            self._polled_at = time.monotonic()
+            return changes
+        finally:
+            self._lock.release()
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_transaction_end', _after_transaction_end)
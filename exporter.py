@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# Full-table exports for partners, served by /export/<kind> (with a
+# partner token, see EXPORT_TOKENS in config.py) and written by
+# `flask export <kind>`. Rows are read through a server-side cursor
+# (stream_results, plus yield_per so the ORM does not buffer the result) in
+# chunks of CHUNK_SIZE and encoded as they arrive, so memory stays flat
+# whatever the size of the table. Columns use the form
+# field names, so an export can be fed back to `flask import`.
+#
+# updated_since selects rows inserted or changed at or after a UTC time;
+# clients pass back the watermark of their previous export (sent as the
+# X-Export-Watermark header). Deletions are not reported. updated_at is
+# stamped when a row is flushed, not when its transaction commits, so the
+# watermark is WATERMARK_MARGIN before the export started: a row flushed
+# earlier but committed after the export read the table is picked up by the
+# next one. Rows changed within the margin are exported twice; clients
+# apply rows by id and keep the one with the latest updated_at.
+
+CHUNK_SIZE = 1000
+WATERMARK_MARGIN = timedelta(minutes=5)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# kind -> [(exported name, column)]
+EXPORT_COLUMNS = {
+    'venues': [
+        ('id', Venue.id),
+        ('name', Venue.name),
+        ('city', Venue.city),
+        ('state', Venue.state),
+        ('address', Venue.address),
+        ('phone', Venue.phone),
+        ('genres', Venue.genres),
+        ('image_link', Venue.image_link),
+        ('website_link', Venue.website_link),
+        ('facebook_link', Venue.facebook_link),
+        ('seeking_talent', Venue.looking_for_talent),
+        ('seeking_description', Venue.description),
+        ('upcoming_shows_count', Venue.upcoming_shows_count),
+        ('past_shows_count', Venue.past_shows_count),
+        ('updated_at', Venue.updated_at),
+    ],
+    'artists': [
+        ('id', Artist.id),
+        ('name', Artist.name),
+        ('city', Artist.city),
+        ('state', Artist.state),
+        ('phone', Artist.phone),
+        ('genres', Artist.genres),
+        ('image_link', Artist.image_link),
+        ('website_link', Artist.website_link),
+        ('facebook_link', Artist.facebook_link),
+        ('seeking_venue', Artist.seeking_venue),
+        ('seeking_description', Artist.seeking_description),
+        ('upcoming_shows_count', Artist.upcoming_shows_count),
+        ('past_shows_count', Artist.past_shows_count),
+        ('updated_at', Artist.updated_at),
+    ],
+    'shows': [
+        ('id', Show.id),
+        ('start_time', Show.show_date_time),
+        ('end_time', Show.end_date_time),
+        ('artist_id', Show.artist_id),
+        ('artist', Artist.name),
+        ('venue_id', Show.venue_id),
+        ('venue', Venue.name),
+        ('updated_at', Show.updated_at),
+    ],
+}
+
+
+def parse_time(value):
+    # 'YYYY-MM-DD' or an ISO date and time; None when empty.
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+def watermark():
+    # The updated_since to hand out with an export that starts now.
+    return datetime.utcnow() - WATERMARK_MARGIN
+
+
+def export_query(kind, start=None, end=None, updated_since=None):
+    names, columns = zip(*EXPORT_COLUMNS[kind])
+    query = db.select(*[column.label(name) for name, column in zip(names, columns)])
+    if kind == 'shows':
+        query = query.select_from(Show).join(Artist, Show.artist_id == Artist.id).join(
+            Venue, Show.venue_id == Venue.id)
+        if start is not None:
+            query = query.where(Show.show_date_time >= start)
+        if end is not None:
+            query = query.where(Show.show_date_time < end)
+    model = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind]
+    if updated_since is not None:
+        query = query.where(model.updated_at >= updated_since)
+    return names, query.order_by(model.id)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, list):
+        return ','.join(value)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def generate_export(kind, format, **filters):
+    # Yields encoded chunks of roughly CHUNK_SIZE rows.
+    names, query = export_query(kind, **filters)
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=CHUNK_SIZE))
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+    for rows in result.partitions(CHUNK_SIZE):
+        if format == 'csv':
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(names, map(_json_value, row)))))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if format == 'csv' and buffer.tell():
+        yield buffer.getvalue()
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORT_COLUMNS)))
+@click.option('--format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--start', help='Shows starting at or after this date/time.')
+@click.option('--end', help='Shows starting before this date/time.')
+@click.option('--updated-since', help='Rows changed at or after this UTC date/time.')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Output file; standard output by default.')
+@with_appcontext
+def export_command(kind, format, start, end, updated_since, output):
+    """Stream every venue, artist or show to a CSV or NDJSON file."""
+    try:
+        filters = {'start': parse_time(start), 'end': parse_time(end),
+                   'updated_since': parse_time(updated_since)}
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    since = watermark()
+    for chunk in generate_export(kind, format, **filters):
+        output.write(chunk)
+    click.echo(f'Watermark for --updated-since: {since.isoformat()}', err=True)
+
+
+def init_app(app):
+    app.cli.add_command(export_command)
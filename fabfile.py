@@ -13,6 +13,28 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(scale="1k", output="bench-results.json"):
+    local("python bench/run.py --scale {} --output {}".format(scale, output))
+
+
+def load(latency="0"):
+    local("python bench/load_test.py --db-latency-ms {}".format(latency))
+
+
+def explain():
+    # Needs TEST_POSTGRES_URL; see tests/test_query_plans.py.
+    local("python -m pytest -q tests/test_query_plans.py")
+
+
+def startup():
+    local("flask startup-profile")
+
+
+def assets():
+    local("flask assets build")
+    local("flask templates compile")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -0,0 +1,40 @@
+from datetime import datetime
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+# Parsing a Babel pattern and loading locale data are the expensive parts of
+# formatting a date, and both depend only on their arguments, so each is done
+# once per (format, locale) and reused for every show tile. Babel itself is
+# imported on the first call, like dateutil below.
+@lru_cache(maxsize=64)
+def _compiled_pattern(format):
+    from babel.dates import parse_pattern
+    return parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=16)
+def _locale(name):
+    from babel import Locale
+    return Locale.parse(name)
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    # Strings are still accepted for callers that have not been converted;
+    # dateutil is only imported if one turns up.
+    import dateutil.parser
+    return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    return _compiled_pattern(format).apply(_to_datetime(value), _locale(locale))
@@ -0,0 +1,246 @@
+from datetime import datetime
+
+import click
+from flask import request
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+
+from choices import GENRE_CHOICES
+from models import db, Venue, Artist, GenreCount
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+# Venue.genres and Artist.genres are Postgres arrays with GIN indexes
+# (AddGenreIndexes_010), so genre filters are written with the array
+# operators the index serves: `genres @> ARRAY[...]` (has every genre) and
+# `genres && ARRAY[...]` (has any of them). SQLite stores the lists as JSON
+# and gets the same conditions through json_each().
+#
+# genre_counts holds the number of venues and artists in each genre and the
+# upcoming shows of its artists, for the genre pages and listing facets.
+# Like the show counters (counters.py), every flush adds what it changed to
+# the rows of the genres it touches, as relative increments inside the same
+# transaction; `flask rollover-shows` and `flask genres recount` recompute
+# all of them.
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+
+GENRES = [value for value, label in GENRE_CHOICES]
+_canonical = {genre.lower(): genre for genre in GENRES}
+
+
+def canonical_genre(name):
+    # The genre spelled as stored, or None for an unknown one.
+    return _canonical.get((name or '').strip().lower())
+
+
+def _postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def has_genres(column, genres, match=MATCH_ALL):
+    # Condition on a genres column: it holds every one of `genres`
+    # (MATCH_ALL) or at least one (MATCH_ANY). The genres may be strings or
+    # column expressions.
+    genres = list(genres)
+    if _postgres():
+        wanted = db.cast(postgresql.array(genres), postgresql.ARRAY(db.String))
+        return column.op('@>' if match == MATCH_ALL else '&&')(wanted)
+    items = db.func.json_each(column).table_valued('value')
+    matched = db.select(db.func.count(db.distinct(items.c.value))).where(
+        items.c.value.in_(genres)).correlate_except(items).scalar_subquery()
+    return matched == len(set(genres)) if match == MATCH_ALL else matched > 0
+
+
+def genres_match(values, genres, match=MATCH_ALL):
+    # has_genres() for a list already in memory.
+    values = set(values or ())
+    if match == MATCH_ALL:
+        return values.issuperset(genres)
+    return not values.isdisjoint(genres)
+
+
+def selected_genres():
+    # The known genres and the match mode asked for by the `genres` (and
+    # `genres_match`) request arguments; unknown genres are ignored.
+    genres = []
+    for value in request.values.getlist('genres'):
+        genre = canonical_genre(value)
+        if genre is not None and genre not in genres:
+            genres.append(genre)
+    match = request.values.get('genres_match', MATCH_ALL)
+    return genres, match if match in (MATCH_ALL, MATCH_ANY) else MATCH_ALL
+
+
+def genre_counts():
+    # [GenreCount] in GENRES order, with zero rows for unused genres.
+    rows = {row.genre: row for row in GenreCount.query}
+    counts = [rows.pop(genre, None) or GenreCount(genre=genre, venues_count=0, artists_count=0,
+                                                  upcoming_shows_count=0)
+              for genre in GENRES]
+    return counts + sorted(rows.values(), key=lambda row: row.genre)
+
+
+#----------------------------------------------------------------------------#
+# Counts.
+#----------------------------------------------------------------------------#
+
+COUNT_COLUMNS = ('venues_count', 'artists_count', 'upcoming_shows_count')
+
+
+def _insert(table):
+    # INSERT with the ON CONFLICT clauses of the database in use.
+    return (postgresql.insert if _postgres() else sqlite.insert)(table)
+
+
+def _expire_counts(session, genres):
+    for genre in genres:
+        instance = session.identity_map.get(session.identity_key(GenreCount, genre))
+        if instance is not None:
+            session.expire(instance)
+
+
+def refresh_genre_counts(session, genres=None):
+    # Recomputes the genre_counts rows of `genres` (every genre when None),
+    # adding the missing ones. For `flask genres recount` and the rollover;
+    # writes adjust the counts with add_genre_counts().
+    table = GenreCount.__table__
+    if genres is None:
+        used = set()
+        for model in (Venue, Artist):
+            for values, in session.query(model.genres).distinct():
+                used.update(values or ())
+        genres = used | set(GENRES)
+    genres = sorted(genre for genre in set(genres) if genre)
+    if not genres:
+        return
+    session.execute(_insert(table).on_conflict_do_nothing(index_elements=[table.c.genre]),
+                    [{'genre': genre, 'updated_at': datetime.utcnow()} for genre in genres])
+    in_genre = {model: has_genres(model.genres, [table.c.genre]) for model in (Venue, Artist)}
+    session.execute(table.update().where(table.c.genre.in_(genres)).values(
+        venues_count=db.select(db.func.count(Venue.id)).where(
+            in_genre[Venue]).scalar_subquery(),
+        artists_count=db.select(db.func.count(Artist.id)).where(
+            in_genre[Artist]).scalar_subquery(),
+        upcoming_shows_count=db.select(db.func.coalesce(db.func.sum(Artist.upcoming_shows_count), 0)).where(
+            in_genre[Artist]).scalar_subquery()))
+    _expire_counts(session, genres)
+
+
+def add_genre_counts(session, deltas):
+    # deltas is {genre: [venues, artists, upcoming shows]}. Increments are
+    # relative, like counters.add_show_counts, and a genre seen for the
+    # first time is inserted by the same statement (an upsert), so
+    # concurrent writers neither lose counts nor collide on a new row.
+    deltas = {genre: delta for genre, delta in deltas.items() if genre and any(delta)}
+    if not deltas:
+        return
+    table = GenreCount.__table__
+    insert = _insert(table)
+    values = {name: table.c[name] + insert.excluded[name] for name in COUNT_COLUMNS}
+    values['updated_at'] = insert.excluded.updated_at
+    now = datetime.utcnow()
+    # Sorted, so that concurrent transactions lock the rows in one order.
+    session.execute(insert.on_conflict_do_update(index_elements=[table.c.genre], set_=values), [
+        dict(zip(COUNT_COLUMNS, delta), genre=genre, updated_at=now)
+        for genre, delta in sorted(deltas.items())])
+    _expire_counts(session, deltas)
+
+
+def add_upcoming_shows(session, artist_deltas, deltas=None, skip=()):
+    # Adds {artist id: change in upcoming shows} to the genres of those
+    # artists, in `deltas` when given (see add_genre_counts) or right away.
+    ids = sorted(id for id, delta in artist_deltas.items() if delta and id not in skip)
+    pending = {} if deltas is None else deltas
+    if ids:
+        for id, values in session.query(Artist.id, Artist.genres).filter(Artist.id.in_(ids)):
+            for genre in values or ():
+                pending.setdefault(genre, [0, 0, 0])[2] += artist_deltas[id]
+    if deltas is None:
+        add_genre_counts(session, pending)
+
+
+def _committed_genres(obj):
+    # The genres `obj` had before this flush; see _keep_previous_value.
+    history = inspect(obj).attrs.genres.history
+    return (history.deleted[0] if history.deleted else obj.genres) or ()
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+def _before_flush(session, flush_context, instances):
+    # Venue and artist writes are turned into count changes here, while the
+    # previous genres are still known. Show changes reach the upcoming
+    # counts through the artist counters (counters.py).
+    pending = session.info.setdefault('genre_count_changes', {
+        'deltas': {}, 'deleted_artists': set()})
+    deltas = pending['deltas']
+
+    def count(genres, slot, step):
+        for genre in genres:
+            deltas.setdefault(genre, [0, 0, 0])[slot] += step
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, (Venue, Artist)):
+            continue
+        slot = 0 if isinstance(obj, Venue) else 1
+        # An artist takes its upcoming shows with it from genre to genre.
+        upcoming = (obj.upcoming_shows_count or 0) if slot and obj not in session.new else 0
+        if obj in session.new:
+            previous, current = (), obj.genres or ()
+        elif obj in session.deleted:
+            previous, current = _committed_genres(obj), ()
+            if slot:
+                pending['deleted_artists'].add(obj.id)
+        elif inspect(obj).attrs.genres.history.has_changes():
+            previous, current = _committed_genres(obj), obj.genres or ()
+        else:
+            continue
+        count(previous, slot, -1)
+        count(current, slot, 1)
+        if upcoming:
+            count(previous, 2, -upcoming)
+            count(current, 2, upcoming)
+
+
+def _after_flush_postexec(session, flush_context):
+    # Runs after the show counters have been adjusted (counters.py registers
+    # first and leaves the artists' upcoming changes in session.info).
+    pending = session.info.pop('genre_count_changes', None) or {
+        'deltas': {}, 'deleted_artists': set()}
+    artist_deltas = session.info.pop('artist_upcoming_changes', None) or {}
+    add_upcoming_shows(session, artist_deltas, pending['deltas'],
+                       skip=pending['deleted_artists'])
+    add_genre_counts(session, pending['deltas'])
+
+
+@click.group('genres')
+def genres_cli():
+    """Maintain the per-genre counts."""
+
+
+@genres_cli.command('recount')
+@with_appcontext
+def recount_command():
+    """Recompute the venue, artist and upcoming show counts of every genre."""
+    refresh_genre_counts(db.session)
+    db.session.commit()
+    click.echo(f'Recounted {GenreCount.query.count()} genres.')
+
+
+def init_app(app):
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        # Reassigned genres keep their previous value for _committed_genres,
+        # even on an instance expired by a commit.
+        for model in (Venue, Artist):
+            event.listen(model.genres, 'set', _keep_previous_value, active_history=True)
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush_postexec', _after_flush_postexec)
+    app.jinja_env.globals['all_genres'] = GENRES
+    app.cli.add_command(genres_cli)
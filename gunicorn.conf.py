@@ -0,0 +1,94 @@
+import os
+
+#----------------------------------------------------------------------------#
+# gunicorn settings.
+#----------------------------------------------------------------------------#
+
+# gunicorn -c gunicorn.conf.py
+#
+# The app is imported once in the master (preload_app) and warmed there
+# (app.warm(): name and search indexes, compiled templates) before the
+# workers are forked, so each worker starts with them already built and
+# shares their memory copy-on-write instead of building its own copy. HUP
+# forks new workers from that same already-imported app, so code changes
+# are not picked up by it: they need a full restart, or USR2 to start a new
+# master (then QUIT the old one).
+#
+# WORKER_CLASS=gevent serves many requests per worker. gevent has to patch
+# before the app is imported, which with preload_app happens in this
+# process, so it is done first thing here (see concurrency.py).
+
+worker_class = os.getenv('WORKER_CLASS', 'sync')
+if worker_class == 'gevent':
+    import concurrency
+    concurrency.patch()
+
+import gc
+import multiprocessing
+import shutil
+
+# Each worker keeps its Prometheus metrics (metrics.py) in files under
+# PROMETHEUS_MULTIPROC_DIR, and /metrics sums them over the workers.
+# prometheus_client reads the variable when it is imported, so it is set
+# before the app is preloaded. The directory is emptied once per run, in
+# on_starting, so that the numbers of a previous run are not added in;
+# this file is read again on every HUP, which must keep the live ones.
+# Give every gunicorn on a host its own directory.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'prometheus'))
+os.makedirs(metrics_dir, exist_ok=True)
+
+# The workers are separate processes, and a per-process page cache would
+# keep serving a page after another worker committed a change to it, so
+# the page cache lives on disk where every worker sees the same entries
+# and invalidations (see cache.py). CACHE_TYPE still wins when it is set.
+os.environ.setdefault('CACHE_TYPE', 'filesystem')
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:' + os.getenv('PORT', '8000'))
+# Sync workers block on each request, so there are more of them than CPUs;
+# a gevent worker keeps its CPU busy by itself, up to worker_connections
+# requests at a time.
+if worker_class == 'gevent':
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+preload_app = True
+
+# Workers are replaced (forked again from the warm master) after this many
+# requests, which bounds slow leaks.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    # Once per run, before any worker exists; not called on reloads.
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def when_ready(server):
+    # Runs in the master once the preloaded app is imported and the sockets
+    # are bound, before the first worker is forked.
+    import app
+
+    app.warm(server.app.wsgi())
+    # Objects built so far are moved out of the collector's reach, so that
+    # collections in the workers do not write to (and copy) their pages.
+    gc.freeze()
+    server.log.info('Warmed the app before forking %s workers', server.num_workers)
+
+
+def child_exit(server, worker):
+    # A dead worker's gauges (requests in flight, connections checked out)
+    # no longer count; its counters and histograms still do.
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,429 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+import events
+import genres
+from booking import BookingIndex, lock_bookings
+from counters import add_show_counts
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# `flask import venues|artists|shows FILE` loads CSV or JSON-lines files
+# whose columns are the fields of the matching form (genres as a list in
+# JSON or comma separated in CSV). Each row is validated with the same form
+# the create pages use; rows that fail are reported with their line number
+# and skipped, the rest are written in batches (COPY for shows on Postgres,
+# executemany elsewhere) inside one transaction. Shows may refer to their
+# artist and venue by id (artist_id, venue_id) or by exact name (artist,
+# venue), and are rejected when they overlap another booking.
+#
+# The Core inserts bypass the ORM events, so the show and genre counters
+# are updated here and the commit listeners (page cache, in-memory search
+# index) are notified explicitly. The imported rows carry updated_at, so web
+# processes pick them up at their next ChangePoller poll: the in-memory
+# search and autocomplete indexes within SEARCH_REFRESH_SECONDS and
+# AUTOCOMPLETE_REFRESH_SECONDS. A 'filesystem' page cache on the same
+# CACHE_DIR is invalidated at once; a 'memory' one serves its pages until
+# they expire.
+
+BATCH_SIZE = 5000
+# Multi-row INSERT ... RETURNING batches; kept under SQLite's parameter
+# limit.
+RETURNING_BATCH_SIZE = 500
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n')
+
+_AMBIGUOUS = object()
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(stream, format):
+    # Yields (line number, MultiDict) pairs.
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, _formdata(record, split_lists=True)
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, RowError(f'invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield number, RowError('expected a JSON object')
+                continue
+            yield number, _formdata(record, split_lists=False)
+
+
+def _formdata(record, split_lists):
+    formdata = MultiDict()
+    for key, value in record.items():
+        if key is None or value is None:
+            continue
+        if key == 'genres':
+            values = value.split(',') if split_lists and isinstance(value, str) else value
+            if isinstance(values, str):
+                values = [values]
+            for genre in values:
+                if str(genre).strip():
+                    formdata.add(key, str(genre).strip())
+        elif key in BOOLEAN_FIELDS:
+            if isinstance(value, bool):
+                value = 'y' if value else ''
+            elif str(value).strip().lower() in FALSE_VALUES:
+                value = ''
+            formdata.add(key, str(value))
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def _venue_values(form):
+    # Same mapping as create_venue_submission.
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'genres': form.genres.data,
+        'facebook_link': form.facebook_link.data,
+        'website_link': form.website_link.data,
+        'looking_for_talent': form.seeking_talent.data,
+        'description': form.seeking_description.data,
+    }
+
+
+def _artist_values(form):
+    # Same mapping as create_artist_submission.
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'genres': form.genres.data,
+        'website_link': form.website_link.data,
+        'facebook_link': form.facebook_link.data,
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+class References(object):
+    # Resolves the artist/venue a show row refers to, by id or by name,
+    # against what is already in the database.
+
+    def __init__(self, model):
+        self.model = model
+        self._ids = None
+        self._names = None
+
+    def _load(self):
+        self._ids = set()
+        self._names = {}
+        for id, name in db.session.query(self.model.id, self.model.name):
+            self._ids.add(id)
+            self._names[name] = _AMBIGUOUS if name in self._names else id
+
+    def resolve(self, formdata, field):
+        if self._ids is None:
+            self._load()
+        label = field[:-len('_id')]
+        value = formdata.get(field, '').strip()
+        if value:
+            try:
+                id = int(value)
+            except ValueError:
+                raise RowError(f'{field} - {value!r} is not an id')
+            if id not in self._ids:
+                raise RowError(f'{field} - no {label} with id {id}')
+            return id
+        name = formdata.get(label, '').strip()
+        if not name:
+            raise RowError(f'{field} - either {field} or {label} is required')
+        id = self._names.get(name)
+        if id is None:
+            raise RowError(f'{label} - no {label} named {name!r}')
+        if id is _AMBIGUOUS:
+            raise RowError(f'{label} - more than one {label} is named {name!r}; use {field}')
+        return id
+
+
+class Importer(object):
+
+    def __init__(self, kind, dry_run=False, now=None):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.now = now or datetime.now()
+        self.imported = 0
+        self.errors = []
+        self.changes = events.ChangeSet()
+        # Only imports need the forms (and WTForms); see choices.py.
+        from forms import VenueForm, ArtistForm, ShowForm
+        if kind == 'venues':
+            self.form = VenueForm(meta={'csrf': False})
+        elif kind == 'artists':
+            self.form = ArtistForm(meta={'csrf': False})
+        else:
+            self.form = ShowForm(meta={'csrf': False})
+            self.artists = References(Artist)
+            self.venues = References(Venue)
+            # {id: [upcoming, past, next_show_at]} for the counters.
+            self.deltas = {Venue: {}, Artist: {}}
+            # (start_time, duration) values -> (start, end) or RowError.
+            self._slots = {}
+            # Checks each show against the existing ones and against the
+            # shows accepted earlier in the file (see run()).
+            self.bookings = BookingIndex()
+
+    def _validate_form(self, formdata):
+        # One form instance is reused for every row; process() rebinds it.
+        form = self.form
+        form.process(formdata)
+        if not form.validate():
+            raise RowError('; '.join(f'{field} - {", ".join(messages)}'
+                                     for field, messages in form.errors.items()))
+        return form
+
+    def _slot(self, formdata):
+        # start_time and duration are the only ShowForm fields with
+        # validators, and bookings share a handful of slots, so each distinct
+        # pair goes through the form once. A missing start_time would be
+        # filled in with the form's default (the time the app started), so
+        # it is rejected before the form sees the row.
+        if not any(value.strip() for value in formdata.getlist('start_time')):
+            raise RowError('start_time - This field is required.')
+        key = (tuple(formdata.getlist('start_time')), tuple(formdata.getlist('duration')))
+        result = self._slots.get(key)
+        if result is None:
+            if len(self._slots) >= 100000:
+                self._slots.clear()
+            try:
+                form = self._validate_form(MultiDict(
+                    [('start_time', value) for value in key[0]] +
+                    [('duration', value) for value in key[1]]))
+                start = form.start_time.data
+                duration = timedelta(minutes=form.duration.data) if form.duration.data \
+                    else DEFAULT_SHOW_DURATION
+                result = (start, start + duration)
+            except RowError as e:
+                result = e
+            self._slots[key] = result
+        if isinstance(result, RowError):
+            raise result
+        return result
+
+    def validate(self, formdata):
+        if self.kind == 'venues':
+            return _venue_values(self._validate_form(formdata))
+        if self.kind == 'artists':
+            return _artist_values(self._validate_form(formdata))
+        start, end = self._slot(formdata)
+        return {
+            'artist_id': self.artists.resolve(formdata, 'artist_id'),
+            'venue_id': self.venues.resolve(formdata, 'venue_id'),
+            'show_date_time': start,
+            'end_date_time': end,
+        }
+
+    def rows(self, source):
+        # Yields (line number, values) for the rows that validate.
+        for line, formdata in source:
+            try:
+                if isinstance(formdata, RowError):
+                    raise formdata
+                values = self.validate(formdata)
+            except RowError as e:
+                self.errors.append((line, e))
+                continue
+            yield line, values
+
+    def check_bookings(self, batch):
+        # Drops the shows that overlap an existing or earlier show at the
+        # same venue or with the same artist. The timelines of a whole batch
+        # are loaded together.
+        self.bookings.load([values['venue_id'] for line, values in batch],
+                           [values['artist_id'] for line, values in batch])
+        accepted = []
+        for line, values in batch:
+            conflicts = self.bookings.conflicts(values['venue_id'], values['artist_id'],
+                                                values['show_date_time'], values['end_date_time'])
+            if conflicts:
+                self.errors.append((line, RowError('; '.join(map(str, conflicts)))))
+                continue
+            self.bookings.add(None, values['venue_id'], values['artist_id'],
+                              values['show_date_time'], values['end_date_time'])
+            accepted.append(values)
+        return accepted
+
+    def run(self, source):
+        if self.kind == 'shows':
+            # Nobody else books a show until the import commits.
+            lock_bookings(db.session)
+        batch = []
+        for line, values in self.rows(source):
+            batch.append((line, values))
+            if len(batch) == BATCH_SIZE:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        self.errors.sort(key=lambda error: error[0])
+        if self.dry_run:
+            db.session.rollback()
+            return
+        if self.kind == 'shows':
+            for model, deltas in self.deltas.items():
+                add_show_counts(db.session, model, deltas)
+                self.changes.upserted[model].update(_snapshots(model, deltas))
+            genres.add_upcoming_shows(db.session, {
+                id: counts[0] for id, counts in self.deltas[Artist].items()})
+        else:
+            model = Venue if self.kind == 'venues' else Artist
+            slot = 0 if model is Venue else 1
+            deltas = {}
+            for values in self.changes.upserted[model].values():
+                for genre in values.get('genres') or ():
+                    deltas.setdefault(genre, [0, 0, 0])[slot] += 1
+            genres.add_genre_counts(db.session, deltas)
+        db.session.commit()
+        events.notify(self.changes)
+
+    def write(self, batch):
+        if self.kind == 'shows':
+            batch = self.check_bookings(batch)
+        else:
+            batch = [values for line, values in batch]
+        self.imported += len(batch)
+        if self.dry_run:
+            return
+        if self.kind == 'shows':
+            self._count_shows(batch)
+            _insert_shows(batch)
+            return
+        model = Venue if self.kind == 'venues' else Artist
+        self.changes.upserted[model].update(_insert_returning(model, batch))
+
+    def _count_shows(self, batch):
+        for values in batch:
+            when = values['show_date_time']
+            for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+                counts = self.deltas[model].setdefault(values[key], [0, 0, None])
+                if when > self.now:
+                    counts[0] += 1
+                    if counts[2] is None or when < counts[2]:
+                        counts[2] = when
+                else:
+                    counts[1] += 1
+
+
+def _insert_returning(model, batch):
+    # Inserts venue/artist rows and returns {id: row} for the listeners.
+    table = model.__table__
+    snapshots = {}
+    if db.engine.dialect.full_returning:
+        for start in range(0, len(batch), RETURNING_BATCH_SIZE):
+            statement = table.insert().values(
+                batch[start:start + RETURNING_BATCH_SIZE]).returning(*table.c)
+            for row in db.session.execute(statement):
+                snapshots[row.id] = dict(row._mapping)
+    else:
+        # No RETURNING (SQLite): one statement per row to learn its id.
+        for values in batch:
+            id = db.session.execute(table.insert().values(values)).inserted_primary_key[0]
+            snapshots.update(_snapshots(model, [id]))
+    return snapshots
+
+
+def _insert_shows(batch):
+    if db.engine.dialect.name == 'postgresql':
+        # COPY is several times faster than executemany for large loads. It
+        # skips the model defaults, so updated_at is written here.
+        updated_at = datetime.utcnow().isoformat(sep=' ')
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in batch:
+            writer.writerow((values['artist_id'], values['venue_id'],
+                             values['show_date_time'].isoformat(sep=' '),
+                             values['end_date_time'].isoformat(sep=' '), updated_at))
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert('COPY shows (artist_id, venue_id, show_date_time, end_date_time, '
+                               'updated_at) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+    else:
+        db.session.execute(Show.__table__.insert(), batch)
+
+
+def _snapshots(model, ids):
+    # Current rows for the commit listeners, read in chunks.
+    table = model.__table__
+    ids = sorted(ids)
+    snapshots = {}
+    for start in range(0, len(ids), RETURNING_BATCH_SIZE):
+        chunk = ids[start:start + RETURNING_BATCH_SIZE]
+        for row in db.session.execute(table.select().where(table.c.id.in_(chunk))):
+            snapshots[row.id] = dict(row._mapping)
+    return snapshots
+
+
+def _detect_format(path, format):
+    if format:
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    raise click.UsageError(f'Cannot tell the format of {path}; pass --format.')
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']),
+              help='File format; by default taken from the extension.')
+@click.option('--dry-run', is_flag=True, help='Validate the rows without writing them.')
+@with_appcontext
+def import_command(kind, path, format, dry_run):
+    """Bulk load venues, artists or shows from a CSV or JSON-lines file."""
+    format = 'csv' if path == '-' and not format else _detect_format(path, format)
+    started = time.perf_counter()
+    importer = Importer(kind, dry_run=dry_run)
+    if path == '-':
+        importer.run(read_rows(sys.stdin, format))
+    else:
+        with open(path, newline='', encoding='utf-8') as stream:
+            importer.run(read_rows(stream, format))
+    for line, error in importer.errors:
+        click.echo(f'{path}:{line}: {error}', err=True)
+    verb = 'Validated' if dry_run else 'Imported'
+    click.echo(f'{verb} {importer.imported} {kind} in {time.perf_counter() - started:.1f}s; '
+               f'{len(importer.errors)} rows rejected.')
+
+
+def init_app(app):
+    app.cli.add_command(import_command)
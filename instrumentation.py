@@ -0,0 +1,280 @@
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# SQL statement counting.
+#----------------------------------------------------------------------------#
+
+
+class StatementCounter(object):
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_statements(engine=None):
+    # with count_statements() as counter: ...; counter.count
+    engine = engine or db.engine
+    counter = StatementCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+# Steady-state statements per GET, measured after a warm-up request. Each
+# relationship a route needs is loaded explicitly, so none of these grow
+# with the number of rows on the page.
+ROUTE_STATEMENT_BUDGETS = {
+    '/': 0,
+    '/venues': 2,
+    '/venues?genres=Jazz&genres=Blues&genres_match=any': 2,
+    '/artists': 2,
+    '/artists?genres=Rock n Roll': 2,
+    '/shows': 1,
+    '/shows?when=past': 1,
+    '/venues/search?search_term=a': 3,
+    '/artists/search?search_term=a': 3,
+    '/venues/search?search_term=a&genres=Jazz': 3,
+    '/venues/availability?state=CA': 2,
+    '/autocomplete?q=the': 0,
+    '/genres': 1,
+    '/genres/Jazz': 3,
+    '/venues/{venue_id}': 2,
+    '/artists/{artist_id}': 2,
+    '/venues/{venue_id}/edit': 1,
+    '/artists/{artist_id}/edit': 1,
+}
+
+
+def measure_route_statements(app, budgets=ROUTE_STATEMENT_BUDGETS):
+    # Returns [(url, statements, budget)] for every route in `budgets`, using
+    # the first venue and artist in the database for the detail pages.
+    ids = {
+        'venue_id': db.session.query(db.func.min(Venue.id)).scalar(),
+        'artist_id': db.session.query(db.func.min(Artist.id)).scalar(),
+    }
+    db.session.remove()
+    client = app.test_client()
+    results = []
+    for pattern, budget in budgets.items():
+        if any(ids[name] is None and '{%s}' % name in pattern for name in ids):
+            continue
+        url = pattern.format(**ids)
+        client.get(url)
+        with count_statements() as counter:
+            client.get(url)
+        results.append((url, counter.count, budget))
+    return results
+
+
+@click.command('query-counts')
+@with_appcontext
+def query_counts_command():
+    """Report SQL statements per route and fail on any over budget."""
+    failed = False
+    for url, count, budget in measure_route_statements(current_app._get_current_object()):
+        over = count > budget
+        failed = failed or over
+        click.echo(f'{"FAIL" if over else "ok  "} {count:3d}/{budget:<3d} {url}')
+    if failed:
+        raise click.ClickException('Statement budget exceeded.')
+
+
+#----------------------------------------------------------------------------#
+# Startup time.
+#----------------------------------------------------------------------------#
+
+# Every worker imports the app before it can serve, so heavy imports slow
+# deploys and autoscaling. `flask startup-profile` imports the WSGI module in
+# a fresh interpreter under -X importtime (the import also builds the app),
+# lists the slowest modules and fails when the whole import takes longer
+# than STARTUP_BUDGET_MS, so CI notices an eager import creeping back in.
+
+_importtime_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def profile_startup(module='wsgi', cwd=None):
+    # [(module, self ms, cumulative ms, depth)] in import order, for a fresh
+    # `import module`.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=os.environ.copy(), capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else
+                           f'import {module} failed')
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _importtime_line.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            timings.append((name, int(own) / 1000, int(cumulative) / 1000, len(indent) // 2))
+    return timings
+
+
+@click.command('startup-profile')
+@click.option('--module', default='wsgi', help='Module a worker imports.')
+@click.option('--budget-ms', type=float, help='Defaults to STARTUP_BUDGET_MS.')
+@click.option('--limit', default=25, help='Number of modules to list.')
+@with_appcontext
+def startup_profile_command(module, budget_ms, limit):
+    """Report import time per module and fail over the startup budget."""
+    if budget_ms is None:
+        budget_ms = current_app.config['STARTUP_BUDGET_MS']
+    try:
+        timings = profile_startup(module, cwd=current_app.root_path)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    total = next((cumulative for name, own, cumulative, depth in timings
+                  if name == module and depth == 0), 0.0)
+    click.echo(f'{"self ms":>9s} {"total ms":>9s}  module')
+    for name, own, cumulative, depth in sorted(timings, key=lambda row: -row[2])[:limit]:
+        click.echo(f'{own:9.1f} {cumulative:9.1f}  {"  " * depth}{name}')
+    over = budget_ms and total > budget_ms
+    click.echo(f'{"FAIL" if over else "ok  "} import {module}: {total:.1f} ms '
+               f'(budget {budget_ms:.0f} ms)')
+    if over:
+        raise click.ClickException('Startup budget exceeded.')
+
+
+#----------------------------------------------------------------------------#
+# Request timing.
+#----------------------------------------------------------------------------#
+
+# Each sampled request records its SQL statements (count and time, from the
+# engine cursor events), the time spent rendering templates and its total
+# time. The totals go out in a Server-Timing header, and requests slower
+# than SLOW_REQUEST_THRESHOLD_MS are logged with their slowest statements.
+# With INSTRUMENTATION_ENABLED off no hook is installed at all; on requests
+# that are not sampled the hooks return after one attribute lookup.
+
+_local = threading.local()
+
+
+class RequestTiming(object):
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.statements = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = None
+
+    def server_timing(self):
+        app_time = self.total_time - self.db_time - self.template_time
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{len(self.statements)} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'app;dur={max(app_time, 0) * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+
+def current_timing():
+    # The RequestTiming of the request being handled, or None.
+    return getattr(_local, 'timing', None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'timing', None) is not None:
+        conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = getattr(_local, 'timing', None)
+    if timing is None:
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = perf_counter() - started.pop()
+    timing.db_time += elapsed
+    timing.statements.append((elapsed, statement))
+
+
+class TimedTemplate(Template):
+    # Installed as the app's jinja template_class, so every render_template
+    # call is timed without depending on Flask's (blinker) signals.
+
+    def render(self, *args, **kwargs):
+        timing = getattr(_local, 'timing', None)
+        if timing is None:
+            return super().render(*args, **kwargs)
+        started = perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            timing.template_time += perf_counter() - started
+
+
+def log_slow_request(app, timing):
+    slowest = sorted(timing.statements, key=lambda entry: entry[0], reverse=True)
+    lines = [f'Slow request: {request.method} {request.full_path.rstrip("?")} '
+             f'{timing.total_time * 1000:.1f} ms (db {timing.db_time * 1000:.1f} ms in '
+             f'{len(timing.statements)} statements, templates '
+             f'{timing.template_time * 1000:.1f} ms)']
+    for elapsed, statement in slowest[:app.config.get('SLOW_REQUEST_LOG_STATEMENTS', 5)]:
+        lines.append(f'  {elapsed * 1000:8.1f} ms  {" ".join(statement.split())}')
+    app.logger.warning('\n'.join(lines))
+
+
+def init_timing(app):
+    sample_rate = app.config.get('INSTRUMENTATION_SAMPLE_RATE', 1.0)
+    threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500) / 1000.0
+    header = app.config.get('SERVER_TIMING_HEADER', True)
+
+    @app.before_request
+    def start_timing():
+        if sample_rate >= 1 or random.random() < sample_rate:
+            _local.timing = RequestTiming()
+
+    @app.after_request
+    def finish_timing(response):
+        timing = getattr(_local, 'timing', None)
+        if timing is None:
+            return response
+        timing.total_time = perf_counter() - timing.started
+        if header:
+            response.headers['Server-Timing'] = timing.server_timing()
+        if threshold and timing.total_time >= threshold:
+            log_slow_request(app, timing)
+        return response
+
+    @app.teardown_request
+    def clear_timing(exc):
+        _local.timing = None
+
+    app.jinja_env.template_class = TimedTemplate
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_app(app):
+    app.cli.add_command(query_counts_command)
+    app.cli.add_command(startup_profile_command)
+    if app.config.get('INSTRUMENTATION_ENABLED', True):
+        init_timing(app)
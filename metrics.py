@@ -0,0 +1,143 @@
+import os
+import threading
+from time import perf_counter
+
+from flask import request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#----------------------------------------------------------------------------#
+
+# Served at /metrics (views/api.py) when METRICS_ENABLED is on:
+#
+#   fyyur_request_duration_seconds  latency per Flask endpoint
+#   fyyur_requests_total            requests per endpoint and status
+#   fyyur_requests_in_flight        requests being handled right now
+#   fyyur_request_queries           SQL statements per request, per endpoint
+#   fyyur_db_pool_checked_out       connections in use, per bind
+#   fyyur_db_pool_overflow          of those, how many are beyond pool_size
+#   fyyur_cache_lookups_total       hits and misses of the page and
+#                                   thumbnail caches; the hit ratio is
+#                                   hits / (hits + misses)
+#
+# Each gunicorn worker only sees its own requests and pool. With
+# PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does it) every process
+# keeps its values in files there and a scrape of any worker sums them over
+# all of them; the gauges only count the workers still alive. The variable
+# is read when prometheus_client is imported, so it has to be set before
+# the app is.
+
+REQUEST_LATENCY = Histogram(
+    'fyyur_request_duration_seconds', 'Time spent handling a request.', ['endpoint'])
+REQUESTS = Counter(
+    'fyyur_requests', 'Requests handled.', ['endpoint', 'status'])
+IN_FLIGHT = Gauge(
+    'fyyur_requests_in_flight', 'Requests being handled.', multiprocess_mode='livesum')
+REQUEST_QUERIES = Histogram(
+    'fyyur_request_queries', 'SQL statements executed per request.', ['endpoint'],
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100, float('inf')))
+POOL_CHECKED_OUT = Gauge(
+    'fyyur_db_pool_checked_out', 'Database connections checked out of the pool.', ['bind'],
+    multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge(
+    'fyyur_db_pool_overflow', 'Checked-out connections beyond pool_size.', ['bind'],
+    multiprocess_mode='livesum')
+CACHE_LOOKUPS = Counter(
+    'fyyur_cache_lookups', 'Cache lookups by result.', ['cache', 'result'])
+
+_local = threading.local()
+
+
+def cache_lookup(cache, hit):
+    # Called by the caches (cache.py, thumbnails.py) on every lookup.
+    CACHE_LOOKUPS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def exposition():
+    # (body, content type) of a scrape.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+#  Requests
+#  ----------------------------------------------------------------
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'statements', None) is not None:
+        _local.statements += 1
+
+
+def init_requests(app):
+
+    @app.before_request
+    def start_request():
+        _local.started = perf_counter()
+        _local.statements = 0
+        _local.status = None
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_status(response):
+        _local.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        # Also runs when the view raised, in which case the response is a 500.
+        started = getattr(_local, 'started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(perf_counter() - started)
+        REQUESTS.labels(endpoint=endpoint, status=str(_local.status or 500)).inc()
+        REQUEST_QUERIES.labels(endpoint=endpoint).observe(_local.statements)
+        IN_FLIGHT.dec()
+        _local.started = _local.statements = _local.status = None
+
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+
+#  Connection pool
+#  ----------------------------------------------------------------
+
+def watch_pool(engine, bind):
+    # The pool events fire in the process that uses the connection, so each
+    # worker reports its own pool. Only a QueuePool has a size to overflow
+    # (NullPool, used with PgBouncer and SQLite, opens one per checkout); it
+    # has already counted a connection when `checkout` fires and still
+    # counts it when `checkin` does.
+    checked_out = POOL_CHECKED_OUT.labels(bind=bind)
+    overflow = POOL_OVERFLOW.labels(bind=bind)
+
+    def update_overflow(returning):
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            overflow.set(max(0, pool.checkedout() - returning - pool.size()))
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+        update_overflow(0)
+
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+        update_overflow(1)
+
+    event.listen(engine, 'checkout', on_checkout)
+    event.listen(engine, 'checkin', on_checkin)
+
+
+def init_app(app, db):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    init_requests(app)
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+        watch_pool(db.get_engine(app, bind=bind), bind or 'default')
@@ -26,6 +26,20 @@ config.set_main_option(
         '%', '%%'))
 target_metadata = current_app.extensions['migrate'].db.metadata
 
+# The full-text search column and the indexes over it and the trigram
+# indexes (AddSearchIndexes_005) exist only on Postgres and are kept up to
+# date by a trigger; search.py reaches them through raw SQL, so the models
+# do not declare them. Leave them out of autogenerate, which would
+# otherwise drop them.
+SEARCH_OBJECTS = {('column', 'search_vector')} | {
+    ('index', f'ix_{table}_{name}')
+    for table in ('venues', 'artists')
+    for name in ('search_vector', 'name_trgm', 'city_trgm', 'state_trgm')}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (reflected and compare_to is None and (type_, name) in SEARCH_OBJECTS)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,7 +60,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -74,10 +89,17 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Connections are opened with the request statement timeout
+            # (STATEMENT_TIMEOUT_MS); index builds and backfills need longer.
+            # A plain SET lasts for the session, so it also covers the
+            # autocommit blocks used for CREATE INDEX CONCURRENTLY.
+            connection.exec_driver_sql('SET statement_timeout = 0')
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,28 @@
+"""add indexes for venue availability search
+
+Revision ID: 3c9e41b7d0a6
+Revises: 61f58eae7323
+Create Date: 2026-10-18 15:02:44.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e41b7d0a6'
+down_revision = '61f58eae7323'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_show_date_time', 'shows',
+                    ['venue_id', 'show_date_time'], unique=False)
+    op.create_index('ix_venues_state_lower_city', 'venues',
+                    ['state', sa.text('lower(city)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_state_lower_city', table_name='venues')
+    op.drop_index('ix_shows_venue_id_show_date_time', table_name='shows')
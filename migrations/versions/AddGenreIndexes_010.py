@@ -0,0 +1,51 @@
+"""add genre GIN indexes and per-genre counts
+
+Revision ID: 7d2f4a91c6e3
+Revises: 3c9e41b7d0a6
+Create Date: 2026-10-18 16:21:07.514392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f4a91c6e3'
+down_revision = '3c9e41b7d0a6'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+INSERT INTO genre_counts (genre, venues_count, artists_count, upcoming_shows_count, updated_at)
+SELECT genre,
+       (SELECT count(*) FROM venues WHERE venues.genres @> ARRAY[genre]::varchar[]),
+       (SELECT count(*) FROM artists WHERE artists.genres @> ARRAY[genre]::varchar[]),
+       (SELECT coalesce(sum(upcoming_shows_count), 0) FROM artists
+        WHERE artists.genres @> ARRAY[genre]::varchar[]),
+       timezone('utc', now())
+FROM (SELECT unnest(genres) AS genre FROM venues
+      UNION
+      SELECT unnest(genres) FROM artists) AS used
+"""
+
+
+def upgrade():
+    op.create_index('ix_venues_genres', 'venues', ['genres'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], unique=False,
+                    postgresql_using='gin')
+    op.create_table('genre_counts',
+                    sa.Column('genre', sa.String(length=120), nullable=False),
+                    sa.Column('venues_count', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('artists_count', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('genre'))
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('genre_counts')
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
@@ -0,0 +1,55 @@
+"""add show and listing indexes
+
+Revision ID: 5b8e0c3f7a12
+Revises: 7d2f4a91c6e3
+Create Date: 2026-10-18 17:05:39.842611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0c3f7a12'
+down_revision = '7d2f4a91c6e3'
+branch_labels = None
+depends_on = None
+
+
+# The (venue_id, show_date_time) index came with AddAvailabilityIndexes_009.
+# These are built CONCURRENTLY so that writes keep working on large
+# tables; that cannot run inside a transaction, and a build that fails
+# leaves an INVALID index behind which has to be dropped before retrying.
+#
+# The directory indexes are on coalesce(column, ''), the expression
+# pagination.py sorts and pages by, so that rows without a state or a name
+# can be paged to as well.
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_artist_id_show_date_time', 'shows',
+                        ['artist_id', 'show_date_time'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_shows_show_date_time_id', 'shows',
+                        ['show_date_time', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        # The /venues and /artists directory orderings.
+        op.create_index('ix_venues_state_city_name_id', 'venues',
+                        [sa.text("coalesce(state, '')"), 'city', 'name', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_artists_name_id', 'artists',
+                        [sa.text("coalesce(name, '')"), 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artists_name_id', table_name='artists',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_venues_state_city_name_id', table_name='venues',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_show_date_time_id', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_artist_id_show_date_time', table_name='shows',
+                      postgresql_concurrently=True)
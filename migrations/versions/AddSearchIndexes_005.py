@@ -0,0 +1,63 @@
+"""add search vectors and trigram indexes
+
+Revision ID: e3b37fe79c97
+Revises: ee8311f01642
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b37fe79c97'
+down_revision = 'ee8311f01642'
+branch_labels = None
+depends_on = None
+
+
+# name carries the most weight, then the location, then the genres.
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER {table}_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update();
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(SEARCH_VECTOR_FUNCTION.format(table=table))
+        op.execute(SEARCH_VECTOR_TRIGGER.format(table=table))
+        # Fire the trigger once for the existing rows.
+        op.execute(f'UPDATE {table} SET name = name')
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                        postgresql_using='gin')
+        for column in ('name', 'city', 'state'):
+            op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        for column in ('name', 'city', 'state'):
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()')
+        op.drop_column(table, 'search_vector')
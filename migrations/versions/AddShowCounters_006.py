@@ -0,0 +1,44 @@
+"""add denormalized show counters to venues and artists
+
+Revision ID: aafe5d8b74ea
+Revises: e3b37fe79c97
+Create Date: 2026-10-18 10:04:52.817305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aafe5d8b74ea'
+down_revision = 'e3b37fe79c97'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+UPDATE {table} SET
+    upcoming_shows_count = (SELECT count(*) FROM shows
+                            WHERE shows.{fk} = {table}.id AND shows.show_date_time > LOCALTIMESTAMP),
+    past_shows_count = (SELECT count(*) FROM shows
+                        WHERE shows.{fk} = {table}.id AND shows.show_date_time <= LOCALTIMESTAMP),
+    next_show_at = (SELECT min(show_date_time) FROM shows
+                    WHERE shows.{fk} = {table}.id AND shows.show_date_time > LOCALTIMESTAMP)
+"""
+
+
+def upgrade():
+    for table, fk in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index(op.f(f'ix_{table}_next_show_at'), table, ['next_show_at'], unique=False)
+        op.execute(BACKFILL.format(table=table, fk=fk))
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        op.drop_index(op.f(f'ix_{table}_next_show_at'), table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,63 @@
+"""add show end times and double-booking exclusion constraints
+
+Revision ID: 61f58eae7323
+Revises: f40dce9e2d51
+Create Date: 2026-10-18 10:52:44.190827
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '61f58eae7323'
+down_revision = 'f40dce9e2d51'
+branch_labels = None
+depends_on = None
+
+
+OVERLAPS = """
+SELECT count(*) FROM shows a JOIN shows b
+  ON a.{column} = b.{column} AND a.id < b.id
+ AND tsrange(a.show_date_time, a.end_date_time) && tsrange(b.show_date_time, b.end_date_time)
+"""
+
+
+def check(statement, message):
+    # Stops the upgrade when `statement` counts offending rows. Skipped when
+    # generating SQL (`flask db upgrade --sql`), where nothing can be read.
+    if context.is_offline_mode():
+        return
+    count = op.get_bind().execute(sa.text(statement)).scalar()
+    if count:
+        raise RuntimeError(message.format(count=count))
+
+
+def upgrade():
+    # The end time is derived from the start time and cannot be NULL.
+    check('SELECT count(*) FROM shows WHERE show_date_time IS NULL',
+          '{count} shows have no start time; give them one or delete them and '
+          'run the upgrade again.')
+    op.add_column('shows', sa.Column('end_date_time', sa.DateTime(), nullable=True))
+    # Existing shows get the default two hour slot.
+    op.execute("UPDATE shows SET end_date_time = show_date_time + interval '2 hours'")
+    op.alter_column('shows', 'end_date_time', nullable=False)
+    op.create_check_constraint('shows_end_after_start', 'shows',
+                               'end_date_time > show_date_time')
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in ('venue_id', 'artist_id'):
+        check(OVERLAPS.format(column=column),
+              f'{{count}} pairs of shows overlap on {column}; list them with '
+              f'`flask booking-conflicts`, fix them and run the upgrade again.')
+        resource = column[:-len('_id')]
+        op.execute(f'ALTER TABLE shows ADD CONSTRAINT shows_{resource}_no_overlap '
+                   f'EXCLUDE USING gist ({column} WITH =, '
+                   f'tsrange(show_date_time, end_date_time) WITH &&)')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_no_overlap', 'shows')
+    op.drop_constraint('shows_venue_no_overlap', 'shows')
+    op.drop_constraint('shows_end_after_start', 'shows')
+    op.drop_column('shows', 'end_date_time')
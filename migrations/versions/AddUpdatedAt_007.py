@@ -0,0 +1,32 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: f40dce9e2d51
+Revises: aafe5d8b74ea
+Create Date: 2026-10-18 10:31:07.554210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f40dce9e2d51'
+down_revision = 'aafe5d8b74ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        # The server default only backfills the existing rows; new values
+        # come from the models.
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("(now() AT TIME ZONE 'utc')")))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('venues', 'artists', 'shows'):
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,33 @@
+"""make show times NOT NULL for keyset paging
+
+Revision ID: 9a4d2e6b1f38
+Revises: 5b8e0c3f7a12
+Create Date: 2026-10-19 09:12:04.517230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2e6b1f38'
+down_revision = '5b8e0c3f7a12'
+branch_labels = None
+depends_on = None
+
+
+# Keyset pages compare row values, and a comparison with a NULL in it is
+# never true, so rows whose sort key is NULL could not be paged to.
+# pagination.py pages venues and artists by coalesce(column, '') (the
+# directory indexes of AddListingIndexes_011 are on that expression). Show
+# times are the /shows key and cannot be coalesced; every show already has
+# one (AddShowEndTime_008 derives the NOT NULL end time from it), so the
+# column is made NOT NULL.
+
+
+def upgrade():
+    op.alter_column('shows', 'show_date_time', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    op.alter_column('shows', 'show_date_time', existing_type=sa.DateTime(), nullable=True)
@@ -1,6 +1,9 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
 
-db = SQLAlchemy()
+from database import RoutingSQLAlchemy
+
+# Routes read-only requests to the replica when one is configured (database.py).
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -15,14 +18,36 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    # genres is a Postgres ARRAY; SQLite (benchmarks, local runs) stores the
+    # same list as JSON.
+    genres = db.Column(db.ARRAY(db.String).with_variant(db.JSON(), 'sqlite'), nullable=False)
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     looking_for_talent = db.Column(db.Boolean, default=True)
     description = db.Column(db.String(500))
+    # Maintained by counters.py; read these instead of counting `shows`.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime(), index=True)
+    # Set on every insert and update (UTC), including Core bulk writes, so
+    # exports can be incremental (see exporter.py).
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Loaded lazily; routes that need the shows ask for them explicitly
+    # (see show_venue) so that plain lookups stay single-table.
     shows = db.relationship('Show', backref='venue',
-                            lazy='joined', cascade='all, delete-orphan')
+                            lazy='select', cascade='all, delete-orphan')
+
+    # Candidate venues for an availability search (see availability.py),
+    # the /venues directory order (keyed on coalesce(state, ''), as
+    # pagination.py pages it), and genre filters, which use @> and && on
+    # the GIN index (see genres.py).
+    __table_args__ = (
+        db.Index('ix_venues_state_lower_city', 'state', db.func.lower(city)),
+        db.Index('ix_venues_state_city_name_id', db.func.coalesce(state, ''), city, name, id),
+        db.Index('ix_venues_genres', genres, postgresql_using='gin'),
+    )
     
     def __repr__(self):
         return f'<Venue ID: {self.id}, name: {self.name}>'
@@ -40,12 +65,27 @@ class Artist(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
+    genres = db.Column(db.ARRAY(db.String(120)).with_variant(db.JSON(), 'sqlite'), nullable=False)
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String(500))
+    # Maintained by counters.py; read these instead of counting `shows`.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime(), index=True)
+    # Set on every insert and update (UTC), including Core bulk writes, so
+    # exports can be incremental (see exporter.py).
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
     shows = db.relationship('Show', backref='artist',
-                            lazy='joined', cascade='all, delete-orphan')
+                            lazy='select', cascade='all, delete-orphan')
+
+    # The /artists directory order (keyed on coalesce(name, ''), as
+    # pagination.py pages it) and genre filters (see genres.py).
+    __table_args__ = (
+        db.Index('ix_artists_name_id', db.func.coalesce(name, ''), id),
+        db.Index('ix_artists_genres', genres, postgresql_using='gin'),
+    )
     
     def __repr__(self):
         return f'<Artist ID: {self.id}, name: {self.name}>'
@@ -55,6 +95,15 @@ class Artist(db.Model):
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 
+# Shows without an explicit duration (older rows, imports) run this long.
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def _default_end(context):
+    start = context.get_current_parameters().get('show_date_time')
+    return start + DEFAULT_SHOW_DURATION if start is not None else None
+
+
 class Show(db.Model):
     __tablename__ = 'shows'
     id = db.Column(db.Integer, primary_key=True)
@@ -62,7 +111,36 @@ class Show(db.Model):
         'artists.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venues.id'), nullable=False)
-    show_date_time = db.Column(db.DateTime())
+    show_date_time = db.Column(db.DateTime(), nullable=False)
+    # Exclusive; no two shows at the same venue or with the same artist may
+    # overlap (see booking.py).
+    end_date_time = db.Column(db.DateTime(), nullable=False, default=_default_end)
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # A venue's or an artist's shows in a time range (detail pages, the
+    # counters, availability.py) and the /shows listing in time order.
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_show_date_time', 'venue_id', 'show_date_time'),
+        db.Index('ix_shows_artist_id_show_date_time', 'artist_id', 'show_date_time'),
+        db.Index('ix_shows_show_date_time_id', 'show_date_time', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<Show ID: {self.id}, artist_id: {self.artist_id}, venue_id: {self.venue_id}, show_date_time: {self.show_date_time}>'
+
+
+class GenreCount(db.Model):
+    # Per-genre totals for the genre pages and facets, maintained by
+    # genres.py. upcoming_shows_count counts the upcoming shows of the
+    # genre's artists.
+    __tablename__ = 'genre_counts'
+    genre = db.Column(db.String(120), primary_key=True)
+    venues_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    artists_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(), nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Show ID: {self.id}, artist_id: {self.artist_id}, venue_id: {self.venue_id}, show_date_time: {self.show_date_time}>'
\ No newline at end of file
+        return f'<GenreCount genre: {self.genre}, venues: {self.venues_count}, artists: {self.artists_count}>'
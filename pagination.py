@@ -0,0 +1,148 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import String, func, tuple_
+from sqlalchemy.schema import Column
+
+#----------------------------------------------------------------------------#
+# Keyset (cursor) pagination.
+#----------------------------------------------------------------------------#
+
+# Pages are addressed by the sort key of the row on either side of them
+# rather than by OFFSET, so every page is an index range scan of the same
+# size no matter how deep into the table it is.
+
+
+class Page(object):
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f'Cannot encode {value!r} in a cursor')
+
+
+def _decode_value(obj):
+    if '$dt' in obj:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_encode_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    # Malformed or tampered cursors fall back to the first page (as do
+    # cursors that do not match the key; see cursor_matches).
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')),
+                            object_hook=_decode_value)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def get_page_size():
+    page_size = request.args.get('per_page', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(page_size, current_app.config['MAX_PAGE_SIZE']))
+
+
+def _sort_key(column):
+    # A row value comparison with a NULL in it is never true, so a row whose
+    # key holds a NULL could not be paged past. Nullable string columns sort
+    # as '' instead (the directory indexes are on the same expression);
+    # other nullable columns cannot be keys.
+    expression = getattr(column, 'expression', column)
+    if not isinstance(expression, Column) or not expression.nullable:
+        return column
+    if isinstance(expression.type, String):
+        return func.coalesce(column, '')
+    raise ValueError(f'{column} is nullable and cannot be part of a keyset')
+
+
+def cursor_matches(cursor, types):
+    # True when `cursor` has one value of each of `types` (None accepts
+    # anything). Cursors are bound straight into the key comparison, so a
+    # hand-edited one (a string where an id goes) would otherwise fail in
+    # the database.
+    if cursor is None or len(cursor) != len(types):
+        return False
+    for value, python_type in zip(cursor, types):
+        if python_type is None:
+            continue
+        if python_type is float:
+            python_type = (int, float)
+        if isinstance(value, bool) or not isinstance(value, python_type):
+            return False
+    return True
+
+
+def _python_type(column):
+    try:
+        return getattr(column, 'expression', column).type.python_type
+    except NotImplementedError:
+        return None
+
+
+def paginate(query, columns, descending=False, page_size=None):
+    # `columns` is the ordered sort key and must end in a unique column
+    # (normally the primary key) so that the ordering is total. Each row
+    # returned by `query` has to expose those columns under their own keys.
+    # The cursor is read from the `after`/`before` request arguments.
+    if page_size is None:
+        page_size = get_page_size()
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before')) if after is None else None
+    sort_keys = [_sort_key(column) for column in columns]
+    key = tuple_(*sort_keys)
+
+    backwards = before is not None
+    cursor = before if backwards else after
+    if cursor_matches(cursor, [_python_type(column) for column in columns]):
+        # Reading backwards flips the comparison, and so does a descending
+        # ordering; doing both cancels out.
+        query = query.filter(key < tuple(cursor) if backwards != descending
+                             else key > tuple(cursor))
+    else:
+        cursor = None
+
+    reverse_order = backwards != descending
+    query = query.order_by(*[column.desc() if reverse_order else column.asc()
+                             for column in sort_keys])
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def row_key(row):
+        return encode_cursor('' if value is None else value
+                             for value in (getattr(row, column.key) for column in columns))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = row_key(rows[-1])
+            prev_cursor = row_key(rows[0]) if has_more else None
+        else:
+            next_cursor = row_key(rows[-1]) if has_more else None
+            prev_cursor = row_key(rows[0]) if cursor is not None else None
+    return Page(rows, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,290 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+from flask import current_app, request
+from sqlalchemy import or_
+
+import events
+import genres
+from models import db, Venue, Artist
+from pagination import Page, cursor_matches, decode_cursor, encode_cursor, get_page_size, paginate
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# search_venues/search_artists go through a pluggable backend:
+#
+#   postgres  ranked full-text + trigram search over the `search_vector`
+#             column and pg_trgm GIN indexes (AddSearchIndexes_005).
+#   memory    an inverted trigram index built from the ORM, for databases
+#             without pg_trgm (SQLite, local development).
+#
+# SEARCH_BACKEND = 'auto' picks postgres when the engine is PostgreSQL.
+# Both backends match the same rows, case-insensitively: those where every
+# word of the term starts a word of the name, city, state or genres (a
+# prefix tsquery over the search_vector), and those whose name contains the
+# whole term (ILIKE, for mid-word matches: "usic" -> "Musical"). They
+# return a keyset Page of (id, name) hits plus the total match count; only
+# the ranking within the page differs. Hits can be narrowed to genres (see
+# genres.py).
+
+SEARCHABLE_FIELDS = ('name', 'city', 'state', 'genres')
+SEARCHABLE_MODELS = (Venue, Artist)
+
+_words = re.compile(r'\w+', re.UNICODE)
+
+
+def _tokens(text):
+    return _words.findall(text.lower())
+
+
+class SearchHit(object):
+
+    def __init__(self, id, name, rank):
+        self.id = id
+        self.name = name
+        self.rank = rank
+
+
+class PostgresSearchBackend(object):
+
+    def _vector(self, model):
+        return db.literal_column(f'{model.__tablename__}.search_vector')
+
+    def _match(self, model, term):
+        words = _tokens(term)
+        if not words:
+            return None, None
+        tsquery = db.func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term.strip()) + '%'
+        # The ILIKE arm keeps mid-word matches ("usic" -> "Musical") and is
+        # served by the trigram index on name.
+        condition = or_(self._vector(model).op('@@')(tsquery),
+                        model.name.ilike(pattern, escape='\\'))
+        rank = (db.func.ts_rank(self._vector(model), tsquery) +
+                db.func.similarity(model.name, term))
+        return condition, rank
+
+    def search(self, model, term, genre_filter=(), match=genres.MATCH_ALL):
+        condition, rank = self._match(model, term)
+        query = db.session.query(model.id, model.name)
+        count_query = db.session.query(db.func.count(model.id))
+        if genre_filter:
+            in_genres = genres.has_genres(model.genres, genre_filter, match)
+            query = query.filter(in_genres)
+            count_query = count_query.filter(in_genres)
+        if condition is None:
+            sort_rank = db.literal(0.0)
+        else:
+            query = query.filter(condition)
+            count_query = count_query.filter(condition)
+            sort_rank = -rank
+        sort_rank = sort_rank.label('sort_rank')
+        query = query.add_columns(sort_rank)
+        page = paginate(query, [sort_rank, model.name, model.id])
+        page.items = [SearchHit(row.id, row.name, -row.sort_rank) for row in page.items]
+        return page, count_query.scalar()
+
+
+class _Document(object):
+
+    __slots__ = ('id', 'name', 'name_lower', 'name_words', 'genres', 'words', 'text')
+
+    def __init__(self, values):
+        self.id = values['id']
+        self.name = values['name'] or ''
+        self.name_lower = self.name.lower()
+        self.name_words = _tokens(self.name)
+        self.genres = frozenset(values.get('genres') or ())
+        parts = [values.get(field) or '' for field in SEARCHABLE_FIELDS]
+        self.words = frozenset(_tokens(' '.join(
+            ' '.join(part) if isinstance(part, (list, tuple)) else part for part in parts)))
+        self.text = ' '.join(sorted(self.words))
+
+    def trigrams(self):
+        # Every word of the term that is three characters or longer starts
+        # a word here, and the term shares the name's trigrams when the name
+        # contains it, so the trigrams find a superset of the matches.
+        trigrams = {self.text[i:i + 3] for i in range(len(self.text) - 2)}
+        trigrams.update(self.name_lower[i:i + 3] for i in range(len(self.name_lower) - 2))
+        return trigrams
+
+    def matches(self, term, words):
+        # The contract both backends share (see above).
+        return (all(any(word.startswith(query_word) for word in self.words)
+                    for query_word in words) or
+                term in self.name_lower)
+
+
+class _ModelIndex(object):
+
+    def __init__(self):
+        self.documents = {}
+        self.postings = {}
+
+    def add(self, values):
+        self.remove(values['id'])
+        document = self.documents[values['id']] = _Document(values)
+        for trigram in document.trigrams():
+            self.postings.setdefault(trigram, set()).add(document.id)
+
+    def remove(self, id):
+        document = self.documents.pop(id, None)
+        if document is None:
+            return
+        for trigram in document.trigrams():
+            posting = self.postings.get(trigram)
+            if posting is not None:
+                posting.discard(id)
+                if not posting:
+                    del self.postings[trigram]
+
+    def _intersect(self, trigrams):
+        # Intersect the posting lists of the trigrams, smallest first.
+        postings = sorted((self.postings.get(trigram, frozenset()) for trigram in trigrams), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def candidates(self, term, words):
+        # Documents that may match; words shorter than a trigram are checked
+        # against the survivors.
+        trigrams = {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+        name_trigrams = {term[i:i + 3] for i in range(len(term) - 2)}
+        if not trigrams or not name_trigrams:
+            return self.documents.keys()
+        return self._intersect(trigrams) | self._intersect(name_trigrams)
+
+
+class MemorySearchBackend(object):
+    # Built on first use and kept current by the commit listener; writes
+    # made by other processes are polled for every refresh_seconds (see
+    # events.ChangePoller).
+
+    def __init__(self, refresh_seconds=30):
+        self._indexes = None
+        self._lock = threading.Lock()
+        self._poller = events.ChangePoller(
+            {model: ['id', 'updated_at'] + list(SEARCHABLE_FIELDS) for model in SEARCHABLE_MODELS},
+            refresh_seconds)
+
+    def build(self):
+        self._poller.reset()
+        indexes = {}
+        for model in SEARCHABLE_MODELS:
+            index = indexes[model] = _ModelIndex()
+            columns = [getattr(model, field) for field in ('id',) + SEARCHABLE_FIELDS]
+            for row in db.session.query(*columns).yield_per(1000):
+                index.add(row._asdict())
+        self._indexes = indexes
+
+    def _known_ids(self, model):
+        with self._lock:
+            return list(self._indexes[model].documents)
+
+    def _index(self, model):
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    self.build()
+        else:
+            changes = self._poller.poll(self._known_ids)
+            if changes:
+                self.apply(changes)
+        return self._indexes[model]
+
+    def apply(self, changes):
+        # Commit listener. An index that has not been built yet will read the
+        # committed rows when it is, so there is nothing to do.
+        if self._indexes is None:
+            return
+        with self._lock:
+            for model in SEARCHABLE_MODELS:
+                index = self._indexes[model]
+                for id in changes.deleted[model]:
+                    index.remove(id)
+                for id, values in changes.upserted[model].items():
+                    index.add(dict(values, id=id))
+
+    def _rank(self, document, term, words):
+        if not term:
+            return 0
+        if document.name_lower == term:
+            return 4
+        if document.name_lower.startswith(term):
+            return 3
+        if all(any(name_word.startswith(word) for name_word in document.name_words)
+               for word in words):
+            return 2
+        if all(word in document.name_lower for word in words):
+            return 1
+        return 0
+
+    def search(self, model, term, genre_filter=(), match=genres.MATCH_ALL):
+        index = self._index(model)
+        term = term.strip().lower()
+        words = _tokens(term)
+        with self._lock:
+            matches = [document for document in
+                       (index.documents.get(id) for id in index.candidates(term, words))
+                       if document is not None and document.matches(term, words) and
+                       (not genre_filter or genres.genres_match(document.genres, genre_filter, match))]
+        hits = sorted(((-self._rank(document, term, words), document.name_lower, document.id),
+                       document) for document in matches)
+        return self._page(hits), len(hits)
+
+    def _page(self, hits):
+        # Same cursor scheme as pagination.paginate(), over the sorted hits.
+        page_size = get_page_size()
+        keys = [key for key, document in hits]
+        after = decode_cursor(request.args.get('after'))
+        before = decode_cursor(request.args.get('before')) if after is None else None
+        # Keys are (-rank, lowercased name, id).
+        after, before = [cursor if cursor_matches(cursor, (float, str, int)) else None
+                         for cursor in (after, before)]
+        if before is not None:
+            end = bisect_left(keys, tuple(before))
+            start = max(0, end - page_size)
+        else:
+            start = bisect_right(keys, tuple(after)) if after is not None else 0
+            end = start + page_size
+        window = hits[start:end]
+        items = [SearchHit(document.id, document.name, -key[0]) for key, document in window]
+        next_cursor = encode_cursor(window[-1][0]) if window and end < len(hits) else None
+        prev_cursor = encode_cursor(window[0][0]) if window and start > 0 else None
+        return Page(items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def _backend():
+    return current_app.extensions['search']
+
+
+def search(model, term, genre_filter=(), match=genres.MATCH_ALL):
+    return _backend().search(model, term, genre_filter, match)
+
+
+def warm():
+    # Builds the in-process index now rather than on the first search.
+    backend = _backend()
+    if isinstance(backend, MemorySearchBackend):
+        backend.build()
+
+
+def init_app(app):
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        name = 'postgres' if uri.startswith('postgres') else 'memory'
+    if name == 'postgres':
+        backend = PostgresSearchBackend()
+    elif name == 'memory':
+        backend = MemorySearchBackend(app.config.get('SEARCH_REFRESH_SECONDS', 30))
+        events.on_commit(app, backend.apply)
+    else:
+        raise ValueError(f'Unknown SEARCH_BACKEND {name!r}')
+    app.extensions['search'] = backend
@@ -0,0 +1,205 @@
+import os
+import secrets
+import tempfile
+
+from flask import current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer, URLSafeTimedSerializer
+from werkzeug.datastructures import CallbackDict
+
+import cache
+
+#----------------------------------------------------------------------------#
+# Secret keys.
+#----------------------------------------------------------------------------#
+
+# Session cookies, flash messages and CSRF tokens are signed with
+# SECRET_KEY, so every worker on every host needs the same one. It comes
+# from SECRET_KEY, else from SECRET_KEY_FILE; when neither is set, a key is
+# generated into SECRET_KEY_FILE by whichever worker starts first and read
+# by the rest (enough for one host, not for several).
+#
+# Keys are rotated by moving the old one to SECRET_KEY_FALLBACKS: new
+# signatures use SECRET_KEY and the fallbacks are still accepted, so
+# existing sessions and open forms survive the change.
+
+
+def _read_key(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _create_key(path):
+    # The key is written to a private temporary file and hard-linked into
+    # place: the link fails if the file exists, so workers starting together
+    # end up with the first one's key, and nobody can read the file before
+    # it is complete.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.secret_key')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+    return _read_key(path)
+
+
+def load_secret_key(app):
+    config = app.config
+    key = config.get('SECRET_KEY') or _read_key(config['SECRET_KEY_FILE'])
+    if not key:
+        key = _create_key(config['SECRET_KEY_FILE'])
+        app.logger.warning('SECRET_KEY is not set; using the key in %s. Set SECRET_KEY '
+                           'when running on more than one host.', config['SECRET_KEY_FILE'])
+    config['SECRET_KEY'] = key
+    config['WTF_CSRF_SECRET_KEY'] = secret_keys(app)
+
+
+def secret_keys(app=None):
+    # Every accepted key, oldest first; the last one signs.
+    app = app or current_app
+    return [key for key in app.config['SECRET_KEY_FALLBACKS'] if key] + [app.secret_key]
+
+
+#----------------------------------------------------------------------------#
+# Sessions.
+#----------------------------------------------------------------------------#
+
+# SESSION_BACKEND = 'cookie' keeps Flask's signed cookie sessions (which
+# then accept the fallback keys). The other backends keep the session data
+# on the server and only put a signed random id in the cookie:
+#
+#   redis       shared by every host (SESSION_REDIS_URL; needs `redis`).
+#   filesystem  shared by the workers of one host, under SESSION_DIR.
+#   memory      one process only; a stand-in for tests and local runs.
+#
+# Server-side sessions expire after PERMANENT_SESSION_LIFETIME, and an
+# emptied session is deleted along with its cookie.
+
+
+class KeyRotatingCookieSessionInterface(SecureCookieSessionInterface):
+
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        return URLSafeTimedSerializer(
+            secret_keys(app), salt=self.salt, serializer=self.serializer,
+            signer_kwargs={'key_derivation': self.key_derivation,
+                           'digest_method': self.digest_method})
+
+
+class RedisSessionStore(object):
+    # The get/set/delete interface of the cache backends (cache.py), on
+    # Redis.
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, timeout=None):
+        self.client.set(key, value, ex=timeout or None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+
+    serializer = TaggedJSONSerializer()
+    salt = 'server-side-session'
+
+    def __init__(self, store, key_prefix='session:'):
+        self.store = store
+        self.key_prefix = key_prefix
+
+    def _signer(self, app):
+        return Signer(secret_keys(app), salt=self.salt)
+
+    def _timeout(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(self.key_prefix + sid)
+                if data is not None:
+                    try:
+                        return ServerSideSession(self.serializer.loads(data), sid=sid)
+                    except ValueError:
+                        pass
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not self.should_set_cookie(app, session):
+            return
+        timeout = self._timeout(app)
+        self.store.set(self.key_prefix + session.sid, self.serializer.dumps(dict(session)),
+                       timeout=timeout)
+        # The cookie outlives the browser session only for permanent
+        # sessions; the server copy always expires.
+        expires = self.get_expiration_time(app, session)
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode('ascii'),
+                            expires=expires, httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path, secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+
+def make_session_interface(app):
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend == 'cookie':
+        return KeyRotatingCookieSessionInterface()
+    if backend == 'redis':
+        store = RedisSessionStore(app.config['SESSION_REDIS_URL'])
+    elif backend == 'filesystem':
+        store = cache.FileSystemCache(app.config['SESSION_DIR'],
+                                      max_entries=app.config['SESSION_MAX_ENTRIES'])
+    elif backend == 'memory':
+        store = cache.LRUCache(max_entries=app.config['SESSION_MAX_ENTRIES'])
+    else:
+        raise ValueError(f'Unknown SESSION_BACKEND {backend!r}')
+    return ServerSideSessionInterface(store)
+
+
+def init_app(app):
+    # Runs first: other extensions read the secret key.
+    load_secret_key(app)
+    app.session_interface = make_session_interface(app)
@@ -0,0 +1,116 @@
+// Typeahead for inputs marked with data-autocomplete="venue|artist|all".
+// Every keystroke queries /autocomplete (cancelling the previous request)
+// and lists the matches under the input. Choosing one either opens its page
+// (data-autocomplete-action="link") or writes its id into the input named
+// by data-autocomplete-target.
+(function () {
+  var PATHS = {venue: '/venues/', artist: '/artists/'};
+
+  function attach(input) {
+    var kind = input.getAttribute('data-autocomplete');
+    var target = input.getAttribute('data-autocomplete-target');
+    var link = input.getAttribute('data-autocomplete-action') === 'link';
+    var menu = document.createElement('ul');
+    var request = null;
+    var results = [];
+    var active = -1;
+
+    menu.className = 'dropdown-menu autocomplete-menu';
+    input.setAttribute('autocomplete', 'off');
+    input.parentNode.style.position = 'relative';
+    input.parentNode.insertBefore(menu, input.nextSibling);
+
+    function close() {
+      menu.style.display = 'none';
+      active = -1;
+    }
+
+    function choose(result) {
+      if (link) {
+        window.location = PATHS[result.type] + result.id;
+        return;
+      }
+      input.value = result.name;
+      if (target) {
+        input.form.elements[target].value = result.id;
+      }
+      close();
+    }
+
+    function render() {
+      menu.innerHTML = '';
+      for (var i = 0; i < results.length; i++) {
+        var item = document.createElement('li');
+        var anchor = document.createElement('a');
+        var where = [results[i].city, results[i].state].filter(Boolean).join(', ');
+        anchor.href = PATHS[results[i].type] + results[i].id;
+        anchor.textContent = results[i].name + (where ? ' (' + where + ')' : '');
+        anchor.setAttribute('data-index', i);
+        if (i === active) {
+          item.className = 'active';
+        }
+        item.appendChild(anchor);
+        menu.appendChild(item);
+      }
+      menu.style.display = results.length ? 'block' : 'none';
+    }
+
+    input.addEventListener('input', function () {
+      var query = input.value.trim();
+      if (request) {
+        request.abort();
+      }
+      if (!query) {
+        results = [];
+        close();
+        return;
+      }
+      request = new XMLHttpRequest();
+      request.open('GET', '/autocomplete?type=' + encodeURIComponent(kind) +
+                          '&q=' + encodeURIComponent(query));
+      request.onload = function () {
+        if (this.status === 200 && this === request) {
+          results = JSON.parse(this.responseText).results;
+          active = -1;
+          render();
+        }
+      };
+      request.send();
+    });
+
+    input.addEventListener('keydown', function (event) {
+      if (menu.style.display !== 'block') {
+        return;
+      }
+      if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+        var step = event.key === 'ArrowDown' ? 1 : -1;
+        active = (active + step + results.length) % results.length;
+        render();
+        event.preventDefault();
+      } else if (event.key === 'Enter' && active >= 0) {
+        choose(results[active]);
+        event.preventDefault();
+      } else if (event.key === 'Escape') {
+        close();
+      }
+    });
+
+    // mousedown fires before the input loses focus.
+    menu.addEventListener('mousedown', function (event) {
+      var index = event.target.getAttribute('data-index');
+      if (index !== null) {
+        choose(results[index]);
+        event.preventDefault();
+      }
+    });
+
+    input.addEventListener('blur', close);
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var inputs = document.querySelectorAll('[data-autocomplete]');
+    for (var i = 0; i < inputs.length; i++) {
+      attach(inputs[i]);
+    }
+  });
+})();
@@ -0,0 +1,61 @@
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template bytecode cache.
+#----------------------------------------------------------------------------#
+
+# Compiling a template to Python is much slower than loading the result, and
+# every new worker would otherwise compile each template on its first hit.
+# Compiled templates are kept under TEMPLATE_CACHE_DIR instead, shared by
+# the workers of a host: Jinja writes each file atomically and recompiles a
+# template whose source no longer matches. `flask templates compile` fills
+# the cache at build time so that no worker compiles at all.
+#
+# Outside debug mode TEMPLATES_AUTO_RELOAD is off: a loaded template is kept
+# for the life of the process, without checking the file on each render.
+
+
+def bytecode_cache():
+    return current_app.jinja_env.bytecode_cache
+
+
+@click.group('templates')
+def templates_cli():
+    """Manage the compiled template cache."""
+
+
+@templates_cli.command('compile')
+@with_appcontext
+def compile_command():
+    """Compile every template into the bytecode cache."""
+    if bytecode_cache() is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+    env = current_app.jinja_env
+    started = time.perf_counter()
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    click.echo(f'Compiled {len(names)} templates into {current_app.config["TEMPLATE_CACHE_DIR"]} '
+               f'in {time.perf_counter() - started:.2f}s.')
+
+
+@templates_cli.command('clear')
+@with_appcontext
+def clear_command():
+    """Remove the compiled templates."""
+    if bytecode_cache() is not None:
+        bytecode_cache().clear()
+
+
+def init_app(app):
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.cli.add_command(templates_cli)
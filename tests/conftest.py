@@ -0,0 +1,137 @@
+# Shared fixtures. Every test gets its own SQLite database under tmp_path.
+# The Postgres checks are skipped unless TEST_POSTGRES_URL points at a
+# scratch database, which they empty and migrate.
+
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.py reads these at import time.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('LOG_FILE', '')
+
+from app import create_app, init_migrate
+from models import db
+import instrumentation
+
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+
+def app_config(tmp_path, **overrides):
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'SECRET_KEY': 'test',
+        'WTF_CSRF_ENABLED': False,
+        'SESSION_BACKEND': 'cookie',
+        'CACHE_TYPE': 'memory',
+        'CACHE_DIR': str(tmp_path / 'cache'),
+        'TEMPLATE_CACHE_DIR': '',
+        'THUMBNAIL_CACHE_DIR': str(tmp_path / 'thumbnails'),
+        'THUMBNAIL_PREFETCH': False,
+        'AUTOCOMPLETE_REFRESH_SECONDS': 0,
+        'LOG_FILE': '',
+    }
+    config.update(overrides)
+    return config
+
+
+def reset_postgres(app):
+    # Drops everything and runs the migrations, as a deployment would.
+    from flask_migrate import upgrade
+
+    init_migrate(app, always=True)
+    db.session.execute(db.text('DROP SCHEMA public CASCADE'))
+    db.session.execute(db.text('CREATE SCHEMA public'))
+    db.session.commit()
+    upgrade(directory=os.path.join(ROOT, 'migrations'))
+
+
+@pytest.fixture
+def postgres_config():
+    # make_app(**postgres_config) builds the app on TEST_POSTGRES_URL.
+    if not POSTGRES_URL:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    return {'SQLALCHEMY_DATABASE_URI': POSTGRES_URL}
+
+
+@pytest.fixture
+def make_app(tmp_path_factory):
+    # make_app(shows=0, **config): a fresh app and database, seeded with
+    # bench/datagen.py's deterministic data when `shows` is given.
+    from bench import datagen
+
+    apps = []
+
+    def make(shows=0, **overrides):
+        app = create_app(app_config(tmp_path_factory.mktemp('app'), **overrides))
+        with app.app_context():
+            if db.engine.dialect.name == 'postgresql':
+                reset_postgres(app)
+            else:
+                db.create_all()
+            if shows:
+                datagen.generate(shows=shows)
+            db.session.remove()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.get_engine(app).dispose()
+
+
+@pytest.fixture
+def make_venue():
+    # make_venue(name, genres=['Jazz']): an unsaved venue with the required
+    # fields filled in.
+    from models import Venue
+
+    def make(name, genres=('Jazz',)):
+        return Venue(name=name, city='Springfield', state='IL', address='1 Main St',
+                     phone='555-555-5555', genres=list(genres))
+
+    return make
+
+
+@pytest.fixture
+def make_artist():
+    # make_artist(name, genres=['Jazz']): an unsaved artist.
+    from models import Artist
+
+    def make(name, genres=('Jazz',)):
+        return Artist(name=name, city='Springfield', state='IL', genres=list(genres))
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_statements():
+    # with count_statements(app) as counter: ...; counter.count and
+    # counter.statements. Counts what the app's engine executes (a
+    # before_cursor_execute listener), whichever context runs it.
+    @contextmanager
+    def count(app):
+        with app.app_context():
+            engine = db.get_engine(app)
+        with instrumentation.count_statements(engine) as counter:
+            yield counter
+
+    return count
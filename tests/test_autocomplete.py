@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from models import db, Venue, Artist
+
+
+def names(client, query):
+    response = client.get('/autocomplete', query_string={'q': query})
+    return [result['name'] for result in response.get_json()['results']]
+
+
+def test_autocomplete_follows_other_processes(make_app, count_statements):
+    app = make_app(AUTOCOMPLETE_REFRESH_SECONDS=1)
+    client = app.test_client()
+    with app.app_context():
+        db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                  address='1015 Folsom Street', phone='123-123-1234', genres=['Jazz']),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Rock n Roll']),
+        ])
+        db.session.commit()
+    assert names(client, 'musi') == ['The Musical Hop']
+
+    # Written behind the commit listener's back, as another worker would.
+    with app.app_context():
+        connection = db.engine.connect()
+    with connection.begin():
+        connection.execute(Venue.__table__.insert().values(
+            name='Musicland', city='Oakland', state='CA', address='1 Main St',
+            phone='555-555-5555', genres=['Jazz'], updated_at=datetime.utcnow()))
+        connection.execute(Artist.__table__.delete().where(Artist.name == 'Guns N Petals'))
+    connection.close()
+
+    # Nothing is read from the database until the poll is due.
+    with count_statements(app) as counter:
+        assert names(client, 'musi') == ['The Musical Hop']
+    assert counter.count == 0
+
+    index = app.extensions['autocomplete']
+    index._poller._polled_at -= 2
+    with count_statements(app) as counter:
+        assert names(client, 'musi') == ['Musicland', 'The Musical Hop']
+    # Only the changed rows are read, never every name again.
+    assert counter.statements
+    assert [statement for statement in counter.statements
+            if '.name' in statement and 'updated_at >=' not in statement] == []
+    assert names(client, 'guns') == []
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from availability import find_available_venues
+from models import db, Venue, Show, Artist
+
+VENUES = 1000
+
+
+def test_availability_binds_no_parameter_per_venue(app):
+    # SQLite caps the bound parameters of a statement (32766 by default), and
+    # a state can hold more venues than that.
+    start = datetime(2030, 5, 1)
+    with app.app_context():
+        db.session.execute(Venue.__table__.insert(), [
+            {'name': f'Venue {i}', 'city': 'Springfield', 'state': 'IL',
+             'address': '1 Main St', 'phone': '555-555-5555', 'genres': ['Jazz'],
+             'updated_at': datetime.utcnow()}
+            for i in range(VENUES)])
+        artist = Artist(name='Band', city='Springfield', state='IL', genres=['Jazz'])
+        db.session.add(artist)
+        db.session.flush()
+        busy = db.session.query(Venue.id).filter(Venue.name == 'Venue 7').scalar()
+        db.session.add(Show(venue_id=busy, artist_id=artist.id, show_date_time=start,
+                            end_date_time=start + timedelta(hours=23)))
+        db.session.commit()
+
+        parameters = []
+
+        def record(conn, cursor, statement, params, context, executemany):
+            parameters.append(len(params))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            results = find_available_venues(start, start + timedelta(days=1), state='IL',
+                                            min_slot=timedelta(hours=1), limit=VENUES)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert max(parameters) < 10
+        assert len(results) == VENUES
+        # Ranked last: one hour left that day.
+        assert results[-1].id == busy
+        assert results[-1].slots == [(start + timedelta(hours=23), start + timedelta(days=1))]
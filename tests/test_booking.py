@@ -0,0 +1,71 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import booking
+from models import db, Show
+
+
+def book(client, venue_id, artist_id, start):
+    response = client.post('/shows/create', data={
+        'venue_id': venue_id, 'artist_id': artist_id,
+        'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})
+    assert response.status_code == 200
+    return response.data.decode()
+
+
+def test_bookings_see_shows_written_by_other_processes(app, client, make_venue, make_artist):
+    start = datetime(2030, 5, 1, 20, 0)
+    with app.app_context():
+        hall, band, duo = make_venue('Hall'), make_artist('Band'), make_artist('Duo')
+        db.session.add_all([hall, band, duo])
+        db.session.commit()
+        ids = hall.id, band.id, duo.id
+        database = db.engine.url.database
+    assert 'successfully listed' in book(client, ids[0], ids[1], start)
+
+    # Another worker books the hall straight into the database.
+    with sqlite3.connect(database) as other:
+        other.execute('INSERT INTO shows (artist_id, venue_id, show_date_time, end_date_time, '
+                      'updated_at) VALUES (?, ?, ?, ?, ?)',
+                      (ids[2], ids[0], str(start + timedelta(days=1)),
+                       str(start + timedelta(days=1, hours=2)), str(datetime.utcnow())))
+
+    assert 'venue %d is booked' % ids[0] in book(client, ids[0], ids[2],
+                                                 start + timedelta(days=1, hours=1))
+    with app.app_context():
+        assert db.session.query(Show).count() == 2
+
+
+def test_reservation_blocks_other_writers(app):
+    with app.app_context():
+        database = db.engine.url.database
+        with booking.reservation():
+            assert booking.find_conflicts(1, 1, datetime(2030, 1, 1),
+                                          datetime(2030, 1, 2)) == []
+            other = sqlite3.connect(database, timeout=0)
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                other.execute('INSERT INTO shows (artist_id, venue_id, show_date_time, '
+                              'end_date_time, updated_at) VALUES (1, 1, ?, ?, ?)',
+                              ('2030-01-01', '2030-01-01 02:00', '2030-01-01'))
+            other.close()
+        db.session.rollback()
+
+
+def test_find_conflicts_sees_the_longest_shows(app, make_venue, make_artist):
+    start = datetime(2030, 5, 1, 20, 0)
+    with app.app_context():
+        hall, band = make_venue('Hall'), make_artist('Band')
+        db.session.add_all([hall, band])
+        db.session.flush()
+        for hours_before in (booking.MAX_SHOW_DURATION.total_seconds() / 3600, 48):
+            show_start = start - timedelta(hours=hours_before) + timedelta(minutes=1)
+            db.session.add(Show(venue_id=hall.id, artist_id=band.id, show_date_time=show_start,
+                                end_date_time=show_start + booking.MAX_SHOW_DURATION))
+        db.session.commit()
+        conflicts = booking.find_conflicts(hall.id, band.id, start, start + timedelta(hours=2))
+        assert [(c.resource[0], c.start) for c in conflicts] == [
+            ('venue', start - timedelta(hours=23, minutes=59)),
+            ('artist', start - timedelta(hours=23, minutes=59))]
+        db.session.rollback()
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import counters
+from models import db, Venue, Artist, Show
+
+
+def recount(model, id):
+    # What refresh_show_counters would store.
+    now = datetime.now()
+    fk = Show.venue_id if model is Venue else Show.artist_id
+    times = [when for when, in db.session.query(Show.show_date_time).filter(fk == id)]
+    upcoming = [when for when in times if when > now]
+    return (len(upcoming), len(times) - len(upcoming), min(upcoming) if upcoming else None)
+
+
+def stored(model, id):
+    row = db.session.query(model.upcoming_shows_count, model.past_shows_count,
+                           model.next_show_at).filter(model.id == id).one()
+    return tuple(row)
+
+
+def assert_counters_match(*rows):
+    db.session.expire_all()
+    for model, id in rows:
+        assert stored(model, id) == recount(model, id), (model, id)
+
+
+def test_counters_follow_bookings_moves_and_deletes(app, make_venue, make_artist):
+    now = datetime.now()
+    with app.app_context():
+        hall, club = make_venue('Hall'), make_venue('Club')
+        band, duo = make_artist('Band'), make_artist('Duo')
+        db.session.add_all([hall, club, band, duo])
+        db.session.commit()
+        rows = [(Venue, hall.id), (Venue, club.id), (Artist, band.id), (Artist, duo.id)]
+
+        soon = Show(venue_id=hall.id, artist_id=band.id, show_date_time=now + timedelta(days=1))
+        later = Show(venue_id=hall.id, artist_id=duo.id, show_date_time=now + timedelta(days=5))
+        past = Show(venue_id=club.id, artist_id=band.id, show_date_time=now - timedelta(days=3))
+        db.session.add_all([soon, later, past])
+        db.session.commit()
+        assert stored(Venue, hall.id) == (2, 0, soon.show_date_time)
+        assert_counters_match(*rows)
+
+        # Moving the next show elsewhere recomputes next_show_at.
+        soon.venue_id = club.id
+        db.session.commit()
+        assert stored(Venue, hall.id) == (1, 0, later.show_date_time)
+        assert_counters_match(*rows)
+
+        later.show_date_time = now - timedelta(days=1)
+        db.session.commit()
+        assert_counters_match(*rows)
+
+        db.session.delete(past)
+        db.session.commit()
+        assert_counters_match(*rows)
+
+        # The delete cascade takes the club's shows off the artists too.
+        db.session.delete(club)
+        db.session.commit()
+        assert_counters_match((Venue, hall.id), (Artist, band.id), (Artist, duo.id))
+        assert stored(Artist, band.id) == (0, 0, None)
+
+
+def test_bookings_adjust_counters_relatively(app, make_venue, make_artist):
+    # A booking committed by another transaction after this session read
+    # the venue is not overwritten by this session's own booking.
+    now = datetime.now()
+    with app.app_context():
+        hall, band = make_venue('Hall'), make_artist('Band')
+        db.session.add_all([hall, band])
+        db.session.commit()
+        hall_id = hall.id
+        with db.engine.begin() as connection:
+            connection.execute(Venue.__table__.update().where(Venue.id == hall_id)
+                               .values(upcoming_shows_count=Venue.upcoming_shows_count + 1))
+        db.session.add(Show(venue_id=hall.id, artist_id=band.id, show_date_time=now + timedelta(days=1)))
+        db.session.commit()
+        assert stored(Venue, hall_id)[0] == 2
+
+        # The rollover recount repairs what a plain recount would find.
+        counters.refresh_show_counters(db.session, venue_ids=[hall_id])
+        db.session.commit()
+        assert stored(Venue, hall_id)[0] == 1
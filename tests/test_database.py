@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from sqlalchemy import event
+
+import database
+from models import db, Venue
+
+
+@pytest.fixture
+def replica_app(make_app, make_venue, tmp_path):
+    # The primary and the replica are two SQLite files holding different
+    # rows, so every read shows where it went.
+    app = make_app(SQLALCHEMY_REPLICA_URI=f'sqlite:///{tmp_path / "replica.db"}')
+    with app.app_context():
+        replica = db.get_engine(app, bind=database.REPLICA_BIND)
+        db.metadata.create_all(replica)
+        db.session.add(make_venue('Primary Hall'))
+        db.session.commit()
+        with replica.begin() as connection:
+            connection.execute(Venue.__table__.insert(), {
+                'name': 'Replica Hall', 'city': 'Springfield', 'state': 'IL',
+                'address': '1 Main St', 'phone': '555-555-5555', 'genres': ['Jazz']})
+    return app
+
+
+def venue_names():
+    return sorted(name for name, in db.session.query(Venue.name))
+
+
+def test_reads_of_read_only_endpoints_go_to_the_replica(replica_app):
+    with replica_app.test_request_context('/venues'):
+        assert venue_names() == ['Replica Hall']
+        db.session.remove()
+    with replica_app.test_request_context('/venues/create', method='POST'):
+        assert venue_names() == ['Primary Hall']
+        db.session.remove()
+    with replica_app.app_context():
+        assert venue_names() == ['Primary Hall']
+
+
+def test_flushes_go_to_the_primary(replica_app, make_venue):
+    with replica_app.test_request_context('/venues'):
+        db.session.add(make_venue('New Hall'))
+        db.session.flush()
+        assert venue_names() == ['Replica Hall']
+        db.session.commit()
+        db.session.remove()
+    with replica_app.app_context():
+        assert venue_names() == ['New Hall', 'Primary Hall']
+
+
+def test_writers_read_from_the_primary_for_a_while(replica_app):
+    client = replica_app.test_client()
+    response = client.post('/venues/create', data={})
+    cookie = response.headers['Set-Cookie']
+    assert cookie.startswith(database.PRIMARY_UNTIL_COOKIE + '=')
+    until = float(cookie.split(';')[0].split('=')[1])
+    assert time.time() < until <= time.time() + replica_app.config['READ_YOUR_WRITES_SECONDS'] + 1
+
+    with replica_app.test_request_context(
+            '/venues', headers={'Cookie': f'{database.PRIMARY_UNTIL_COOKIE}={until}'}):
+        assert venue_names() == ['Primary Hall']
+        db.session.remove()
+    with replica_app.test_request_context(
+            '/venues', headers={'Cookie': f'{database.PRIMARY_UNTIL_COOKIE}={time.time() - 1}'}):
+        assert venue_names() == ['Replica Hall']
+        db.session.remove()
+
+
+@pytest.fixture
+def timeout_statements(app, monkeypatch):
+    # Runs the Postgres branch of the after_begin listener on SQLite: the
+    # dialect reports itself as postgresql, and the SET statements are
+    # recorded and swapped for a no-op.
+    with app.app_context():
+        engine = db.engine
+    monkeypatch.setattr(engine.dialect, 'name', 'postgresql')
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SET '):
+            statements.append(statement)
+            return 'SELECT 1', ()
+        return statement, parameters
+
+    event.listen(engine, 'before_cursor_execute', record, retval=True)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_statement_timeout_is_set_per_transaction(app, timeout_statements):
+    app.config['DB_PGBOUNCER'] = True
+    with app.test_request_context('/venues/search', method='POST'):
+        for _ in range(2):
+            db.session.query(Venue).all()
+            db.session.commit()
+        db.session.remove()
+    assert timeout_statements == ['SET LOCAL statement_timeout = 2000'] * 2
+
+
+def test_statement_timeout_only_when_it_differs(app, timeout_statements):
+    # Connections are opened with STATEMENT_TIMEOUT_MS unless behind
+    # PgBouncer; commands outside a request run without a limit.
+    with app.test_request_context('/venues'):
+        db.session.query(Venue).all()
+        db.session.remove()
+    assert timeout_statements == []
+    with app.test_request_context('/venues/search', method='POST'):
+        db.session.query(Venue).all()
+        db.session.remove()
+    assert timeout_statements == ['SET LOCAL statement_timeout = 2000']
+    with app.app_context():
+        db.session.query(Venue).all()
+        db.session.remove()
+    assert timeout_statements == ['SET LOCAL statement_timeout = 2000',
+                                  'SET LOCAL statement_timeout = 0']
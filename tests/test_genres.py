@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import genres
+from models import db, Show, GenreCount
+
+
+def stored():
+    db.session.expire_all()
+    return {row.genre: (row.venues_count, row.artists_count, row.upcoming_shows_count)
+            for row in GenreCount.query if any((row.venues_count, row.artists_count,
+                                               row.upcoming_shows_count))}
+
+
+def recounted():
+    genres.refresh_genre_counts(db.session)
+    counts = stored()
+    db.session.rollback()
+    return counts
+
+
+def test_genre_counts_follow_writes(app, make_venue, make_artist):
+    now = datetime.now()
+    with app.app_context():
+        hall = make_venue('Hall', ['Jazz', 'Blues'])
+        band = make_artist('Band', ['Jazz'])
+        duo = make_artist('Duo', ['Folk'])
+        db.session.add_all([hall, band, duo])
+        db.session.commit()
+        assert stored() == {'Jazz': (1, 1, 0), 'Blues': (1, 0, 0), 'Folk': (0, 1, 0)}
+
+        # Shows created through the relationships, as the views do.
+        soon = Show(venue=hall, artist=band, show_date_time=now + timedelta(days=1))
+        db.session.add_all([
+            soon, Show(venue=hall, artist=duo, show_date_time=now + timedelta(days=2)),
+            Show(venue=hall, artist=band, show_date_time=now - timedelta(days=2))])
+        db.session.commit()
+        assert stored() == {'Jazz': (1, 1, 1), 'Blues': (1, 0, 0), 'Folk': (0, 1, 1)}
+
+        # The artist takes its upcoming shows to its new genres.
+        band.genres = ['Funk', 'Folk']
+        db.session.commit()
+        assert stored() == {'Jazz': (1, 0, 0), 'Blues': (1, 0, 0), 'Folk': (0, 2, 2),
+                            'Funk': (0, 1, 1)}
+        assert stored() == recounted()
+
+        soon.show_date_time = now - timedelta(days=1)
+        soon.artist = duo
+        db.session.commit()
+        assert stored() == recounted()
+
+        db.session.delete(duo)
+        hall.genres = ['Jazz']
+        db.session.commit()
+        assert stored() == recounted() == {'Jazz': (1, 0, 0), 'Folk': (0, 1, 0), 'Funk': (0, 1, 0)}
+
+
+def test_genre_counts_are_relative(app, make_venue):
+    # Counts committed by another transaction are added to, not overwritten.
+    with app.app_context():
+        db.session.add(make_venue('Hall', ['Jazz']))
+        db.session.commit()
+        with db.engine.begin() as connection:
+            connection.execute(GenreCount.__table__.update().where(GenreCount.genre == 'Jazz')
+                               .values(venues_count=GenreCount.venues_count + 1))
+        db.session.add(make_venue('Club', ['Jazz', 'Reggae']))
+        db.session.commit()
+        assert stored() == {'Jazz': (3, 0, 0), 'Reggae': (1, 0, 0)}
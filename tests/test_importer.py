@@ -0,0 +1,34 @@
+import io
+
+from importer import Importer, read_rows
+from models import db, Venue, Artist, Show
+
+
+def test_show_rows_need_a_start_time(app):
+    with app.app_context():
+        db.session.add_all([
+            Venue(name='Hall', city='Springfield', state='IL', address='1 Main St',
+                  phone='555-555-5555', genres=['Jazz']),
+            Artist(name='Band', city='Springfield', state='IL', genres=['Jazz']),
+        ])
+        db.session.commit()
+        rows = io.StringIO(
+            'artist,venue,start_time\n'
+            'Band,Hall,2030-05-01 20:00:00\n'
+            'Band,Hall,\n'
+            'Band,Hall,   \n')
+        importer = Importer('shows')
+        importer.run(read_rows(rows, 'csv'))
+        assert importer.imported == 1
+        assert [(line, str(error)) for line, error in importer.errors] == [
+            (3, 'start_time - This field is required.'),
+            (4, 'start_time - This field is required.'),
+        ]
+
+        # A row without the column at all.
+        importer = Importer('shows')
+        importer.run(read_rows(io.StringIO('{"artist": "Band", "venue": "Hall"}\n'), 'jsonl'))
+        assert importer.imported == 0
+        assert [str(error) for line, error in importer.errors] == [
+            'start_time - This field is required.']
+        assert db.session.query(Show).count() == 1
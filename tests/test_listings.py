@@ -0,0 +1,20 @@
+LISTING_PAGES = ['/venues', '/artists', '/shows', '/genres', '/genres/Jazz',
+                 '/venues/search?search_term=a', '/artists/search?search_term=a']
+
+
+def statements_per_page(app, count_statements):
+    client = app.test_client()
+    counts = {}
+    for url in LISTING_PAGES:
+        assert client.get(url).status_code == 200, url
+        with count_statements(app) as counter:
+            client.get(url)
+        counts[url] = counter.count
+    return counts
+
+
+def test_listing_statements_do_not_grow_with_data(make_app, count_statements):
+    # N and then 10N shows (and the venues and artists that come with them).
+    small = statements_per_page(make_app(shows=100), count_statements)
+    large = statements_per_page(make_app(shows=1000), count_statements)
+    assert large == small
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+
+# Each process is its own gunicorn worker stand-in: PROMETHEUS_MULTIPROC_DIR
+# is read when prometheus_client is imported, so it cannot be switched on in
+# the test process itself.
+WORKER = textwrap.dedent('''
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, {tests!r})
+    from conftest import app_config
+    from app import create_app
+    from models import db
+
+    app = create_app(app_config(Path(sys.argv[1]), METRICS_ENABLED=True))
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    for i in range(int(sys.argv[2])):
+        assert client.get('/').status_code == 200
+    if sys.argv[3:] == ['scrape']:
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        sys.stdout.write(response.get_data(as_text=True))
+''')
+
+
+def run_worker(tmp_path, requests, *args):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path / 'metrics'))
+    result = subprocess.run(
+        [sys.executable, '-c', WORKER.format(tests=os.path.join(ROOT, 'tests')),
+         str(tmp_path), str(requests)] + list(args),
+        cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_metrics_sum_over_worker_processes(tmp_path):
+    (tmp_path / 'metrics').mkdir()
+    run_worker(tmp_path, 2)
+    run_worker(tmp_path, 3)
+    body = run_worker(tmp_path, 0, 'scrape')
+    samples = dict(line.rsplit(' ', 1) for line in body.splitlines()
+                   if line and not line.startswith('#'))
+    assert float(samples['fyyur_requests_total{endpoint="main.index",status="200"}']) == 5
+    assert float(samples['fyyur_request_duration_seconds_count{endpoint="main.index"}']) == 5
+    assert float(samples['fyyur_request_duration_seconds_bucket{endpoint="main.index",le="+Inf"}']) == 5
+    assert 'fyyur_request_duration_seconds_sum{endpoint="main.index"}' in samples
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import cache
+from models import db, Artist, Show
+
+
+def add_show(app, make_venue, make_artist, start):
+    with app.app_context():
+        hall, band = make_venue('Hall'), make_artist('Band')
+        db.session.add_all([hall, band])
+        db.session.flush()
+        db.session.add(Show(venue_id=hall.id, artist_id=band.id, show_date_time=start,
+                            end_date_time=start + timedelta(hours=2)))
+        db.session.commit()
+        return hall.id, band.id
+
+
+def rename_artist(app, artist_id, name):
+    with app.app_context():
+        db.session.get(Artist, artist_id).name = name
+        db.session.commit()
+        db.session.remove()
+
+
+def test_venue_page_follows_its_artists(app, client, make_venue, make_artist, count_statements):
+    venue_id, artist_id = add_show(app, make_venue, make_artist,
+                                   datetime.now() + timedelta(days=7))
+    assert 'Band' in client.get(f'/venues/{venue_id}').data.decode()
+    with count_statements(app) as counter:
+        client.get(f'/venues/{venue_id}')
+    assert counter.count == 0
+
+    # The venue page is tagged with the artist of its show.
+    rename_artist(app, artist_id, 'Renamed Band')
+    page = client.get(f'/venues/{venue_id}').data.decode()
+    assert 'Renamed Band' in page
+
+
+def test_other_processes_invalidate_a_shared_cache(make_app, make_venue, make_artist, tmp_path):
+    # Two workers on one database and one CACHE_DIR, each with its own
+    # FileSystemCache: a commit in one makes the other re-render.
+    shared = dict(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "shared.db"}',
+                  CACHE_TYPE='filesystem', CACHE_DIR=str(tmp_path / 'cache'))
+    first, second = make_app(**shared), make_app(**shared)
+    venue_id, artist_id = add_show(first, make_venue, make_artist,
+                                   datetime.now() + timedelta(days=7))
+    client = first.test_client()
+    assert 'Band' in client.get(f'/venues/{venue_id}').data.decode()
+
+    rename_artist(second, artist_id, 'Renamed Band')
+    assert 'Renamed Band' in client.get(f'/venues/{venue_id}').data.decode()
+
+
+def test_venue_page_expires_when_its_next_show_starts(make_app, make_venue, make_artist,
+                                                      count_statements, monkeypatch):
+    app = make_app(CACHE_DEFAULT_TIMEOUT=86400)
+    start = datetime.now() + timedelta(hours=1)
+    venue_id, artist_id = add_show(app, make_venue, make_artist, start)
+    client = app.test_client()
+    client.get(f'/venues/{venue_id}')
+
+    def statements_at(when):
+        monkeypatch.setattr(cache, 'time', SimpleNamespace(time=lambda: when))
+        with count_statements(app) as counter:
+            assert client.get(f'/venues/{venue_id}').status_code == 200
+        return counter.count
+
+    assert statements_at(start.timestamp() - 60) == 0
+    assert statements_at(start.timestamp() + 1) > 0
@@ -0,0 +1,76 @@
+from models import db, Venue, Artist
+from pagination import encode_cursor, paginate
+
+
+def page_through(app, query, columns, per_page=2, descending=False):
+    # Follows next_cursor from the first page to the last; returns every
+    # page's items.
+    pages = []
+    url = f'/?per_page={per_page}'
+    while True:
+        with app.test_request_context(url):
+            page = paginate(query(), columns, descending=descending)
+            pages.append(page.items)
+            if page.next_cursor is None:
+                return pages
+            url = f'/?per_page={per_page}&after={page.next_cursor}'
+
+
+def add_venues(states):
+    for number, state in enumerate(states):
+        db.session.add(Venue(name=f'Venue {number}', city='Springfield', state=state,
+                             address='1 Main St', phone='555-555-5555', genres=['Jazz']))
+    db.session.commit()
+
+
+def test_pages_reach_rows_with_null_keys(app):
+    with app.app_context():
+        add_venues(['CA', None, 'NY', None, None, 'CA', 'TX'])
+        for name in ['b', None, 'a', None, 'c']:
+            db.session.add(Artist(name=name, city='Springfield', genres=['Jazz']))
+        db.session.commit()
+
+        venue_columns = [Venue.state, Venue.city, Venue.name, Venue.id]
+        for descending in (False, True):
+            pages = page_through(
+                app, lambda: db.session.query(Venue.state, Venue.city, Venue.name, Venue.id),
+                venue_columns, descending=descending)
+            ids = [row.id for page in pages for row in page]
+            assert sorted(ids) == list(range(1, 8))
+            assert len(ids) == len(set(ids))
+
+        pages = page_through(app, lambda: db.session.query(Artist.id, Artist.name),
+                             [Artist.name, Artist.id])
+        names = [row.name for page in pages for row in page]
+        assert names == [None, None, 'a', 'b', 'c']
+
+
+def test_backwards_pages_mirror_forward_pages(app):
+    with app.app_context():
+        add_venues([None, 'CA', None, 'NY', None])
+        columns = [Venue.state, Venue.city, Venue.name, Venue.id]
+
+        def query():
+            return db.session.query(Venue.state, Venue.city, Venue.name, Venue.id)
+
+        forward = page_through(app, query, columns)
+        # From the last page back to the first through prev_cursor.
+        with app.test_request_context('/?per_page=2'):
+            first = paginate(query(), columns)
+        with app.test_request_context(f'/?per_page=2&after={first.next_cursor}'):
+            second = paginate(query(), columns)
+        with app.test_request_context(f'/?per_page=2&before={second.prev_cursor}'):
+            back = paginate(query(), columns)
+        assert [row.id for row in back] == [row.id for row in forward[0]]
+
+
+def test_cursors_of_the_wrong_type_start_over(app):
+    with app.app_context():
+        add_venues(['CA', 'NY', 'TX'])
+        columns = [Venue.state, Venue.city, Venue.name, Venue.id]
+        for values in (['CA', 'Springfield', 'Venue 0', '1'], ['CA', 'Springfield', 'Venue 0', True],
+                       [1, 'Springfield', 'Venue 0', 1], ['CA', 'Springfield', 'Venue 0']):
+            with app.test_request_context(f'/?per_page=2&after={encode_cursor(values)}'):
+                page = paginate(db.session.query(Venue.state, Venue.city, Venue.name, Venue.id),
+                                columns)
+            assert [row.id for row in page] == [1, 2], values
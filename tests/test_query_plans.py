@@ -0,0 +1,76 @@
+# Query plan check for the read routes, on Postgres (skipped without
+# TEST_POSTGRES_URL). Requests every route in ROUTE_STATEMENT_BUDGETS with
+# the page cache off, EXPLAINs each SELECT it runs (with its parameters) and
+# fails when a plan reads a large table with a sequential scan. Run it after
+# changing a route or an index.
+
+import re
+
+from sqlalchemy import event
+
+from instrumentation import ROUTE_STATEMENT_BUDGETS
+from models import db, Venue, Artist
+
+# 5000 venues and 10000 artists (bench/datagen.py).
+SHOWS = 100000
+# Tables with fewer rows may be scanned.
+MIN_ROWS = 1000
+
+# route -> tables it is allowed to scan: one-letter search terms are too
+# short for the trigram indexes.
+EXPECTED_SCANS = {
+    '/venues/search?search_term=a': {'venues'},
+    '/artists/search?search_term=a': {'artists'},
+    '/venues/search?search_term=a&genres=Jazz': {'venues'},
+}
+
+_scan = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+    return '\n'.join(row[0] for row in rows)
+
+
+def test_read_routes_use_indexes(make_app, postgres_config):
+    app = make_app(shows=SHOWS, CACHE_TYPE='null', **postgres_config)
+    with app.app_context():
+        engine = db.engine
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        sizes = {table.name: db.session.query(db.func.count()).select_from(table).scalar()
+                 for table in db.metadata.sorted_tables}
+        ids = {
+            'venue_id': db.session.query(db.func.min(Venue.id)).scalar(),
+            'artist_id': db.session.query(db.func.min(Artist.id)).scalar(),
+        }
+        db.session.remove()
+
+    client = app.test_client()
+    problems = []
+    for pattern in ROUTE_STATEMENT_BUDGETS:
+        url = pattern.format(**ids)
+        # The first request builds the in-process indexes (autocomplete,
+        # memory search), which read whole tables once by design.
+        client.get(url)
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                captured.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            assert client.get(url).status_code == 200, url
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        with engine.connect() as connection:
+            for statement, parameters in captured:
+                plan = explain(connection, statement, parameters)
+                scans = {table for table in _scan.findall(plan)
+                         if sizes.get(table, MIN_ROWS) >= MIN_ROWS}
+                scans -= EXPECTED_SCANS.get(pattern, set())
+                if scans:
+                    problems.append(f'{url}: sequential scan of {", ".join(sorted(scans))}\n'
+                                    f'{" ".join(statement.split())}\n{plan}')
+    assert problems == [], '\n\n'.join(problems)
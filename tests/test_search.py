@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+import search
+from pagination import encode_cursor
+from models import db, Venue, Artist
+
+VENUES = [
+    ('The Musical Hop', 'San Francisco', 'CA', ['Jazz', 'Reggae', 'Swing', 'Classical', 'Folk']),
+    ('The Dueling Pianos Bar', 'New York', 'NY', ['Classical', 'R&B', 'Hip-Hop']),
+    ('Park Square Live Music & Coffee', 'San Francisco', 'CA', ['Rock n Roll', 'Jazz', 'Classical']),
+    ('Hopscotch Hall', 'Austin', 'TX', ['Blues']),
+]
+ARTISTS = [
+    ('Guns N Petals', 'San Francisco', 'CA', ['Rock n Roll']),
+    ('Matt Quevedo', 'New York', 'NY', ['Jazz']),
+    ('The Wild Sax Band', 'San Francisco', 'CA', ['Jazz', 'Classical']),
+]
+
+# term -> (venue names, artist names). Every word must start a word of the
+# name, city, state or genres, or the whole term must be part of the name.
+QUERIES = {
+    'hop': ({'The Musical Hop', 'The Dueling Pianos Bar', 'Hopscotch Hall'}, set()),
+    'usic': ({'The Musical Hop', 'Park Square Live Music & Coffee'}, set()),
+    'music hop': ({'The Musical Hop'}, set()),
+    'san fr': ({'The Musical Hop', 'Park Square Live Music & Coffee'},
+               {'Guns N Petals', 'The Wild Sax Band'}),
+    'jazz': ({'The Musical Hop', 'Park Square Live Music & Coffee'},
+             {'Matt Quevedo', 'The Wild Sax Band'}),
+    'SAX band': (set(), {'The Wild Sax Band'}),
+    'ax ba': (set(), {'The Wild Sax Band'}),
+    'b': ({'The Dueling Pianos Bar', 'Hopscotch Hall'}, {'The Wild Sax Band'}),
+    'ny': ({'The Dueling Pianos Bar'}, {'Matt Quevedo'}),
+    'tx blues': ({'Hopscotch Hall'}, set()),
+    'xyz': (set(), set()),
+    '': ({name for name, *rest in VENUES}, {name for name, *rest in ARTISTS}),
+}
+
+
+def add_rows():
+    for name, city, state, genres in VENUES:
+        db.session.add(Venue(name=name, city=city, state=state, genres=genres,
+                             address='1 Main St', phone='555-555-5555'))
+    for name, city, state, genres in ARTISTS:
+        db.session.add(Artist(name=name, city=city, state=state, genres=genres))
+    db.session.commit()
+
+
+def search_names(app, model, term):
+    with app.test_request_context('/?per_page=200'):
+        page, count = search.search(model, term)
+        names = {hit.name for hit in page}
+    assert count == len(names)
+    return names
+
+
+@pytest.fixture(params=['memory', 'postgres'])
+def search_app(request, make_app):
+    if request.param == 'memory':
+        return make_app(SEARCH_BACKEND='memory')
+    return make_app(SEARCH_BACKEND='postgres', **request.getfixturevalue('postgres_config'))
+
+
+@pytest.mark.parametrize('term', sorted(QUERIES))
+def test_backends_match_the_same_rows(search_app, term):
+    with search_app.app_context():
+        add_rows()
+    venues, artists = QUERIES[term]
+    assert search_names(search_app, Venue, term) == venues
+    assert search_names(search_app, Artist, term) == artists
+
+
+def test_memory_index_follows_other_processes(make_app):
+    app = make_app(SEARCH_BACKEND='memory', SEARCH_REFRESH_SECONDS=1)
+    with app.app_context():
+        add_rows()
+    assert search_names(app, Venue, 'hopscotch') == {'Hopscotch Hall'}
+
+    # Written behind the commit listener's back, as another worker would.
+    with app.app_context():
+        connection = db.engine.connect()
+    with connection.begin():
+        connection.execute(Venue.__table__.update().where(Venue.name == 'Hopscotch Hall')
+                           .values(name='Butterscotch Hall', updated_at=datetime.utcnow()))
+        connection.execute(Venue.__table__.delete().where(Venue.name == 'The Musical Hop'))
+    connection.close()
+
+    backend = app.extensions['search']
+    backend._poller._polled_at -= 2
+    assert search_names(app, Venue, 'scotch') == {'Butterscotch Hall'}
+    assert search_names(app, Venue, 'musical') == set()
+
+
+def test_cursors_of_the_wrong_type_start_over(search_app):
+    with search_app.app_context():
+        add_rows()
+    with search_app.test_request_context('/?per_page=2'):
+        first, count = search.search(Venue, 'hop')
+    for values in (['x', 'hop', 1], [-1.0, 'hop', '1'], [-1.0, 'hop']):
+        cursor = encode_cursor(values)
+        with search_app.test_request_context(f'/?per_page=2&after={cursor}'):
+            page, count = search.search(Venue, 'hop')
+        assert [hit.id for hit in page] == [hit.id for hit in first], values
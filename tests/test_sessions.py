@@ -0,0 +1,14 @@
+import multiprocessing
+
+import sessions
+
+
+def test_workers_starting_together_share_one_key(tmp_path):
+    for attempt in range(5):
+        path = str(tmp_path / str(attempt) / 'secret_key')
+        with multiprocessing.get_context('fork').Pool(8) as pool:
+            keys = pool.map(sessions._create_key, [path] * 8)
+        assert len(set(keys)) == 1
+        assert keys[0] and len(keys[0]) == 64
+    # No temporary files are left behind.
+    assert [p.name for p in tmp_path.glob('*/*')] == ['secret_key'] * 5
@@ -0,0 +1,25 @@
+import config
+from instrumentation import profile_startup
+from conftest import ROOT
+
+
+def test_worker_import_fits_the_startup_budget():
+    # What `flask startup-profile` checks; the best of three runs, so that a
+    # busy machine does not fail it.
+    totals = []
+    for attempt in range(3):
+        timings = profile_startup('wsgi', cwd=ROOT)
+        modules = {name for name, own, cumulative, depth in timings}
+        totals.append(next(cumulative for name, own, cumulative, depth in timings
+                           if name == 'wsgi' and depth == 0))
+        # Only the `flask db` commands need it (see app.init_migrate).
+        assert 'flask_migrate' not in modules
+    assert min(totals) <= config.STARTUP_BUDGET_MS
+
+
+def test_scripts_can_register_migrate(make_app):
+    app = make_app()
+    assert 'migrate' not in app.extensions
+    from app import init_migrate
+    init_migrate(app, always=True)
+    assert app.extensions['migrate'].directory == 'migrations'
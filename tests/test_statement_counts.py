@@ -0,0 +1,23 @@
+from instrumentation import ROUTE_STATEMENT_BUDGETS
+from models import db, Venue, Artist
+
+
+def test_route_statement_budgets(make_app, count_statements):
+    # Steady-state statements per GET, after a warm-up request (see
+    # ROUTE_STATEMENT_BUDGETS).
+    app = make_app(shows=200)
+    with app.app_context():
+        ids = {
+            'venue_id': db.session.query(db.func.min(Venue.id)).scalar(),
+            'artist_id': db.session.query(db.func.min(Artist.id)).scalar(),
+        }
+    client = app.test_client()
+    over = []
+    for pattern, budget in ROUTE_STATEMENT_BUDGETS.items():
+        url = pattern.format(**ids)
+        assert client.get(url).status_code == 200, url
+        with count_statements(app) as counter:
+            client.get(url)
+        if counter.count > budget:
+            over.append((url, counter.count, budget, counter.statements))
+    assert over == []
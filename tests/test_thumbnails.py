@@ -0,0 +1,134 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import thumbnails
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def serve_http():
+    # serve_http(host, {path: (status, headers, body)}) -> (base URL, [paths
+    # requested]).
+    servers = []
+
+    def start(host, routes):
+        requested = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                status, headers, body = routes.get(self.path, (404, {}, b''))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://{host}:{server.server_port}', requested
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_public_addresses():
+    assert thumbnails.is_public_address('93.184.216.34')
+    assert thumbnails.is_public_address('2606:2800:220:1:248:1893:25c8:1946')
+    for address in ('127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+                    '100.64.0.1', '0.0.0.0', '240.0.0.1', '224.0.0.1', '::1', 'fe80::1%eth0',
+                    'fc00::1', '::ffff:127.0.0.1'):
+        assert not thumbnails.is_public_address(address), address
+
+
+def test_fetch_refuses_private_addresses(serve_http):
+    base, requested = serve_http('127.0.0.1', {'/a.png': (200, {}, png(10, 10))})
+    with pytest.raises(thumbnails.FetchError, match='not a public address'):
+        thumbnails.fetch(base + '/a.png')
+    # Refused before the request was sent.
+    assert requested == []
+
+
+def test_fetch_checks_every_redirect(serve_http, monkeypatch):
+    # 127.0.0.1 stands in for a public host that redirects to a private one.
+    monkeypatch.setattr(thumbnails, 'is_public_address', lambda address: address == '127.0.0.1')
+    private, private_requests = serve_http('127.0.0.2', {'/secret': (200, {}, png(10, 10))})
+    public, public_requests = serve_http('127.0.0.1', {
+        '/a.png': (200, {}, png(10, 10)),
+        '/moved': (302, {'Location': private + '/secret'}, b''),
+        '/ftp': (302, {'Location': 'ftp://127.0.0.1/a.png'}, b''),
+    })
+    assert thumbnails.fetch(public + '/a.png') == png(10, 10)
+    with pytest.raises(thumbnails.FetchError, match='not a public address'):
+        thumbnails.fetch(public + '/moved')
+    with pytest.raises(thumbnails.FetchError):
+        thumbnails.fetch(public + '/ftp')
+    assert private_requests == []
+
+
+def test_undecodable_images_are_fetch_errors(monkeypatch):
+    with pytest.raises(thumbnails.FetchError):
+        thumbnails.make_thumbnail(b'not an image', 400)
+    with pytest.raises(thumbnails.FetchError):
+        thumbnails.make_thumbnail(png(50, 50)[:60], 400)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    with pytest.raises(thumbnails.FetchError):
+        thumbnails.make_thumbnail(png(50, 50), 400)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', None)
+    monkeypatch.setattr(thumbnails, 'MAX_SOURCE_PIXELS', 100)
+    with pytest.raises(thumbnails.FetchError, match='too large'):
+        thumbnails.make_thumbnail(png(50, 50), 400)
+
+
+def test_failed_thumbnails_are_not_found(app, client, serve_http, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'is_public_address', lambda address: True)
+    base, requested = serve_http('127.0.0.1', {
+        '/a.png': (200, {}, png(800, 600)),
+        '/broken.png': (200, {}, b'not an image'),
+    })
+    with app.test_request_context():
+        good = thumbnails.thumbnail_url(base + '/a.png')
+        broken = thumbnails.thumbnail_url(base + '/broken.png')
+        unsigned = good.replace('a.png', 'elsewhere.png')
+    response = client.get(good)
+    assert response.status_code == 200
+    assert response.mimetype == thumbnails.MIMETYPE
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.size == (400, 300)
+    # No redirect to the original: the proxy would be an open redirect.
+    assert client.get(broken).status_code == 404
+    assert client.get(unsigned).status_code == 404
+
+
+def test_prefetch_survives_unexpected_errors(app, monkeypatch):
+    store = app.extensions['thumbnails']
+    done = []
+
+    def get(size, url):
+        if url == 'bad':
+            raise RuntimeError('decoder crashed')
+        done.append(url)
+
+    monkeypatch.setattr(store, 'get', get)
+    prefetcher = thumbnails.Prefetcher(store, ['tile'], app.logger)
+    prefetcher.submit('bad')
+    prefetcher.submit('good')
+    prefetcher.queue.join()
+    assert done == ['good']
+    assert prefetcher._thread.is_alive()
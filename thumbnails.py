@@ -0,0 +1,419 @@
+import hmac
+import http.client
+import importlib.util
+import io
+import ipaddress
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from functools import lru_cache
+from hashlib import sha256
+
+import click
+from flask import abort, current_app, send_file, url_for
+from flask.cli import with_appcontext
+
+import events
+import metrics
+import sessions
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Thumbnail proxy.
+#----------------------------------------------------------------------------#
+
+# image_link artwork lives on third-party hosts and is often several
+# megabytes. Templates link to /thumbnails/<size>/<signature>?url=... instead
+# (thumbnail_url()); the first request fetches the original once, resizes
+# it to fit SIZES[size] and stores the result, later ones are served from
+# disk with a strong ETag. The signature is an HMAC of the size and URL, so
+# the endpoint only fetches URLs that the app itself rendered.
+#
+# The store is content addressed: blobs/ holds each thumbnail under the
+# SHA-256 of its bytes (which is also its ETag), refs/ maps a (size, URL)
+# to a blob. Blobs are evicted least recently used first once the store
+# grows past THUMBNAIL_CACHE_MAX_BYTES; a ref to an evicted blob is a miss.
+#
+# Commits that add or change a venue's or artist's image_link queue a
+# prefetch, so the first visitor does not pay for the fetch.
+#
+# image_link is whatever a user typed in, so fetches only ever connect to
+# public addresses: the check runs on the address each connection actually
+# reached (after DNS, so rebinding does not get around it), before a byte
+# is sent, on every redirect hop. Proxies from the environment are not
+# used, and redirects can only lead to http(s) URLs. A URL that cannot be
+# thumbnailed answers 404; the proxy never redirects to the original.
+
+# name -> longest side in pixels (twice the CSS size, for high-DPI screens).
+SIZES = {
+    'tile': 400,
+    'page': 1000,
+}
+FORMAT = 'WEBP'
+MIMETYPE = 'image/webp'
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Decoding is refused past this many pixels (a small file can declare a
+# huge image).
+MAX_SOURCE_PIXELS = 40 * 1000 * 1000
+FETCH_TIMEOUT = 10
+# Failed fetches are not retried for this many seconds.
+FAILURE_TIMEOUT = 300
+PREFETCH_QUEUE_SIZE = 1000
+
+
+class FetchError(Exception):
+    pass
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _create_public_connection(address, *args, **kwargs):
+    sock = socket.create_connection(address, *args, **kwargs)
+    peer = sock.getpeername()[0]
+    if not is_public_address(peer):
+        sock.close()
+        raise OSError(f'{address[0]} resolves to {peer}, which is not a public address')
+    return sock
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+def _opener():
+    # Only http(s), with redirects, and no proxies.
+    opener = urllib.request.OpenerDirector()
+    for handler in (_PublicHTTPHandler(), _PublicHTTPSHandler(),
+                    urllib.request.HTTPRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(),
+                    urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch(url, timeout=FETCH_TIMEOUT, max_bytes=MAX_SOURCE_BYTES):
+    if not url.startswith(('http://', 'https://')):
+        raise FetchError(f'unsupported URL {url!r}')
+    try:
+        with _opener().open(url, timeout=timeout) as response:
+            content = response.read(max_bytes + 1)
+    except (urllib.error.URLError, OSError, ValueError, http.client.HTTPException) as e:
+        raise FetchError(f'{url}: {e}')
+    if len(content) > max_bytes:
+        raise FetchError(f'{url}: larger than {max_bytes} bytes')
+    return content
+
+
+def make_thumbnail(content, size):
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise FetchError(f'{image.width}x{image.height} pixels is too large')
+            image.thumbnail((size, size), Image.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, FORMAT, quality=80, method=4)
+    # UnidentifiedImageError is an OSError; broken files can also raise
+    # SyntaxError, EOFError or ValueError from the decoders.
+    except (Image.DecompressionBombError, OSError, SyntaxError, EOFError, ValueError) as e:
+        raise FetchError(f'not an image: {e}')
+    return buffer.getvalue()
+
+
+class ThumbnailStore(object):
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        # key -> lock, so concurrent misses for one image fetch it once.
+        self._fetching = {}
+        # key -> time of the last failed fetch.
+        self._failures = {}
+        for name in ('blobs', 'refs'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    @staticmethod
+    def key(size, url):
+        return sha256(f'{size}\n{url}'.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest[:2], digest)
+
+    def _ref_path(self, key):
+        return os.path.join(self.directory, 'refs', key[:2], key)
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def lookup(self, size, url):
+        # (digest, path) of the cached thumbnail, or None.
+        try:
+            with open(self._ref_path(self.key(size, url))) as f:
+                digest = f.read().strip()
+            path = self._blob_path(digest)
+            # mtime is the LRU clock.
+            os.utime(path)
+        except OSError:
+            return None
+        return digest, path
+
+    def get(self, size, url):
+        # Like lookup(), fetching and storing the thumbnail on a miss.
+        # Raises FetchError when the original cannot be turned into one.
+        found = self.lookup(size, url)
+        metrics.cache_lookup('thumbnail', found is not None)
+        if found is not None:
+            return found
+        key = self.key(size, url)
+        with self._lock:
+            lock = self._fetching.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                found = self.lookup(size, url)
+                if found is not None:
+                    return found
+                failed_at = self._failures.get(key)
+                if failed_at is not None and time.time() - failed_at < FAILURE_TIMEOUT:
+                    raise FetchError(f'{url}: failed recently')
+                try:
+                    thumbnail = make_thumbnail(fetch(url), SIZES[size])
+                except FetchError:
+                    if len(self._failures) > 10000:
+                        self._failures.clear()
+                    self._failures[key] = time.time()
+                    raise
+                self._failures.pop(key, None)
+                return self.put(key, thumbnail)
+            finally:
+                with self._lock:
+                    self._fetching.pop(key, None)
+
+    def put(self, key, thumbnail):
+        digest = sha256(thumbnail).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            self._write(path, thumbnail)
+            self._grow(len(thumbnail))
+        self._write(self._ref_path(key), digest.encode('ascii'))
+        return digest, path
+
+    def _blobs(self):
+        for root, dirs, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for name in files:
+                if not name.startswith('.tmp'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _grow(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(blob_size for path, blob_size, mtime in self._blobs())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Down to 90% of the limit, least recently used first. Refs are
+        # left behind; they miss once their blob is gone.
+        target = self.max_bytes * 0.9
+        blobs = sorted(self._blobs(), key=lambda blob: blob[2])
+        self._size = sum(size for path, size, mtime in blobs)
+        for path, size, mtime in blobs:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def stats(self):
+        blobs = list(self._blobs())
+        return len(blobs), sum(size for path, size, mtime in blobs)
+
+
+class Prefetcher(object):
+    # One daemon thread warming the store; the queue is bounded so a bulk
+    # import cannot pile up work, extra URLs are dropped.
+
+    def __init__(self, store, sizes, logger):
+        self.store = store
+        self.sizes = sizes
+        self.logger = logger
+        self.queue = queue.Queue(PREFETCH_QUEUE_SIZE)
+        self._thread = None
+
+    def submit(self, url):
+        for size in self.sizes:
+            if self.store.lookup(size, url) is not None:
+                continue
+            try:
+                self.queue.put_nowait((size, url))
+            except queue.Full:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='thumbnail-prefetch',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            size, url = self.queue.get()
+            try:
+                self.store.get(size, url)
+            except FetchError:
+                pass
+            except Exception:
+                # One bad image must not stop the thread.
+                self.logger.exception('thumbnail prefetch of %s failed', url)
+            finally:
+                self.queue.task_done()
+
+    def on_commit(self, changes):
+        for model in (Venue, Artist):
+            for values in changes.upserted[model].values():
+                if values.get('image_link'):
+                    self.submit(values['image_link'])
+
+
+@lru_cache(maxsize=None)
+def _has_pillow():
+    return importlib.util.find_spec('PIL') is not None
+
+
+def _signing_keys():
+    # THUMBNAIL_KEY, or the secret keys with the signing one last, so that
+    # URLs rendered before a key rotation keep working.
+    if current_app.config['THUMBNAIL_KEY']:
+        return [current_app.config['THUMBNAIL_KEY']]
+    return sessions.secret_keys()
+
+
+def _signature(size, url, key=None):
+    key = key or _signing_keys()[-1]
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    message = f'{size}\n{url}'.encode('utf-8')
+    return hmac.new(key, message, sha256).hexdigest()[:32]
+
+
+def thumbnail_url(url, size='tile'):
+    # Template global: the proxied thumbnail of an image_link (the link
+    # itself when Pillow is not installed).
+    if not url or not url.startswith(('http://', 'https://')) or not _has_pillow():
+        return url
+    return url_for('main.thumbnail', size=size, signature=_signature(size, url), url=url)
+
+
+def store():
+    return current_app.extensions['thumbnails']
+
+
+def serve(size, signature, url):
+    # The /thumbnails view.
+    if size not in SIZES or not any(hmac.compare_digest(signature, _signature(size, url, key))
+                                    for key in _signing_keys()):
+        abort(404)
+    try:
+        digest, path = store().get(size, url)
+    except FetchError as e:
+        current_app.logger.info('thumbnail: %s', e)
+        abort(404)
+    except ImportError:
+        # Pillow is not installed.
+        abort(404)
+    response = send_file(path, mimetype=MIMETYPE, etag=digest,
+                         max_age=current_app.config['THUMBNAIL_MAX_AGE'], conditional=True)
+    response.cache_control.public = True
+    return response
+
+
+@click.group('thumbnails')
+def thumbnails_cli():
+    """Manage the image_link thumbnail cache."""
+
+
+@thumbnails_cli.command('prefetch')
+@with_appcontext
+def prefetch_command():
+    """Fetch the thumbnails of every venue and artist image."""
+    cache = store()
+    done = failed = 0
+    for model in (Venue, Artist):
+        for url, in db.session.query(model.image_link).filter(model.image_link.isnot(None)).distinct():
+            for size in SIZES:
+                try:
+                    cache.get(size, url)
+                    done += 1
+                except (FetchError, ImportError) as e:
+                    click.echo(f'{size}: {e}', err=True)
+                    failed += 1
+    click.echo(f'{done} thumbnails cached, {failed} failed.')
+
+
+@thumbnails_cli.command('stats')
+@with_appcontext
+def stats_command():
+    """Show the size of the thumbnail cache."""
+    count, size = store().stats()
+    click.echo(f'{count} thumbnails, {size / 1024 / 1024:.1f} MB '
+               f'of {current_app.config["THUMBNAIL_CACHE_MAX_BYTES"] / 1024 / 1024:.0f} MB')
+
+
+def init_app(app):
+    cache = app.extensions['thumbnails'] = ThumbnailStore(
+        app.config['THUMBNAIL_CACHE_DIR'], app.config['THUMBNAIL_CACHE_MAX_BYTES'])
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+    app.cli.add_command(thumbnails_cli)
+    if app.config['THUMBNAIL_PREFETCH']:
+        events.on_commit(app, Prefetcher(cache, list(SIZES), app.logger).on_commit)
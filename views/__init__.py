@@ -0,0 +1,16 @@
+from views import api, artists, genres, main, shows, venues
+
+#----------------------------------------------------------------------------#
+# Blueprints.
+#----------------------------------------------------------------------------#
+
+# The pages, one blueprint per section; endpoints are named after the
+# blueprint ('venues.show_venue', 'main.index'), which is what templates and
+# the endpoint sets in config.py refer to.
+
+BLUEPRINTS = (main.bp, venues.bp, artists.bp, shows.bp, genres.bp, api.bp)
+
+
+def init_app(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
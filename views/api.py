@@ -0,0 +1,85 @@
+import hmac
+
+from flask import Blueprint, Response, current_app, request, abort, jsonify, stream_with_context
+
+import autocomplete
+import exporter
+import metrics
+
+bp = Blueprint('api', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@bp.route('/autocomplete')
+def autocomplete_names():
+    # Typeahead for the navbar search and the new show form; answered from
+    # the in-process name index (see autocomplete.py), not the database.
+    kind = request.args.get('type', 'all')
+    if kind == 'all':
+        kinds = tuple(autocomplete.KINDS)
+    elif kind in autocomplete.KINDS:
+        kinds = (kind,)
+    else:
+        abort(400)
+    limit = request.args.get('limit', autocomplete.DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+    query = request.args.get('q', '')
+    return jsonify({
+        'query': query,
+        'results': autocomplete.autocomplete().complete(query, kinds, limit),
+    })
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+def _check_partner_token():
+    # Exports need one of EXPORT_TOKENS as a bearer token; without any
+    # configured the endpoint does not exist.
+    tokens = current_app.config['EXPORT_TOKENS']
+    if not tokens:
+        abort(404)
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not any(
+            hmac.compare_digest(token.encode(), expected.encode()) for expected in tokens):
+        abort(401)
+
+
+@bp.route('/export/<any(shows, venues, artists):kind>')
+def export(kind):
+    # Streams the whole table; see exporter.py for the filters.
+    _check_partner_token()
+    format = request.args.get('format', 'csv')
+    if format not in exporter.FORMATS:
+        abort(400)
+    try:
+        filters = {
+            'start': exporter.parse_time(request.args.get('start')),
+            'end': exporter.parse_time(request.args.get('end')),
+            'updated_since': exporter.parse_time(request.args.get('updated_since')),
+        }
+    except ValueError:
+        abort(400)
+    watermark = exporter.watermark()
+    response = Response(stream_with_context(exporter.generate_export(kind, format, **filters)),
+                        mimetype=exporter.FORMATS[format])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{format}'
+    response.headers['X-Export-Watermark'] = watermark.isoformat()
+    return response
+
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    # Prometheus scrape target; see metrics.py.
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
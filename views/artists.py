@@ -0,0 +1,234 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for
+import sys
+
+import cache
+import counters
+import genres
+import search
+from models import db, Artist, Show
+from pagination import paginate
+
+# The forms (and WTForms) are imported by the views that build one; pages
+# that never show a form do not load them.
+
+bp = Blueprint('artists', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@bp.route('/artists')
+def artists():
+    # TODO: replace with real data returned from querying the database
+    query = Artist.query.with_entities(Artist.id, Artist.name)
+    genre_filter, match = genres.selected_genres()
+    if genre_filter:
+        query = query.filter(genres.has_genres(Artist.genres, genre_filter, match))
+    page = paginate(query, [Artist.name, Artist.id])
+
+    return render_template('pages/artists.html', artists=page, page=page,
+                           genre_counts=genres.genre_counts(), genre_filter=genre_filter, match=match)
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+def search_artists():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+
+    search_term = request.values.get('search_term', '')
+    genre_filter, match = genres.selected_genres()
+    page, count = search.search(Artist, search_term, genre_filter, match)
+    show_counts = counters.upcoming_show_counts(Artist, [hit.id for hit in page])
+    response = {
+        'count': count,
+        'data': []
+    }
+
+    for hit in page:
+        artist = {}
+        artist['id'] = hit.id
+        artist['name'] = hit.name
+        artist['num_upcoming_shows'] = show_counts.get(hit.id, 0)
+        response['data'].append(artist)
+
+    return render_template('pages/search_artists.html', results=response, search_term=search_term, page=page,
+                           genre_filter=genre_filter, match=match)
+
+
+@bp.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # Served from the page cache, which is invalidated on commit (cache.py).
+    return cache.page_cache().cached(cache.artist_tag(artist_id),
+                                     lambda: render_artist_page(artist_id))
+
+
+def render_artist_page(artist_id):
+    # TODO: replace with real artist data from the artist table, using artist_id
+
+    data = {}
+    artist_data = Artist.query.options(
+        db.selectinload(Artist.shows).joinedload(Show.venue)).get_or_404(artist_id)
+  
+    data['id'] = artist_data.id
+    data['name'] = artist_data.name
+    data['genres'] = artist_data.genres
+    data['city'] = artist_data.city
+    data['state'] = artist_data.state
+    data['phone'] = artist_data.phone
+    data['website'] = artist_data.website_link
+    data['facebook_link'] = artist_data.facebook_link
+    data['seeking_venue'] = artist_data.seeking_venue
+    data['seeking_description'] = artist_data.seeking_description
+    data['image_link'] = artist_data.image_link
+
+    venue_data = artist_data.shows
+
+    past_show_list = []
+    future_show_list = []
+    next_show_time = None
+
+    for ind_venue in venue_data:
+        show_time = ind_venue.show_date_time
+        venue_info = {
+            'venue_id': ind_venue.venue.id,
+            'venue_name': ind_venue.venue.name,
+            'venue_image_link': ind_venue.venue.image_link,
+            'start_time': show_time
+        }
+        if show_time < datetime.now():
+            past_show_list.append(venue_info)
+        else:
+            future_show_list.append(venue_info)
+            next_show_time = min(next_show_time or show_time, show_time)
+
+    data['past_shows'] = past_show_list
+    data['past_shows_count'] = len(past_show_list)
+
+    data['upcoming_shows'] = future_show_list
+    data['upcoming_shows_count'] = len(future_show_list)
+
+    # The page goes stale when its next upcoming show starts.
+    tags = [cache.artist_tag(artist_id)] + [
+        cache.venue_tag(show['venue_id']) for show in past_show_list + future_show_list]
+    expires_at = next_show_time.timestamp() if next_show_time else None
+    return render_template('pages/show_artist.html', artist=data), tags, expires_at
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    from forms import ArtistForm
+    error = False
+    form = ArtistForm(request.form)
+
+    if form.validate():
+        try:
+            artist = Artist(
+                # left side of equation is name from the class
+                name=form.name.data,
+                city=form.city.data,
+                state=form.state.data,
+                phone=form.phone.data,
+                image_link=form.image_link.data,
+                genres=form.genres.data,
+                website_link=form.website_link.data,
+                facebook_link=form.facebook_link.data,
+                seeking_venue=form.seeking_venue.data,
+                seeking_description=form.seeking_description.data
+            )
+            db.session.add(artist)
+            db.session.commit()
+
+            # on successful db insert, flash success
+            flash('Artist ' + request.form['name'] + ' was successfully listed!')
+        # TODO: on unsuccessful db insert, flash an error instead.
+        except:
+            error = True
+            db.session.rollback()
+            print(sys.exc_info())
+            flash('An error occurred. Artist ' +
+                request.form['name'] + ' could not be listed.')
+        finally:
+            db.session.close()
+    else:
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+
+    return render_template('forms/new_artist.html', form=form)
+
+
+#  Update Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+    artist = Artist.query.get(artist_id)
+
+    form.name.data = artist.name
+    form.genres.data = artist.genres
+    form.city.data = artist.city
+    form.state.data = artist.state
+    form.phone.data = artist.phone
+    form.website_link.data = artist.website_link
+    form.facebook_link.data = artist.facebook_link
+    form.seeking_venue.data = artist.seeking_venue
+    form.seeking_description.data = artist.seeking_description
+    form.image_link.data = artist.image_link
+
+    # TODO: populate form with fields from artist with ID <artist_id>
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    from forms import ArtistForm
+
+    error  = False
+    form = ArtistForm(request.form)
+    try:
+        artist = Artist.query.get(artist_id)
+        artist.name=form.name.data
+        artist.city=form.city.data
+        artist.state=form.state.data
+        artist.phone=form.phone.data
+        artist.image_link=form.image_link.data
+        artist.genres=form.genres.data
+        artist.website_link=form.website_link.data
+        artist.facebook_link=form.facebook_link.data
+        artist.seeking_venue=form.seeking_venue.data
+        artist.seeking_description=form.seeking_description.data
+        flash('Artist ' + request.form['name'] + ' was successfully updated!')
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc.info())
+        flash('An error occurred. Artist ' +
+              request.form['name'] + ' could not be updated.')
+    finally:
+        db.session.close()
+
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
@@ -0,0 +1,37 @@
+from flask import Blueprint, render_template, abort
+
+import genres
+from models import db, Venue, Artist, GenreCount
+
+bp = Blueprint('genres', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+# Venues and artists shown on a genre page; the rest are a link away.
+GENRE_PAGE_LIMIT = 12
+
+
+@bp.route('/genres')
+def genre_index():
+    # Every genre with its maintained counts (genres.py), one small query.
+    return render_template('pages/genres.html', genre_counts=genres.genre_counts())
+
+
+@bp.route('/genres/<genre>')
+def show_genre(genre):
+    name = genres.canonical_genre(genre)
+    if name is None:
+        abort(404)
+    counts = db.session.get(GenreCount, name) or GenreCount(
+        genre=name, venues_count=0, artists_count=0, upcoming_shows_count=0)
+    # The busiest venues and artists first, found through the GIN indexes.
+    top = {}
+    for model in (Venue, Artist):
+        top[model] = db.session.query(model.id, model.name, model.city, model.state,
+                                      model.upcoming_shows_count).filter(
+            genres.has_genres(model.genres, [name])).order_by(
+            model.upcoming_shows_count.desc(), model.name, model.id).limit(GENRE_PAGE_LIMIT).all()
+    return render_template('pages/show_genre.html', genre=name, counts=counts,
+                           venues=top[Venue], artists=top[Artist])
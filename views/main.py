@@ -0,0 +1,36 @@
+from flask import Blueprint, render_template, request
+
+import thumbnails
+
+bp = Blueprint('main', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+
+@bp.route('/')
+def index():
+    return render_template('pages/home.html')
+
+
+#  Thumbnails
+#  ----------------------------------------------------------------
+
+@bp.route('/thumbnails/<any(tile, page):size>/<signature>')
+def thumbnail(size, signature):
+    # image_link artwork, resized and cached on disk (see thumbnails.py).
+    return thumbnails.serve(size, signature, request.args.get('url', ''))
+
+
+#  Errors
+#  ----------------------------------------------------------------
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+@bp.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, render_template, request, flash
+import sys
+
+import booking
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+from pagination import paginate
+
+# The forms (and WTForms) are imported by the views that build one; pages
+# that never show a form do not load them.
+
+bp = Blueprint('shows', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('/shows')
+def shows():
+    # displays list of shows at /shows
+    # Upcoming shows are listed by default; ?when=past pages back through
+    # history newest first and ?when=all lists everything.
+
+    when = request.args.get('when', 'upcoming')
+    query = db.session.query(
+        Show.id, Show.show_date_time,
+        Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id
+    ).join(Artist, Show.artist_id == Artist.id)
+    if when == 'past':
+        query = query.filter(Show.show_date_time <= datetime.now())
+    elif when != 'all':
+        when = 'upcoming'
+        query = query.filter(Show.show_date_time > datetime.now())
+    page = paginate(query, [Show.show_date_time, Show.id],
+                    descending=(when == 'past'))
+
+    data = []
+    for show in page:
+        data.append({
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'artist_image_link': show.artist_image_link,
+            'start_time': show.show_date_time
+        })
+
+    return render_template('pages/shows.html', shows=data, page=page, when=when)
+
+
+@bp.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    # TODO: insert form data as a new Show record in the db, instead
+    from forms import ShowForm
+    error = False
+    form = ShowForm(request.form)
+
+    if not form.validate():
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+        return render_template('forms/new_show.html', form=form)
+
+    start = form.start_time.data
+    duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
+    try:
+        venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+        with booking.reservation():
+            conflicts = booking.find_conflicts(venue_id, artist_id, start, start + duration)
+            if conflicts:
+                for conflict in conflicts:
+                    flash('Show could not be listed: ' + str(conflict), 'danger')
+                return render_template('forms/new_show.html', form=form)
+            show = Show(
+                # left side of equation is name from the class
+                artist_id=artist_id,
+                venue_id=venue_id,
+                show_date_time=start,
+                end_date_time=start + duration
+            )
+            db.session.add(show)
+            db.session.commit()
+
+        # on successful db insert, flash success
+        flash('Show was successfully listed!')
+    # TODO: on unsuccessful db insert, flash an error instead.
+    except Exception as e:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+        if booking.is_conflict_error(e):
+            flash('Show could not be listed: the venue or the artist is already booked then.', 'danger')
+            return render_template('forms/new_show.html', form=form)
+        flash('An error occurred. Show could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
@@ -0,0 +1,310 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+import sys
+
+import availability
+import cache
+import counters
+import genres
+import search
+from models import db, Venue, Show
+from pagination import paginate
+
+# The forms (and WTForms) are imported by the views that build one; pages
+# that never show a form do not load them.
+
+bp = Blueprint('venues', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+def venues():
+    # One query returns every venue with its area and its maintained count
+    # of upcoming shows; rows come back ordered by area so they can be grouped
+    # in a single pass instead of an areas x venues loop. The directory is
+    # paged on the same ordering, so an area may continue on the next page.
+    # ?genres= narrows the directory through the GIN index (genres.py).
+    query = db.session.query(
+        Venue.city, Venue.state, Venue.id, Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    genre_filter, match = genres.selected_genres()
+    if genre_filter:
+        query = query.filter(genres.has_genres(Venue.genres, genre_filter, match))
+    page = paginate(query, [Venue.state, Venue.city, Venue.name, Venue.id])
+
+    data = []
+    for (city, state), area_rows in groupby(page, key=lambda row: (row.city, row.state)):
+        data.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in area_rows]
+        })
+
+    return render_template('pages/venues.html', areas=data, page=page,
+                           genre_counts=genres.genre_counts(), genre_filter=genre_filter, match=match)
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+
+    # GET is accepted as well so that the pager links can carry the term.
+    search_term = request.values.get('search_term', '')
+    genre_filter, match = genres.selected_genres()
+    page, count = search.search(Venue, search_term, genre_filter, match)
+    show_counts = counters.upcoming_show_counts(Venue, [hit.id for hit in page])
+    response = {
+        'count': count,
+        'data': []
+    }
+
+    for hit in page:
+        venue = {}
+        venue['id'] = hit.id
+        venue['name'] = hit.name
+        venue['num_upcoming_shows'] = show_counts.get(hit.id, 0)
+        response['data'].append(venue)
+
+    return render_template('pages/search_venues.html', results=response, search_term=search_term, page=page,
+                           genre_filter=genre_filter, match=match)
+
+
+@bp.route('/venues/availability')
+def venue_availability():
+    # Open venues in an area over a date range, best fit first. Only the
+    # shows inside the window are read (see availability.py).
+    from forms import AvailabilityForm
+    form = AvailabilityForm(request.args or None)
+    as_json = request.args.get('format') == 'json'
+    results = None
+    if request.args:
+        if not form.validate():
+            if as_json:
+                return jsonify({'errors': form.errors}), 400
+        else:
+            start, end = availability.search_window(form.start_date.data, form.end_date.data)
+            results = availability.find_available_venues(
+                start, end, city=form.city.data, state=form.state.data,
+                genre=form.genre.data, min_slot=timedelta(hours=form.min_hours.data or 2))
+            if as_json:
+                return jsonify({'data': [venue.to_dict() for venue in results]})
+    return render_template('pages/availability.html', form=form, results=results)
+
+
+@bp.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # Served from the page cache, which is invalidated on commit (cache.py).
+    return cache.page_cache().cached(cache.venue_tag(venue_id),
+                                     lambda: render_venue_page(venue_id))
+
+
+def render_venue_page(venue_id):
+    # TODO: replace with real venue data from the venues table, using venue_id
+
+    # The venue row plus one SELECT ... IN for its shows and their artists.
+    data = {}
+    venue_data = Venue.query.options(
+        db.selectinload(Venue.shows).joinedload(Show.artist)).get_or_404(venue_id)
+
+    data['id'] = venue_data.id
+    data['name'] = venue_data.name
+    data['genres'] = venue_data.genres
+    data['address'] = venue_data.address
+    data['city'] = venue_data.city
+    data['state'] = venue_data.state
+    data['phone'] = venue_data.phone
+    data['website'] = venue_data.website_link
+    data['facebook_link'] = venue_data.facebook_link
+    data['seeking_talent'] = venue_data.looking_for_talent
+    data['seeking_description'] = venue_data.description
+    data['image_link'] = venue_data.image_link
+
+    artist_data = venue_data.shows
+
+    past_show_list = []
+    future_show_list = []
+    next_show_time = None
+    for ind_artist in artist_data:
+        show_time = ind_artist.show_date_time
+        artist_info = {
+            'artist_id': ind_artist.artist.id,
+            'artist_name': ind_artist.artist.name,
+            'artist_image_link': ind_artist.artist.image_link,
+            'start_time': show_time
+        }
+        if show_time < datetime.now():
+            past_show_list.append(artist_info)
+        else:
+            future_show_list.append(artist_info)
+            next_show_time = min(next_show_time or show_time, show_time)
+
+    data['past_shows'] = past_show_list
+    data['past_shows_count'] = len(past_show_list)
+
+    data['upcoming_shows'] = future_show_list
+    data['upcoming_shows_count'] = len(future_show_list)
+
+    # The page goes stale when its next upcoming show starts.
+    tags = [cache.venue_tag(venue_id)] + [
+        cache.artist_tag(show['artist_id']) for show in past_show_list + future_show_list]
+    expires_at = next_show_time.timestamp() if next_show_time else None
+    return render_template('pages/show_venue.html', venue=data), tags, expires_at
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    from forms import VenueForm
+
+    error = False
+    form = VenueForm(request.form)
+
+    if form.validate():  
+        try:
+            venue = Venue(
+                # left side of equation is name from the class
+                name=form.name.data,
+                city=form.city.data,
+                state=form.state.data,
+                address=form.address.data,
+                phone=form.phone.data,
+                image_link=form.image_link.data,
+                genres=form.genres.data,
+                facebook_link=form.facebook_link.data,
+                website_link=form.website_link.data,
+                looking_for_talent=form.seeking_talent.data,
+                description=form.seeking_description.data
+            )
+            db.session.add(venue)
+            db.session.commit()
+            # on successful db insert, flash success
+            flash('Venue ' + request.form['name'] + ' was successfully listed!')
+
+        # TODO: on unsuccessful db insert, flash an error instead.
+        except:
+            error = True
+            db.session.rollback()
+            print(sys.exc_info())
+            flash('An error occurred. Venue ' +
+                request.form['name'] + ' could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+        finally:
+            db.session.close()
+        
+    else:
+        for field, message in form.errors.items():
+            flash(field + ' - ' + str(message), 'danger')
+
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/<int:venue_id>/delete', methods=['GET'])
+def delete_venue(venue_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+
+    try:
+        venue = Venue.query.get(venue_id)
+        db.session.delete(venue)
+        db.session.commit()
+        flash('Venue ' + str(venue_id) + ' was successfully deleted!')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+        flash('An error occurred. Venue ' +
+              str(venue_id) + ' could not be deleted.')
+    finally:
+        db.session.close()
+    if error:
+        return render_template('pages/venues.html')
+    return render_template('pages/home.html')
+
+
+#  Update Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+
+    # TODO: populate form with values from venue with ID <venue_id>
+
+    venue = Venue.query.get(venue_id)
+
+    form.name.data = venue.name
+    form.genres.data = venue.genres
+    form.address.data = venue.address
+    form.city.data = venue.city
+    form.state.data = venue.state
+    form.phone.data = venue.phone
+    form.website_link.data = venue.website_link
+    form.facebook_link.data = venue.facebook_link
+    form.seeking_talent.data = venue.looking_for_talent
+    form.seeking_description.data = venue.description
+    form.image_link.data = venue.image_link
+
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    from forms import VenueForm
+
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+
+    error = False
+    form = VenueForm(request.form)
+    try:
+        venue = Venue.query.get(venue_id)
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.address = form.address.data
+        venue.phone = form.phone.data
+        venue.image_link = form.image_link.data
+        venue.genres = form.genres.data
+        venue.facebook_link = form.facebook_link.data
+        venue.website_link = form.website_link.data
+        venue.looking_for_talent = form.seeking_talent.data
+        venue.description = form.seeking_description.data
+        db.session.commit()
+        flash('Venue ' + request.form['name'] + ' was successfully updated!')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+        flash('An error occurred. Venue ' +
+              request.form['name'] + ' could not be updated.')
+    finally:
+        db.session.close()
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
@@ -0,0 +1,14 @@
+from app import create_app
+
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#----------------------------------------------------------------------------#
+
+# Production app for gunicorn (see gunicorn.conf.py) or any WSGI server:
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Debug mode and template reloading are always off here, whatever FLASK_ENV
+# and FLASK_DEBUG say.
+
+app = create_app({'DEBUG': False, 'TEMPLATES_AUTO_RELOAD': False})